@@ -5,6 +5,7 @@ package.domain = org.parentalcontrol
 
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,json,xml
+source.exclude_dirs = server
 
 version = 1.3.3
 p4a.branch = master
@@ -42,6 +43,10 @@ android.add_src = java
 
 android.add_resources = res
 
+# FileProvider for sharing usage exports
+android.enable_androidx = True
+android.gradle_dependencies = androidx.core:core:1.13.1
+
 services = TimerService:service/main.py:foreground
 
 android.release_artifact = apk
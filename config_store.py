@@ -0,0 +1,225 @@
+"""
+Versioned config document shared by the app and the service.
+
+Every write bumps "_version" in the document, and "_changed" records the
+version at which each key last changed. Writes are compare-and-swap under
+an flock on <config>.lock: the writer's dict carries the version it was
+read at, and if the file has moved on since, the write is merged instead
+of replacing it. Keys whose value differs from the file are applied,
+except keys that another process changed after the writer's version;
+those keep the other process's value, since it was decided on fresher
+data (KEY_GROUPS are kept or replaced together). That needs a snapshot
+of the writer's base version, kept for the last KEEP_SNAPSHOTS versions
+this process read or wrote. Without one, keys nobody changed since the
+base version are still applied, but a differing key that did change
+since cannot be told apart from a change by the writer, so the write
+raises StaleConfig instead of guessing; read again and reapply.
+
+The result is written to a temp file, fsynced and renamed into place, so
+readers never take the lock: a plain read always sees one complete
+version.
+"""
+import copy
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+VERSION_KEY = "_version"
+CHANGED_KEY = "_changed"
+META_KEYS = (VERSION_KEY, CHANGED_KEY)
+KEEP_SNAPSHOTS = 16
+# Keys that only make sense together; a conflict on one keeps them all.
+KEY_GROUPS = [("is_timer_active", "timer_end_timestamp")]
+
+
+def version(config):
+    return (config or {}).get(VERSION_KEY, 0)
+
+
+class StaleConfig(Exception):
+    """A write whose base version can no longer be told apart from newer changes."""
+
+
+def stamp(previous, result):
+    """Record in result["_changed"] the version each key last changed at."""
+    previous = previous or {}
+    changed = previous.get(CHANGED_KEY)
+    if changed is None:
+        # First write with a history: whatever is there dates from the
+        # version being replaced.
+        changed = {key: version(previous) for key in previous if key not in META_KEYS}
+    changed = dict(changed)
+    for key, value in result.items():
+        if key in META_KEYS:
+            continue
+        if key not in previous or previous[key] != value:
+            changed[key] = result[VERSION_KEY]
+    result[CHANGED_KEY] = changed
+    return result
+
+
+class ConfigStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.snapshots = {}
+        self.written = {}
+        self.guard = threading.Lock()
+        self.conflicts = 0
+        self.rejected = 0
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _remember(self, config):
+        with self.guard:
+            self.snapshots[version(config)] = copy.deepcopy(config)
+            while len(self.snapshots) > KEEP_SNAPSHOTS:
+                del self.snapshots[min(self.snapshots)]
+
+    def read(self):
+        """The current document, or None if there is none yet. Takes no lock."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            config = json.load(f)
+        self._remember(config)
+        return config
+
+    def _write(self, config):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def merge(self, config, current):
+        """Three-way merge of config (read at its _version) into current."""
+        base_version = version(config)
+        with self.guard:
+            base = self.snapshots.get(base_version)
+        changed = current.get(CHANGED_KEY)
+        if changed is None and base is None:
+            raise StaleConfig(f"{self.path}: version {base_version} is too old to merge "
+                              f"into {version(current)}")
+        merged = dict(current)
+        kept = []
+        unknown = []
+        for key, value in config.items():
+            theirs = current.get(key)
+            if key in META_KEYS or value == theirs:
+                continue
+            if base is None:
+                if changed.get(key, 0) > base_version:
+                    unknown.append(key)
+                else:
+                    merged[key] = value
+                continue
+            if base.get(key) == value:
+                # Not changed by this writer.
+                continue
+            if changed is not None:
+                changed_since = changed.get(key, 0) > base_version
+            else:
+                changed_since = theirs != base.get(key)
+            if changed_since and self.written.get(key, value) != theirs:
+                kept.append(key)
+                continue
+            merged[key] = value
+        if unknown:
+            raise StaleConfig(f"{self.path}: version {base_version} is too old to merge "
+                              f"{', '.join(sorted(unknown))} into {version(current)}")
+        for group in KEY_GROUPS:
+            if any(key in kept for key in group):
+                for key in group:
+                    if key in current:
+                        merged[key] = current[key]
+                    if key not in kept:
+                        kept.append(key)
+        return merged, kept
+
+    def _apply(self, config, current):
+        if current is None or version(current) == version(config):
+            result = {key: value for key, value in config.items() if key != CHANGED_KEY}
+        else:
+            result, kept = self.merge(config, current)
+            if kept:
+                self.conflicts += 1
+                print(f"Config write merged; kept newer {', '.join(sorted(kept))}")
+        result[VERSION_KEY] = version(current) + 1
+        stamp(current, result)
+        with self.guard:
+            base = self.snapshots.get(version(config), {})
+            for key, value in config.items():
+                if key not in META_KEYS and base.get(key) != value:
+                    self.written[key] = copy.deepcopy(value)
+        self._remember(result)
+        return result
+
+    def _read_current(self):
+        try:
+            return self.read()
+        except (OSError, ValueError) as e:
+            print(f"Error reading {self.path} before write: {e}")
+            return None
+
+    def save(self, config):
+        """Write config; returns the document now on disk.
+
+        config is left untouched. Keys kept from a concurrent writer are
+        logged and counted in self.conflicts. Raises StaleConfig, writing
+        nothing, if config cannot be merged; read again and reapply.
+        """
+        with self._locked():
+            current = self._apply(config, self._read_current())
+            self._write(current)
+        return current
+
+    def save_all(self, configs):
+        """Apply several saves in order with a single write.
+
+        Configs that cannot be merged are logged, counted in
+        self.rejected and skipped. Returns the document now on disk, or
+        None if every config was rejected.
+        """
+        with self._locked():
+            current = self._read_current()
+            applied = False
+            for config in configs:
+                try:
+                    current = self._apply(config, current)
+                    applied = True
+                except StaleConfig as e:
+                    self.rejected += 1
+                    print(f"Config write rejected: {e}")
+            if not applied:
+                return None
+            self._write(current)
+        return current
+
+    def update(self, fn):
+        """Apply fn(config) to the newest document under the lock; returns the result."""
+        with self._locked():
+            current = self.read() or {}
+            result = fn(copy.deepcopy(current)) or current
+            result[VERSION_KEY] = version(current) + 1
+            stamp(current, result)
+            self._write(result)
+        self._remember(result)
+        return result
@@ -0,0 +1,258 @@
+"""
+Extension request queue.
+
+Requests are records {id, profile, minutes, state, requested, decided,
+applied, unblocked}; timestamps are POSIX seconds. States move forward
+only: pending -> granted/denied -> applied (granted) or expired (pending
+for too long). Every change is a read-modify-write of
+extension_requests.json under an flock, so the app and the service can
+both touch the queue. apply_granted() extends the timer and marks the
+request applied in the same critical section, so a grant is applied
+exactly once whichever process gets there first. The config write that
+extends the timer also records the request id under APPLIED_KEY, so a
+crash before the queue is updated cannot apply the grant twice.
+
+    python extension_queue.py --stats    request-to-unblock latency
+"""
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+QUEUE_FILE = "extension_requests.json"
+LOCK_FILE = "extension_requests.lock"
+MAX_PENDING_SECONDS = 30 * 60
+KEEP_DONE = 200
+APPLIED_KEY = "applied_extensions"
+KEEP_APPLIED_IDS = 50
+
+STATES = ("pending", "granted", "denied", "applied", "expired")
+RANK = {"pending": 0, "granted": 1, "denied": 1, "applied": 2, "expired": 2}
+
+base_dir = ""
+
+
+def path():
+    return os.path.join(base_dir, QUEUE_FILE)
+
+
+@contextmanager
+def _locked():
+    with open(os.path.join(base_dir, LOCK_FILE), 'a') as lock_file:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read():
+    try:
+        if os.path.exists(path()):
+            with open(path(), 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading extension requests: {e}")
+    return []
+
+
+def _write(requests):
+    done = [r for r in requests if RANK[r["state"]] == 2]
+    if len(done) > KEEP_DONE:
+        drop = {r["id"] for r in done[:len(done) - KEEP_DONE]}
+        requests = [r for r in requests if r["id"] not in drop]
+    tmp_path = path() + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(requests, f)
+    os.replace(tmp_path, path())
+
+
+def load():
+    return _read()
+
+
+def mtime():
+    try:
+        return os.stat(path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def get(request_id):
+    return next((r for r in _read() if r["id"] == request_id), None)
+
+
+def pending():
+    return [r for r in _read() if r["state"] == "pending"]
+
+
+def submit(profile_id, minutes, now=None):
+    request = {
+        "id": uuid.uuid4().hex[:12],
+        "profile": profile_id,
+        "minutes": minutes,
+        "state": "pending",
+        "requested": now or time.time(),
+        "decided": None,
+        "applied": None,
+        "unblocked": None,
+    }
+    with _locked():
+        requests = _read()
+        requests.append(request)
+        _write(requests)
+    return request
+
+
+def _update(request_id, **changes):
+    with _locked():
+        requests = _read()
+        for request in requests:
+            if request["id"] == request_id:
+                request.update(changes)
+                _write(requests)
+                return request
+    return None
+
+
+def decide(request_id, granted, minutes=None, now=None):
+    """Grant or deny a pending request; returns it, or None if it was already decided."""
+    with _locked():
+        requests = _read()
+        for request in requests:
+            if request["id"] == request_id and request["state"] == "pending":
+                request["state"] = "granted" if granted else "denied"
+                request["decided"] = now or time.time()
+                if minutes is not None:
+                    request["minutes"] = minutes
+                _write(requests)
+                return request
+    return None
+
+
+def mark_unblocked(request_id, now=None):
+    return _update(request_id, unblocked=now or time.time())
+
+
+def merge(remote):
+    """Take a request synced from another device if it is newer than ours."""
+    with _locked():
+        requests = _read()
+        for i, request in enumerate(requests):
+            if request["id"] == remote["id"]:
+                if RANK[remote["state"]] <= RANK[request["state"]]:
+                    return request
+                requests[i] = dict(request, **remote)
+                _write(requests)
+                return requests[i]
+        requests.append(remote)
+        _write(requests)
+        return remote
+
+
+def extend_timer(config, minutes, now=None):
+    """Restart or lengthen the timer in config by minutes."""
+    now = datetime.fromtimestamp(now) if now else datetime.now()
+    end = now
+    if config.get('is_timer_active') and config.get('timer_end_timestamp'):
+        end = max(now, datetime.fromisoformat(config['timer_end_timestamp']))
+    else:
+        config['timer_start_timestamp'] = now.isoformat()
+    config['is_timer_active'] = True
+    config['timer_minutes'] = minutes
+    config['timer_end_timestamp'] = (end + timedelta(minutes=minutes)).isoformat()
+    return config
+
+
+def apply_granted(load_config, save_config, now=None):
+    """Apply every granted request to the config; returns the applied requests.
+
+    save_config(config) returns the saved config, or None if the write
+    failed; the request then stays granted for the next pass. A request
+    whose id is already in the config was applied before the queue was
+    last written and is only marked. Expires requests that stayed
+    pending longer than MAX_PENDING_SECONDS.
+    """
+    now = now or time.time()
+    with _locked():
+        requests = _read()
+        applied = []
+        changed = False
+        for request in requests:
+            if request["state"] == "pending" and now - request["requested"] > MAX_PENDING_SECONDS:
+                request["state"] = "expired"
+                changed = True
+            elif request["state"] == "granted":
+                config = load_config()
+                if config is None:
+                    continue
+                done = config.get(APPLIED_KEY, [])
+                if request["id"] not in done:
+                    extend_timer(config, request["minutes"], now)
+                    config[APPLIED_KEY] = (done + [request["id"]])[-KEEP_APPLIED_IDS:]
+                    if save_config(config) is None:
+                        print(f"Extension {request['id']} not applied: config write failed")
+                        continue
+                request["state"] = "applied"
+                request["applied"] = now
+                applied.append(request)
+                changed = True
+        if changed:
+            _write(requests)
+    return applied
+
+
+def latency_stats(requests=None):
+    """Latency percentiles in seconds.
+
+    decide_to_* is the delivery path once the parent answered;
+    request_to_* also includes how long the parent took to answer.
+    """
+    requests = requests if requests is not None else _read()
+
+    def percentiles(values):
+        values = sorted(values)
+        if not values:
+            return None
+        pick = lambda p: values[min(len(values) - 1, int(len(values) * p))]
+        return {"count": len(values), "p50": pick(0.5), "p95": pick(0.95), "max": values[-1]}
+
+    return {
+        "decide_to_apply": percentiles([r["applied"] - r["decided"] for r in requests
+                                        if r.get("applied") and r.get("decided")]),
+        "request_to_apply": percentiles([r["applied"] - r["requested"] for r in requests
+                                         if r.get("applied")]),
+        "decide_to_unblock": percentiles([r["unblocked"] - r["decided"] for r in requests
+                                          if r.get("unblocked") and r.get("decided")]),
+        "request_to_unblock": percentiles([r["unblocked"] - r["requested"] for r in requests
+                                           if r.get("unblocked")]),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--stats" not in argv:
+        print(__doc__)
+        return 1
+    for name, stats in latency_stats().items():
+        if stats:
+            print(f"{name}: n={stats['count']} p50={stats['p50']:.2f}s "
+                  f"p95={stats['p95']:.2f}s max={stats['max']:.2f}s")
+        else:
+            print(f"{name}: no data")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Background persistence executor.
+
+One worker thread runs every queued disk task in submission order, so
+the UI thread only pays for serialising a snapshot. Two kinds of task:
+
+  write(path, text)   atomic replace of a whole file. A newer write to
+                      the same path that is still queued replaces the
+                      older one, and pending(path) returns the newest
+                      queued text so readers see their own writes.
+  submit(fn, *args)   any other read-modify-write, run as-is.
+
+A path can be given its own commit function with register(); its writes
+still coalesce and show in pending(), but commit(texts) gets every queued
+text in order and does the writing itself.
+
+Consecutive writes are committed as a batch: every temp file is written
+and fsynced, then all are renamed into place and the directory is synced
+once. Under a slow disk more writes queue up behind the current batch,
+so the number of fsyncs drops as the load goes up.
+
+Both return a concurrent.futures.Future. A callback given to either is
+passed through dispatch(), which the app points at Kivy's Clock so the
+callback runs on the main thread. flush() is the barrier for shutdown.
+
+    python io_executor.py --bench    main-thread stalls on a slow filesystem shim
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class LocalFS:
+    """The filesystem calls the executor makes; replaced by a shim in the benchmark."""
+
+    def write(self, path, text):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def replace(self, tmp_path, path):
+        os.replace(tmp_path, path)
+
+    def sync_dir(self, directory):
+        try:
+            fd = os.open(directory or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class _Task:
+    __slots__ = ("path", "text", "texts", "fn", "args", "futures", "callbacks")
+
+    def __init__(self, path=None, text=None, fn=None, args=()):
+        self.path = path
+        self.text = text
+        self.texts = [text]
+        self.fn = fn
+        self.args = args
+        self.futures = []
+        self.callbacks = []
+
+
+class IOExecutor:
+    def __init__(self, fs=None, name="io-executor"):
+        self.fs = fs or LocalFS()
+        self.name = name
+        self.dispatch = lambda callback, result: callback(result)
+        self.queue = deque()
+        self.queued_writes = {}
+        self.committers = {}
+        self.cond = threading.Condition()
+        self.busy = False
+        self.in_flight = {}
+        self.thread = None
+        self.stats = {"writes": 0, "coalesced": 0, "batches": 0, "calls": 0}
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _enqueue(self, task, callback):
+        future = Future()
+        task.futures.append(future)
+        if callback:
+            task.callbacks.append(callback)
+        self.queue.append(task)
+        self._start()
+        self.cond.notify()
+        return future
+
+    def register(self, path, commit):
+        """Commit writes to path with commit(texts) instead of a plain replace."""
+        self.committers[path] = commit
+
+    def write(self, path, text, callback=None):
+        """Atomically replace path with text on the worker thread."""
+        with self.cond:
+            task = self.queued_writes.get(path)
+            if task is not None:
+                # Still queued and nothing was submitted after it: the newer
+                # text simply takes its place.
+                task.text = text
+                task.texts.append(text)
+                future = Future()
+                task.futures.append(future)
+                if callback:
+                    task.callbacks.append(callback)
+                self.stats["coalesced"] += 1
+                return future
+            task = _Task(path=path, text=text)
+            self.queued_writes[path] = task
+            return self._enqueue(task, callback)
+
+    def submit(self, fn, *args, callback=None):
+        """Run fn(*args) on the worker thread after everything queued before it."""
+        with self.cond:
+            # Later writes must not jump ahead of this call.
+            self.queued_writes.clear()
+            return self._enqueue(_Task(fn=fn, args=args), callback)
+
+    def pending(self, path):
+        """Newest text queued for path but not yet on disk, or None."""
+        with self.cond:
+            for task in reversed(self.queue):
+                if task.path == path:
+                    return task.text
+            return self.in_flight.get(path)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is on disk; False on timeout."""
+        with self.cond:
+            if not self.queue and not self.busy:
+                return True
+            future = self._enqueue(_Task(fn=lambda: None), None)
+        try:
+            future.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def _take_batch(self):
+        """Everything up to the next call, or the call itself."""
+        with self.cond:
+            while not self.queue:
+                self.cond.wait()
+            self.busy = True
+            if self.queue[0].fn is not None:
+                batch = [self.queue.popleft()]
+            else:
+                batch = []
+                while self.queue and self.queue[0].fn is None:
+                    batch.append(self.queue.popleft())
+            for task in batch:
+                if self.queued_writes.get(task.path) is task:
+                    del self.queued_writes[task.path]
+            self.in_flight = {task.path: task.text for task in batch if task.fn is None}
+            return batch
+
+    def _commit(self, batch):
+        results = []
+        if batch[0].fn is not None:
+            task = batch[0]
+            try:
+                results.append((task, task.fn(*task.args), None))
+            except Exception as e:
+                print(f"Error in background I/O task: {e}")
+                results.append((task, None, e))
+            self.stats["calls"] += 1
+            return results
+
+        written = []
+        for task in batch:
+            if task.path in self.committers:
+                try:
+                    results.append((task, self.committers[task.path](task.texts), None))
+                except Exception as e:
+                    print(f"Error writing {task.path}: {e}")
+                    results.append((task, None, e))
+                continue
+            try:
+                written.append((task, self.fs.write(task.path, task.text)))
+            except Exception as e:
+                print(f"Error writing {task.path}: {e}")
+                results.append((task, None, e))
+        directories = set()
+        for task, tmp_path in written:
+            try:
+                self.fs.replace(tmp_path, task.path)
+                directories.add(os.path.dirname(task.path))
+                results.append((task, task.path, None))
+            except Exception as e:
+                print(f"Error replacing {task.path}: {e}")
+                results.append((task, None, e))
+        for directory in directories:
+            self.fs.sync_dir(directory)
+        self.stats["writes"] += len(written)
+        self.stats["batches"] += 1
+        return results
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            results = self._commit(batch)
+            with self.cond:
+                self.busy = False
+                self.in_flight = {}
+            for task, result, error in results:
+                for future in task.futures:
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+                if error is None:
+                    for callback in task.callbacks:
+                        try:
+                            self.dispatch(callback, result)
+                        except Exception as e:
+                            print(f"Error in I/O callback: {e}")
+
+
+executor = IOExecutor()
+
+
+class SlowFS(LocalFS):
+    """Shim that makes every write and fsync take as long as a slow eMMC."""
+
+    def __init__(self, write_delay=0.02, sync_delay=0.08):
+        self.write_delay = write_delay
+        self.sync_delay = sync_delay
+        self.fsyncs = 0
+
+    def write(self, path, text):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        time.sleep(self.write_delay + self.sync_delay)
+        self.fsyncs += 1
+        return tmp_path
+
+    def sync_dir(self, directory):
+        time.sleep(self.sync_delay)
+        self.fsyncs += 1
+
+
+def benchmark(saves=60, interval=0.016, write_delay=0.02, sync_delay=0.08):
+    """Simulated UI loop saving once per frame, sync versus through the executor."""
+    import json
+    import tempfile
+
+    config = {"timer_minutes": 5, "is_timer_active": False, "padding": "x" * 2048}
+    directory = tempfile.mkdtemp(prefix="io_bench_")
+    path = os.path.join(directory, "parental_config.json")
+
+    def report(name, stalls, elapsed, fs):
+        stalls = sorted(stalls)
+        pick = lambda p: stalls[min(len(stalls) - 1, int(len(stalls) * p))] * 1000
+        dropped = sum(1 for s in stalls if s > interval)
+        print(f"{name:9s} stall p50 {pick(0.5):6.2f} ms  p99 {pick(0.99):6.2f} ms  "
+              f"max {stalls[-1] * 1000:6.2f} ms  frames over budget {dropped:3d}/{len(stalls)}  "
+              f"fsyncs {fs.fsyncs:3d}  total {elapsed:5.2f}s")
+
+    fs = SlowFS(write_delay, sync_delay)
+    stalls = []
+    started = time.perf_counter()
+    for i in range(saves):
+        config["timer_minutes"] = i
+        before = time.perf_counter()
+        fs.replace(fs.write(path, json.dumps(config)), path)
+        fs.sync_dir(directory)
+        stalls.append(time.perf_counter() - before)
+        time.sleep(interval)
+    report("sync", stalls, time.perf_counter() - started, fs)
+
+    fs = SlowFS(write_delay, sync_delay)
+    io = IOExecutor(fs, name="io-bench")
+    stalls = []
+    started = time.perf_counter()
+    for i in range(saves):
+        config["timer_minutes"] = i
+        before = time.perf_counter()
+        io.write(path, json.dumps(config))
+        stalls.append(time.perf_counter() - before)
+        time.sleep(interval)
+    io.flush()
+    report("executor", stalls, time.perf_counter() - started, fs)
+    with open(path) as f:
+        assert json.load(f)["timer_minutes"] == saves - 1
+    print(f"executor: {io.stats['batches']} batches, {io.stats['coalesced']} writes coalesced")
+
+
+if __name__ == '__main__':
+    if "--bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        print(__doc__)
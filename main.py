@@ -21,16 +21,40 @@ from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
 from kivy.clock import Clock
 from kivy.properties import NumericProperty, StringProperty, ListProperty, BooleanProperty
+from kivy.event import EventDispatcher
 from kivy.core.window import Window
-from kivy.graphics import Color, Rectangle, RoundedRectangle, Line, Ellipse
+from kivy.graphics import Color, Rectangle, RoundedRectangle, Line, Ellipse, Mesh, Fbo, ClearColor, ClearBuffers
+from kivy.graphics.texture import Texture
 from kivy.animation import Animation
 from kivy.metrics import dp, sp
 from kivy.core.audio import SoundLoader
+from kivy.core.text import Label as CoreLabel
 import json
 import os
 import random
+import time
+import weakref
+from array import array
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
+
+from profiler import profiler, PROFILE_ENV
+from usage_heatmap import HeatmapStore
+import usage_export
+import usage_query
+import usage_store
+import usage_log
+import usage_analytics
+import schedule_engine
+from quota import QuotaLedger
+import profile_store
+import sync
+import extension_queue
+import pin_security
+from pin_lockout import PinLimiter
+from io_executor import executor as io_executor
+from config_store import ConfigStore, META_KEYS
+from service.events import Subscriber, send_command
 
 try:
     from android.permissions import request_permissions, Permission
@@ -74,6 +98,58 @@ COLORS_LIGHT = {
 
 COLORS = COLORS_DARK
 
+
+class Theme(EventDispatcher):
+    """The active palette as Kivy properties.
+
+    use() swaps the palette. Widgets follow it through tint(), which gives
+    a color attribute a role and binds it to that role's property, so a
+    theme toggle recolors every tinted widget in place, on any screen or
+    in an open popup. Tinted widgets are held weakly.
+    """
+    dark = BooleanProperty(True)
+    primary = ListProperty(COLORS_DARK['primary'])
+    primary_dark = ListProperty(COLORS_DARK['primary_dark'])
+    secondary = ListProperty(COLORS_DARK['secondary'])
+    accent = ListProperty(COLORS_DARK['accent'])
+    background = ListProperty(COLORS_DARK['background'])
+    surface = ListProperty(COLORS_DARK['surface'])
+    surface_light = ListProperty(COLORS_DARK['surface_light'])
+    text_primary = ListProperty(COLORS_DARK['text_primary'])
+    text_secondary = ListProperty(COLORS_DARK['text_secondary'])
+    error = ListProperty(COLORS_DARK['error'])
+    warning = ListProperty(COLORS_DARK['warning'])
+    success = ListProperty(COLORS_DARK['success'])
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tinted = weakref.WeakKeyDictionary()
+        for role in COLORS_DARK:
+            self.fbind(role, self._on_role, role)
+    
+    def use(self, palette, dark):
+        for role, color in palette.items():
+            setattr(self, role, list(color))
+        self.dark = dark
+    
+    def tint(self, target, role, attr='color'):
+        """Set target.<attr> to the role's color and keep it following the role; returns target.
+        
+        Tinting the same attribute again moves it to the new role.
+        """
+        self.tinted.setdefault(target, {})[attr] = role
+        setattr(target, attr, list(getattr(self, role)))
+        return target
+    
+    def _on_role(self, role, instance, value):
+        for target, attrs in list(self.tinted.items()):
+            for attr, target_role in attrs.items():
+                if target_role == role:
+                    setattr(target, attr, list(value))
+
+
+theme = Theme()
+
 OVERLAY_THEMES = {
     'battery_drained': {
         'bg_color': (0.05, 0.05, 0.08, 1),
@@ -138,17 +214,40 @@ TIME_PRESETS = [
     {'label': '2h', 'minutes': 120},
 ]
 
+STATS_RANGES = [
+    {'label': '7 Days', 'days': 7},
+    {'label': '30 Days', 'days': 30},
+    {'label': '365 Days', 'days': 365},
+]
+
+PROFILES_PAGE_SIZE = 10
+EXTENSION_POLL_SECONDS = 0.25
+SERVICE_APPLY_TIMEOUT = 3
+EXTENSION_SYNC_SECONDS = 5
+SYNC_INTERVAL = 300
+IO_FLUSH_TIMEOUT = 3
+SERVICE_SOCKET = "timer_service.sock"
+SERVICE_EXPIRY_GRACE = 5
+# Shared through the FileProvider declared in AndroidManifest.xml (res/xml/file_paths.xml).
+EXPORT_DIR = "exports"
+FILE_PROVIDER_SUFFIX = ".fileprovider"
+
 DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
 
+def lockout_text(seconds):
+    seconds = int(seconds + 0.999)
+    return f"{seconds // 60}m {seconds % 60:02d}s" if seconds >= 60 else f"{seconds}s"
+
+
 class Config:
     CONFIG_FILE = "parental_config.json"
-    STATS_FILE = "usage_stats.json"
     
     DEFAULT_CONFIG = {
         "parent_pin": "1234",
         "timer_minutes": 5,
         "timer_end_timestamp": None,
+        "timer_start_timestamp": None,
         "is_timer_active": False,
         "selected_overlay": "random",
         "custom_overlay_message": "",
@@ -159,83 +258,258 @@ class Config:
         "dark_mode": True,
         "recovery_question": "What is your favorite color?",
         "recovery_answer": "blue",
-        "profiles": {
-            "default": {
-                "name": "Child",
-                "daily_limit": 120,
-                "schedule": {}
-            }
-        },
         "active_profile": "default",
         "extension_requests_enabled": True,
         "max_extension_minutes": 10,
-        "pending_extension_request": None,
+        "profiling_enabled": False,
+        "sync_server": "",
+        "sync_group": "",
+        "stats_server": "",
+        "pin_hash_iterations": None,
     }
     
+    _quota_ledger = None
+    _pin_limiter = None
+    _store = None
+    
+    @classmethod
+    def store(cls):
+        """The versioned config file; queued saves are merged into it on the I/O thread."""
+        if cls._store is None:
+            cls._store = ConfigStore(cls.CONFIG_FILE)
+            io_executor.register(
+                cls.CONFIG_FILE,
+                lambda texts: cls._store.save_all([json.loads(text) for text in texts])
+            )
+        return cls._store
+    
     @classmethod
     def load(cls):
         try:
-            if os.path.exists(cls.CONFIG_FILE):
-                with open(cls.CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                    for key in cls.DEFAULT_CONFIG:
-                        if key not in config:
-                            config[key] = cls.DEFAULT_CONFIG[key]
-                    return config
+            # A save still queued on the I/O thread is newer than the file.
+            pending = io_executor.pending(cls.CONFIG_FILE)
+            config = json.loads(pending) if pending is not None else cls.store().read()
+            if config is None:
+                return cls.DEFAULT_CONFIG.copy()
+            for key in cls.DEFAULT_CONFIG:
+                if key not in config:
+                    config[key] = cls.DEFAULT_CONFIG[key]
+            if profile_store.migrate(config):
+                cls.save(config)
+            return config
         except Exception as e:
             print(f"Error loading config: {e}")
         return cls.DEFAULT_CONFIG.copy()
     
     @classmethod
-    def save(cls, config):
+    def save(cls, config, callback=None):
+        """Queue the config for writing; callback(saved) runs on the UI thread once it is on disk.
+        
+        Keys changed elsewhere (by the service) since config was loaded are
+        kept, and copied into config once the write is done.
+        """
         try:
-            with open(cls.CONFIG_FILE, 'w') as f:
-                json.dump(config, f)
+            cls.store()
+            text = json.dumps(config)
+            
+            def written(saved):
+                if saved is not None:
+                    cls.rebase(config, json.loads(text), saved)
+                if callback:
+                    callback(saved)
+            io_executor.write(cls.CONFIG_FILE, text, written)
         except Exception as e:
             print(f"Error saving config: {e}")
+        sync.client.track_config(config)
+        sync.stats.enabled = bool(config.get('stats_server'))
     
     @classmethod
-    def load_stats(cls):
+    def save_now(cls, config):
+        """Write config on the calling thread; returns it as saved, or None on failure."""
         try:
-            if os.path.exists(cls.STATS_FILE):
-                with open(cls.STATS_FILE, 'r') as f:
-                    return json.load(f)
+            return cls.store().save(config)
         except Exception as e:
-            print(f"Error loading stats: {e}")
-        return {"daily": {}, "sessions": []}
+            print(f"Error saving config: {e}")
+            return None
     
     @classmethod
-    def save_stats(cls, stats):
-        try:
-            with open(cls.STATS_FILE, 'w') as f:
-                json.dump(stats, f)
-        except Exception as e:
-            print(f"Error saving stats: {e}")
+    def rebase(cls, config, sent, saved):
+        """Move config to the saved version, keeping edits made after it was sent."""
+        for key, value in saved.items():
+            if key not in META_KEYS and config.get(key) == sent.get(key):
+                config[key] = value
+        for key in META_KEYS:
+            if key in saved:
+                config[key] = saved[key]
     
     @classmethod
-    def record_usage(cls, minutes):
-        stats = cls.load_stats()
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        if today not in stats["daily"]:
-            stats["daily"][today] = 0
-        stats["daily"][today] += minutes
-        
-        stats["sessions"].append({
-            "date": today,
-            "time": datetime.now().strftime("%H:%M"),
-            "duration": minutes
-        })
-        
-        if len(stats["sessions"]) > 100:
-            stats["sessions"] = stats["sessions"][-100:]
+    def pin_iterations(cls, config):
+        return config.get('pin_hash_iterations') or pin_security.DEFAULT_ITERATIONS
+    
+    @classmethod
+    def store_secrets(cls, updates, force=False):
+        """Save hashed secrets; plaintext values hashed earlier never overwrite newer hashes."""
+        config = cls.load()
+        for key, value in updates.items():
+            if force or key == 'pin_hash_iterations' or not pin_security.is_hashed(config.get(key)):
+                config[key] = value
+        cls.save(config)
+    
+    @classmethod
+    def pin_limiter(cls):
+        if cls._pin_limiter is None:
+            cls._pin_limiter = PinLimiter()
+        return cls._pin_limiter
+    
+    @classmethod
+    def check_secret(cls, key, secret, callback):
+        """Verify parent_pin or recovery_answer off the UI thread, rate limited.
+        
+        callback(ok, wait) runs on the UI thread; wait is the lockout in
+        seconds when the attempt was refused or caused one.
+        """
+        limiter = cls.pin_limiter()
+        wait = limiter.wait_time()
+        if wait > 0:
+            callback(False, wait)
+            return
+        limiter.attempt()
+        config = cls.load()
+        
+        def done(ok, rehash):
+            def finish(dt):
+                if ok:
+                    limiter.success()
+                if rehash:
+                    cls.store_secrets({key: rehash}, force=True)
+                callback(ok, limiter.wait_time())
+            Clock.schedule_once(finish)
+        
+        stored = config.get(key, '')
+        if key == 'recovery_answer' and not pin_security.is_hashed(stored):
+            stored = pin_security.normalize_answer(stored)
+        pin_security.verify_async(secret, stored, cls.pin_iterations(config), done)
+    
+    @classmethod
+    def check_pin(cls, pin, callback):
+        cls.check_secret('parent_pin', pin, callback)
+    
+    @classmethod
+    def set_secret(cls, key, secret, callback=None):
+        """Hash and save parent_pin or recovery_answer off the UI thread."""
+        config = cls.load()
         
-        old_dates = [d for d in stats["daily"].keys() 
-                     if (datetime.now() - datetime.strptime(d, "%Y-%m-%d")).days > 30]
-        for d in old_dates:
-            del stats["daily"][d]
+        def done(hashed):
+            def finish(dt):
+                config_now = cls.load()
+                config_now[key] = hashed
+                cls.save(config_now)
+                if callback:
+                    callback()
+            Clock.schedule_once(finish)
         
-        cls.save_stats(stats)
+        pin_security.hash_async(secret, cls.pin_iterations(config), done)
+    
+    @classmethod
+    def track_extension(cls, request):
+        """Send an extension request or decision to the parent channel right away."""
+        sync.client.track('extension', request['id'], request)
+        app = App.get_running_app()
+        if app and sync.client.enabled:
+            app.sync_now()
+    
+    @classmethod
+    def save_profile(cls, profile_id, profile):
+        profile_store.save(profile_id, profile)
+        sync.client.track('profile', profile_id, profile)
+    
+    @classmethod
+    def load_stats(cls, profile_id=None):
+        """Stats as last folded; usage still queued shows up through on_usage_folded."""
+        return usage_store.load(profile_id or usage_store.active_profile)
+    
+    @classmethod
+    def _append_usage(cls, records):
+        """Append to the usage log and have it folded: by the service when it
+        is listening, here otherwise."""
+        usage_log.append(records)
+        reply = send_command(os.path.abspath(SERVICE_SOCKET), {'command': 'fold'})
+        if reply is not None and 'folded' in reply:
+            return reply['folded']
+        return usage_log.fold()
+    
+    @classmethod
+    def log_usage(cls, records):
+        return io_executor.submit(cls._append_usage, records, callback=cls.on_usage_folded)
+    
+    @classmethod
+    def on_usage_folded(cls, folded):
+        """Bring cached views up to date with a usage_log fold."""
+        for profile_id, changes in folded.items():
+            usage_query.apply_fold(profile_id, changes)
+            HeatmapStore._cache.pop(profile_id, None)
+            if cls._quota_ledger is not None:
+                cls._quota_ledger.used.pop(profile_id, None)
+        app = App.get_running_app()
+        if app and folded:
+            app.sm.get_screen('main').on_stats_folded(folded)
+    
+    @classmethod
+    def record_session(cls, start, end, profile_id=None, session_id=None, logged=False):
+        """Count a finished session; logged means the service already wrote it to the usage log."""
+        profile_id = profile_id or usage_store.active_profile
+        if not logged:
+            cls.log_usage([usage_log.session(profile_id, start, end, session_id)])
+        minutes = max(0.0, (end - start).total_seconds()) / 60
+        cls.quota_ledger().add(profile_id, minutes)
+        key = f"{profile_id}/{start.isoformat()}"
+        value = {
+            'profile': profile_id,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'minutes': round(minutes, 2)
+        }
+        sync.client.track('session', key, value)
+        sync.stats.track('session', key, value)
+    
+    @classmethod
+    def apply_remote(cls, records):
+        """Apply records pulled by sync without tracking them again."""
+        config = cls.load()
+        sessions = []
+        for record in records:
+            kind, value = record['kind'], record['value']
+            if kind == 'config':
+                config[record['key']] = value
+            elif kind == 'profile':
+                profile_store.save(record['key'], value)
+            elif kind == 'session':
+                sessions.append(usage_log.session(
+                    value['profile'],
+                    datetime.fromisoformat(value['start']),
+                    datetime.fromisoformat(value['end']),
+                    session_id=f"sync:{record['key']}",
+                    source='sync'
+                ))
+            elif kind == 'extension':
+                extension_queue.merge(value)
+        cls.save(config)
+        if sessions:
+            cls.log_usage(sessions)
+    
+    @classmethod
+    def quota_ledger(cls):
+        if cls._quota_ledger is None:
+            cls._quota_ledger = QuotaLedger(
+                lambda profile_id, day: cls.usage_index(profile_id).range_sum(day, day)
+            )
+        return cls._quota_ledger
+    
+    @classmethod
+    def usage_index(cls, profile_id=None):
+        profile_id = profile_id or usage_store.active_profile
+        return usage_query.index_for(profile_id, lambda: cls.load_stats(profile_id))
+
 
 
 class AndroidHelper:
@@ -434,6 +708,35 @@ class AndroidHelper:
             print(f"Error stopping lock task: {e}")
             return False
     
+    @staticmethod
+    def share_files(paths, mime_type='text/plain'):
+        """Offer files to other apps as content:// URIs from the app's FileProvider."""
+        if not ANDROID_AVAILABLE:
+            for path in paths:
+                print(f"Would share {os.path.abspath(path)}")
+            return True
+        try:
+            Intent = autoclass('android.content.Intent')
+            FileProvider = autoclass('androidx.core.content.FileProvider')
+            File = autoclass('java.io.File')
+            ArrayList = autoclass('java.util.ArrayList')
+            String = autoclass('java.lang.String')
+            authority = mActivity.getPackageName() + FILE_PROVIDER_SUFFIX
+            
+            uris = ArrayList()
+            for path in paths:
+                uris.add(FileProvider.getUriForFile(mActivity, authority, File(os.path.abspath(path))))
+            intent = Intent(Intent.ACTION_SEND_MULTIPLE)
+            intent.setType(mime_type)
+            intent.putParcelableArrayListExtra(Intent.EXTRA_STREAM, uris)
+            intent.addFlags(Intent.FLAG_GRANT_READ_URI_PERMISSION)
+            chooser = Intent.createChooser(intent, cast('java.lang.CharSequence', String('Export usage')))
+            mActivity.startActivity(chooser)
+            return True
+        except Exception as e:
+            print(f"Error sharing files: {e}")
+            return False
+    
     @staticmethod
     def keep_screen_on(enable):
         if not ANDROID_AVAILABLE:
@@ -477,54 +780,172 @@ class SoundManager:
 class GradientBackground(Widget):
     def __init__(self, colors=None, **kwargs):
         super().__init__(**kwargs)
-        self.colors = colors or [COLORS['background'], COLORS['surface']]
+        self.follows_theme = colors is None
+        self.colors = colors or [theme.background, theme.surface]
+        with self.canvas.before:
+            self._color = Color(*self.colors[0])
+            self._rect = Rectangle(pos=self.pos, size=self.size)
         self.bind(size=self._update, pos=self._update)
-        self._update()
+        if self.follows_theme:
+            theme.bind(background=self._on_theme_background)
     
     def _update(self, *args):
-        self.canvas.before.clear()
-        with self.canvas.before:
-            Color(*self.colors[0])
-            Rectangle(pos=self.pos, size=self.size)
+        self._rect.pos = self.pos
+        self._rect.size = self.size
+    
+    def _on_theme_background(self, instance, value):
+        self.update_colors([theme.background, theme.surface])
     
     def update_colors(self, colors):
         self.colors = colors
-        self._update()
+        self._color.rgba = colors[0]
 
 
 class StyledButton(Button):
-    def __init__(self, btn_color=None, text_color=None, **kwargs):
+    btn_color = ListProperty([0.13, 0.59, 0.95, 1])
+    
+    def __init__(self, btn_color='primary', text_color='text_primary', **kwargs):
         super().__init__(**kwargs)
-        self.btn_color = btn_color or COLORS['primary']
-        self.text_color = text_color or COLORS['text_primary']
+        theme.tint(self, btn_color, 'btn_color')
+        theme.tint(self, text_color)
         self.background_color = (0, 0, 0, 0)
         self.background_normal = ''
-        self.color = self.text_color
         self.bold = True
-        self.bind(size=self._update, pos=self._update)
-        self._update()
+        with self.canvas.before:
+            self._bg_color = Color(*self.btn_color)
+            self._bg_rect = RoundedRectangle(pos=self.pos, size=self.size, radius=[dp(12)])
+        self.bind(size=self._update, pos=self._update, btn_color=self._update_color)
     
     def _update(self, *args):
-        self.canvas.before.clear()
-        with self.canvas.before:
-            Color(*self.btn_color)
-            RoundedRectangle(pos=self.pos, size=self.size, radius=[dp(12)])
+        self._bg_rect.pos = self.pos
+        self._bg_rect.size = self.size
     
-    def set_color(self, color):
-        self.btn_color = color
-        self._update()
+    def _update_color(self, *args):
+        self._bg_color.rgba = self.btn_color
+    
+    def set_color(self, role):
+        theme.tint(self, role, 'btn_color')
 
 
 class StyledTextInput(TextInput):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.background_color = COLORS['surface_light']
-        self.foreground_color = COLORS['text_primary']
-        self.cursor_color = COLORS['primary']
+        theme.tint(self, 'surface_light', 'background_color')
+        theme.tint(self, 'text_primary', 'foreground_color')
+        theme.tint(self, 'primary', 'cursor_color')
         self.padding = [dp(15), dp(12)]
         self.font_size = sp(18)
 
 
+class PopupManager:
+    """Reusable message popups.
+
+    A few Popup shells (message label + two buttons) are built up front and
+    only get their text and button callbacks rebound when shown. One popup
+    is visible at a time; others wait in a FIFO queue and identical pending
+    messages are dropped. Auto-dismiss timers are owned here, so a popup
+    closed early never gets a stale dismiss from a previous message. The
+    next queued popup opens on the frame after a dismiss; until then it is
+    held in ``opening`` so nothing shown in between can jump ahead of it.
+    A dismissed shell is still open while it fades out (``open()`` would
+    do nothing), so only closed shells are taken from the pool.
+    """
+    POOL_SIZE = 2
+    pool = []
+    queue = deque()
+    current = None
+    opening = None
+    dismiss_event = None
+
+    @classmethod
+    def init(cls):
+        while len(cls.pool) < cls.POOL_SIZE:
+            cls.pool.append(cls._build_shell())
+
+    @classmethod
+    def _build_shell(cls):
+        content = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(15))
+        message = Label(halign='center', valign='middle', font_size=sp(14))
+        message.bind(size=lambda w, s: setattr(w, 'text_size', s))
+        content.add_widget(message)
+        button_row = BoxLayout(size_hint_y=0.35, spacing=dp(15))
+        content.add_widget(button_row)
+
+        popup = Popup(content=content)
+        popup.message = message
+        popup.button_row = button_row
+        popup.buttons = []
+        for _ in range(2):
+            btn = StyledButton()
+            btn.bind(on_release=cls._on_button)
+            btn.popup = popup
+            popup.buttons.append(btn)
+        popup.bind(on_dismiss=cls._on_dismiss)
+        return popup
+
+    @classmethod
+    def show(cls, title, message, size_hint=(0.75, 0.35), buttons=None, timeout=None):
+        """Show a message popup.
+
+        ``buttons`` is a list of up to two (text, color role, callback) tuples; the
+        popup is dismissed after a button's callback runs. ``timeout`` closes
+        the popup automatically after that many seconds.
+        """
+        request = (title, message, tuple(size_hint), tuple(buttons or ()), timeout)
+        if cls.current is not None or cls.opening is not None:
+            waiting = [cls.opening] if cls.opening is not None else []
+            if all(pending[:2] != request[:2] for pending in waiting + list(cls.queue)):
+                cls.queue.append(request)
+            return
+        cls._open(request)
+
+    @classmethod
+    def _open(cls, request):
+        cls.opening = None
+        title, message, size_hint, buttons, timeout = request
+        popup = next((p for p in cls.pool if not getattr(p, '_is_open', False)), None)
+        if popup is not None:
+            cls.pool.remove(popup)
+        else:
+            popup = cls._build_shell()
+        popup.title = title
+        popup.size_hint = size_hint
+        popup.message.text = message
+        popup.auto_dismiss = not buttons
+        popup.button_row.clear_widgets()
+        popup.button_row.size_hint_y = 0.35 if buttons else 0
+        for btn, (text, color, callback) in zip(popup.buttons, buttons):
+            btn.text = text
+            btn.set_color(color)
+            btn.callback = callback
+            popup.button_row.add_widget(btn)
+        cls.current = popup
+        popup.open()
+        if timeout:
+            cls.dismiss_event = Clock.schedule_once(lambda dt: popup.dismiss(), timeout)
+
+    @classmethod
+    def _on_button(cls, btn):
+        callback = btn.callback
+        btn.popup.dismiss()
+        if callback:
+            callback()
+
+    @classmethod
+    def _on_dismiss(cls, popup):
+        if cls.dismiss_event:
+            cls.dismiss_event.cancel()
+            cls.dismiss_event = None
+        for btn in popup.buttons:
+            btn.callback = None
+        cls.current = None
+        if len(cls.pool) < cls.POOL_SIZE:
+            cls.pool.append(popup)
+        if cls.queue:
+            cls.opening = cls.queue.popleft()
+            Clock.schedule_once(lambda dt: cls._open(cls.opening), 0)
+
+
 class CircularProgress(Widget):
     progress = NumericProperty(0)
     color = ListProperty([0.13, 0.59, 0.95, 1])
@@ -625,6 +1046,277 @@ class StatBar(Widget):
                 RoundedRectangle(pos=self.pos, size=(bar_width, self.height), radius=[dp(4)])
 
 
+def _palette_texture(colors, smooth=False):
+    """Build a 1-pixel-high RGBA texture so a Mesh can pick colors via u."""
+    tex = Texture.create(size=(len(colors), 1), colorfmt='rgba')
+    buf = bytes(int(round(c * 255)) for rgba in colors for c in rgba)
+    tex.blit_buffer(buf, colorfmt='rgba', bufferfmt='ubyte')
+    tex.mag_filter = 'linear' if smooth else 'nearest'
+    tex.min_filter = 'linear' if smooth else 'nearest'
+    return tex
+
+
+class UsageChart(Widget):
+    """Vertical bar chart for N values drawn as a single Mesh.
+
+    Every bar is two quads (track + value) in one vertex array. Colors come
+    from a tiny palette texture, so there is one draw call regardless of N.
+    Changing the values only rewrites the y/u of the value quads and swaps
+    the vertex buffer; geometry is recomputed only when the size changes.
+    """
+    max_value = NumericProperty(0)
+    highlight_index = NumericProperty(-1)
+
+    TRACK, BAR, HIGHLIGHT = 0, 1, 2
+
+    def __init__(self, values=None, bar_color=None, track_color=None, highlight_color=None, **kwargs):
+        super().__init__(**kwargs)
+        self._values = list(values or [])
+        self._palette = _palette_texture([
+            track_color or (0.2, 0.2, 0.25, 1),
+            bar_color or COLORS['primary'],
+            highlight_color or COLORS['secondary'],
+        ])
+        self._vertices = array('f')
+        self._indices = array('H')
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self._mesh = Mesh(mode='triangles', texture=self._palette)
+        self.bind(size=self._layout, pos=self._layout)
+        self.bind(max_value=self._apply_values, highlight_index=self._apply_values)
+        self._layout()
+
+    def _u(self, slot):
+        return (slot + 0.5) / 3.0
+
+    def set_values(self, values):
+        resized = len(values) != len(self._values)
+        self._values = list(values)
+        if resized:
+            self._layout()
+        else:
+            self._apply_values()
+
+    def _layout(self, *args):
+        n = len(self._values)
+        self._vertices = array('f', [0.0]) * (n * 2 * 16)
+        self._indices = array('H', [0]) * (n * 2 * 6)
+        if n == 0:
+            self._mesh.indices = self._indices
+            self._mesh.vertices = self._vertices
+            return
+        step = self.width / n
+        gap = min(dp(4), step * 0.25) if n <= 60 else 0
+        bar_w = max(1, step - gap)
+        v = self._vertices
+        idx = self._indices
+        u_track = self._u(self.TRACK)
+        for i in range(n):
+            x0 = self.x + i * step + gap / 2
+            x1 = x0 + bar_w
+            for q in range(2):
+                base = (i * 2 + q) * 4
+                o = base * 4
+                v[o:o + 16] = array('f', (
+                    x0, self.y, u_track, 0.5,
+                    x1, self.y, u_track, 0.5,
+                    x1, self.top, u_track, 0.5,
+                    x0, self.top, u_track, 0.5,
+                ))
+                k = (i * 2 + q) * 6
+                idx[k:k + 6] = array('H', (base, base + 1, base + 2, base, base + 2, base + 3))
+        self._mesh.indices = self._indices
+        self._apply_values()
+
+    def _apply_values(self, *args):
+        n = len(self._values)
+        if n == 0:
+            return
+        peak = self.max_value or max(max(self._values), 1)
+        v = self._vertices
+        u_bar = self._u(self.BAR)
+        u_hi = self._u(self.HIGHLIGHT)
+        highlight = int(self.highlight_index) % n if self.highlight_index >= 0 else -1
+        for i, value in enumerate(self._values):
+            o = (i * 2 + 1) * 16
+            top = self.y + self.height * min(1, max(0, value / peak))
+            u = u_hi if i == highlight else u_bar
+            v[o + 2] = v[o + 6] = v[o + 10] = v[o + 14] = u
+            v[o + 9] = v[o + 13] = top
+        self._mesh.vertices = v
+
+
+class HeatmapChart(Widget):
+    """rows x cols intensity grid drawn as a single Mesh.
+
+    Cell intensity is encoded as the u coordinate into a smooth gradient
+    texture, so the whole grid is one draw call and new values only
+    rewrite u coordinates.
+    """
+    GRADIENT_STEPS = 16
+
+    def __init__(self, rows=7, cols=24, low_color=None, high_color=None, **kwargs):
+        super().__init__(**kwargs)
+        self.rows = rows
+        self.cols = cols
+        self._values = [0] * (rows * cols)
+        low = low_color or (0.2, 0.2, 0.25, 1)
+        high = high_color or COLORS['accent']
+        steps = self.GRADIENT_STEPS
+        self._gradient = _palette_texture([
+            tuple(lo + (hi - lo) * i / (steps - 1) for lo, hi in zip(low, high))
+            for i in range(steps)
+        ], smooth=True)
+        self._vertices = array('f', [0.0]) * (rows * cols * 16)
+        indices = array('H')
+        for i in range(rows * cols):
+            b = i * 4
+            indices.extend((b, b + 1, b + 2, b, b + 2, b + 3))
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self._mesh = Mesh(mode='triangles', texture=self._gradient, indices=indices)
+        self.bind(size=self._layout, pos=self._layout)
+        self._layout()
+
+    def set_values(self, values):
+        """values: flat row-major list, row 0 drawn at the top."""
+        self._values = list(values)
+        self._apply_values()
+
+    def _layout(self, *args):
+        cell_w = self.width / self.cols
+        cell_h = self.height / self.rows
+        gap = min(dp(2), cell_w * 0.2, cell_h * 0.2)
+        v = self._vertices
+        for r in range(self.rows):
+            y1 = self.top - r * cell_h
+            y0 = y1 - cell_h + gap
+            for c in range(self.cols):
+                x0 = self.x + c * cell_w
+                x1 = x0 + cell_w - gap
+                o = (r * self.cols + c) * 16
+                v[o:o + 16] = array('f', (
+                    x0, y0, 0, 0.5,
+                    x1, y0, 0, 0.5,
+                    x1, y1, 0, 0.5,
+                    x0, y1, 0, 0.5,
+                ))
+        self._apply_values()
+
+    def _apply_values(self, *args):
+        peak = max(max(self._values), 1)
+        steps = self.GRADIENT_STEPS
+        v = self._vertices
+        for i, value in enumerate(self._values):
+            u = (0.5 + (steps - 1) * value / peak) / steps
+            o = i * 16
+            v[o + 2] = v[o + 6] = v[o + 10] = v[o + 14] = u
+        self._mesh.vertices = v
+
+
+class DigitDisplay(Widget):
+    """Countdown text drawn from a glyph atlas instead of a Label.
+
+    '0'-'9' and ':' are rasterized once per (font_size, bold) into a shared
+    atlas texture. Setting ``text`` only remaps the texture coordinates of
+    a handful of quads in one Mesh; no text layout happens per tick.
+    """
+    text = StringProperty('00:00')
+    font_size = NumericProperty(sp(44))
+    bold = BooleanProperty(True)
+    color = ListProperty([1, 1, 1, 1])
+
+    GLYPHS = '0123456789:'
+    _atlases = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        with self.canvas:
+            self._color = Color(*self.color)
+            self._mesh = Mesh(mode='triangles')
+        self.bind(color=self._update_color)
+        self.bind(font_size=self._load_atlas, bold=self._load_atlas)
+        self.bind(text=self._update_text, size=self._update, pos=self._update)
+        self._shape = None
+        self._vertices = array('f')
+        self._load_atlas()
+
+    @classmethod
+    def _build_atlas(cls, font_size, bold):
+        textures = []
+        for glyph in cls.GLYPHS:
+            label = CoreLabel(text=glyph, font_size=font_size, bold=bold)
+            label.refresh()
+            textures.append(label.texture)
+        digit_w = max(tex.width for tex in textures[:10])
+        cell_h = max(tex.height for tex in textures)
+        widths = [digit_w] * 10 + [textures[10].width]
+        atlas_w = sum(widths)
+        fbo = Fbo(size=(atlas_w, cell_h))
+        glyphs = {}
+        x = 0
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Color(1, 1, 1, 1)
+            for glyph, tex, w in zip(cls.GLYPHS, textures, widths):
+                Rectangle(texture=tex, size=tex.size, pos=(x + (w - tex.width) // 2, (cell_h - tex.height) // 2))
+                glyphs[glyph] = (x / atlas_w, (x + w) / atlas_w, w)
+                x += w
+        fbo.draw()
+        return fbo, glyphs, cell_h
+
+    def _load_atlas(self, *args):
+        key = (int(self.font_size), bool(self.bold))
+        if key not in self._atlases:
+            self._atlases[key] = self._build_atlas(*key)
+        fbo, self._glyphs, self._cell_h = self._atlases[key]
+        self._mesh.texture = fbo.texture
+        self._update()
+
+    def _update_color(self, *args):
+        self._color.rgba = self.color
+
+    def _update_text(self, *args):
+        chars = [c for c in self.text if c in self._glyphs]
+        shape = tuple(c == ':' for c in chars)
+        if shape != self._shape:
+            self._update()
+            return
+        # Same glyph widths in the same slots: only the u coordinates move.
+        v = self._vertices
+        for i, c in enumerate(chars):
+            u0, u1 = self._glyphs[c][:2]
+            o = i * 16
+            v[o + 2] = v[o + 14] = u0
+            v[o + 6] = v[o + 10] = u1
+        self._mesh.vertices = v
+
+    def _update(self, *args):
+        chars = [c for c in self.text if c in self._glyphs]
+        glyphs = [self._glyphs[c] for c in chars]
+        total_w = sum(g[2] for g in glyphs)
+        x = self.center_x - total_w / 2
+        y0 = self.center_y - self._cell_h / 2
+        y1 = y0 + self._cell_h
+        vertices = array('f')
+        indices = array('H')
+        for i, (u0, u1, w) in enumerate(glyphs):
+            vertices.extend((
+                x, y0, u0, 0,
+                x + w, y0, u1, 0,
+                x + w, y1, u1, 1,
+                x, y1, u0, 1,
+            ))
+            b = i * 4
+            indices.extend((b, b + 1, b + 2, b, b + 2, b + 3))
+            x += w
+        self._shape = tuple(c == ':' for c in chars)
+        self._vertices = vertices
+        self._mesh.indices = indices
+        self._mesh.vertices = vertices
+
+
 class LoginScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -646,31 +1338,28 @@ class LoginScreen(Screen):
         icon_label = Label(text='', font_size=sp(80), size_hint_y=0.2)
         content.add_widget(icon_label)
         
-        title_label = Label(
+        title_label = theme.tint(Label(
             text='Screen Guardian',
             font_size=sp(32),
             bold=True,
-            color=COLORS['text_primary'],
             size_hint_y=0.1
-        )
+        ), 'text_primary')
         content.add_widget(title_label)
         
-        subtitle_label = Label(
+        subtitle_label = theme.tint(Label(
             text='Advanced Parental Control',
             font_size=sp(16),
-            color=COLORS['text_secondary'],
             size_hint_y=0.06
-        )
+        ), 'text_secondary')
         content.add_widget(subtitle_label)
         
         content.add_widget(Widget(size_hint_y=0.05))
         
-        pin_label = Label(
+        pin_label = theme.tint(Label(
             text='Enter Parent PIN',
             font_size=sp(14),
-            color=COLORS['text_secondary'],
             size_hint_y=0.05
-        )
+        ), 'text_secondary')
         content.add_widget(pin_label)
         
         self.pin_input = StyledTextInput(
@@ -685,28 +1374,26 @@ class LoginScreen(Screen):
         
         login_btn = StyledButton(
             text='UNLOCK',
-            btn_color=COLORS['primary'],
+            btn_color='primary',
             size_hint_y=0.1,
             font_size=sp(18)
         )
         login_btn.bind(on_release=self.verify_pin)
         content.add_widget(login_btn)
         
-        self.status_label = Label(
+        self.status_label = theme.tint(Label(
             text='',
             font_size=sp(14),
-            color=COLORS['error'],
             size_hint_y=0.06
-        )
+        ), 'error')
         content.add_widget(self.status_label)
         
-        forgot_btn = Button(
+        forgot_btn = theme.tint(Button(
             text='Forgot PIN?',
             font_size=sp(12),
             background_color=(0, 0, 0, 0),
-            color=COLORS['text_secondary'],
             size_hint_y=0.06
-        )
+        ), 'text_secondary')
         forgot_btn.bind(on_release=self.show_recovery)
         content.add_widget(forgot_btn)
         
@@ -722,25 +1409,28 @@ class LoginScreen(Screen):
         self.add_widget(layout)
     
     def verify_pin(self, instance):
-        config = Config.load()
-        if self.pin_input.text == config['parent_pin']:
-            self.pin_input.text = ''
+        self.status_label.text = 'Checking...'
+        Config.check_pin(self.pin_input.text, self.on_pin_checked)
+    
+    def on_pin_checked(self, ok, wait):
+        self.pin_input.text = ''
+        if ok:
             self.status_label.text = ''
             self.manager.current = 'main'
+        elif wait:
+            self.status_label.text = f'Too many attempts. Try again in {lockout_text(wait)}'
         else:
             self.status_label.text = 'Incorrect PIN!'
-            self.pin_input.text = ''
     
     def show_recovery(self, instance):
         config = Config.load()
         
         content = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
-        content.add_widget(Label(
+        content.add_widget(theme.tint(Label(
             text=config.get('recovery_question', 'What is your favorite color?'),
             font_size=sp(14),
-            color=COLORS['text_primary'],
             size_hint_y=0.3
-        ))
+        ), 'text_primary'))
         
         answer_input = TextInput(
             multiline=False,
@@ -749,18 +1439,40 @@ class LoginScreen(Screen):
         )
         content.add_widget(answer_input)
         
-        result_label = Label(text='', font_size=sp(12), color=COLORS['error'], size_hint_y=0.2)
+        result_label = theme.tint(Label(text='', font_size=sp(12), size_hint_y=0.2), 'error')
         content.add_widget(result_label)
         
-        def check_answer(btn):
-            if answer_input.text.lower().strip() == config.get('recovery_answer', 'blue').lower().strip():
-                result_label.color = COLORS['success']
-                result_label.text = f"Your PIN is: {config['parent_pin']}"
+        # PINs are stored hashed, so a correct answer lets the parent set a new one.
+        verified = []
+        
+        def on_answer_checked(ok, wait):
+            if ok:
+                verified.append(True)
+                answer_input.text = ''
+                answer_input.hint_text = 'New PIN (at least 4 digits)'
+                answer_input.input_filter = 'int'
+                answer_input.password = True
+                check_btn.text = 'Set New PIN'
+                theme.tint(result_label, 'success')
+                result_label.text = 'Answer correct. Enter a new PIN.'
             else:
-                result_label.color = COLORS['error']
-                result_label.text = 'Incorrect answer'
+                theme.tint(result_label, 'error')
+                result_label.text = f'Too many attempts. Try again in {lockout_text(wait)}' if wait else 'Incorrect answer'
         
-        check_btn = StyledButton(text='Verify', btn_color=COLORS['primary'], size_hint_y=0.25)
+        def check_answer(btn):
+            if verified:
+                if len(answer_input.text) < 4:
+                    theme.tint(result_label, 'error')
+                    result_label.text = 'PIN must be at least 4 digits'
+                    return
+                Config.set_secret('parent_pin', answer_input.text, popup.dismiss)
+                result_label.text = 'Saving...'
+                return
+            theme.tint(result_label, 'text_secondary')
+            result_label.text = 'Checking...'
+            Config.check_secret('recovery_answer', pin_security.normalize_answer(answer_input.text), on_answer_checked)
+        
+        check_btn = StyledButton(text='Verify', btn_color='primary', size_hint_y=0.25)
         check_btn.bind(on_release=check_answer)
         content.add_widget(check_btn)
         
@@ -770,14 +1482,14 @@ class LoginScreen(Screen):
             size_hint=(0.9, 0.5)
         )
         popup.open()
-    
-    def update_theme(self):
-        self.bg.update_colors([COLORS['background'], COLORS['surface']])
 
 
 class MainScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.countdown_event = None
+        self.expiry_fallback = None
+        self.recorded_session = None
         self.build_ui()
     
     def build_ui(self):
@@ -794,13 +1506,12 @@ class MainScreen(Screen):
         )
         
         header = BoxLayout(size_hint_y=0.08)
-        header.add_widget(Label(
+        header.add_widget(theme.tint(Label(
             text='Screen Guardian',
             font_size=sp(22),
             bold=True,
-            color=COLORS['text_primary'],
             halign='left'
-        ))
+        ), 'text_primary'))
         content.add_widget(header)
         
         tabs = BoxLayout(size_hint_y=0.08, spacing=dp(5))
@@ -810,7 +1521,7 @@ class MainScreen(Screen):
         for i, name in enumerate(tab_names):
             btn = StyledButton(
                 text=name,
-                btn_color=COLORS['primary'] if i == 0 else COLORS['surface_light'],
+                btn_color='primary' if i == 0 else 'surface_light',
                 font_size=sp(12)
             )
             btn.tab_index = i
@@ -827,12 +1538,13 @@ class MainScreen(Screen):
         self.add_widget(layout)
         
         self.current_tab = 0
+        self.stats_range = 7
         self.build_timer_tab()
     
     def switch_tab(self, instance):
         for btn in self.tab_buttons:
-            btn.set_color(COLORS['surface_light'])
-        instance.set_color(COLORS['primary'])
+            btn.set_color('surface_light')
+        instance.set_color('primary')
         
         self.current_tab = instance.tab_index
         self.tab_content.clear_widgets()
@@ -862,47 +1574,43 @@ class MainScreen(Screen):
         )
         timer_section.add_widget(self.progress_widget)
         
-        self.time_display = Label(
+        self.time_display = theme.tint(DigitDisplay(
             text='00:00',
             font_size=sp(44),
-            bold=True,
-            color=COLORS['text_primary']
-        )
+            bold=True
+        ), 'text_primary')
         timer_section.add_widget(self.time_display)
         
         status_row = BoxLayout(size_hint_y=0.15)
-        self.status_indicator = PulsingDot(
+        self.status_indicator = theme.tint(PulsingDot(
             size_hint=(None, None),
-            size=(dp(10), dp(10)),
-            color=COLORS['text_secondary']
-        )
+            size=(dp(10), dp(10))
+        ), 'text_secondary')
         status_row.add_widget(Widget())
         status_row.add_widget(self.status_indicator)
-        self.status_label = Label(
+        self.status_label = theme.tint(Label(
             text='Ready',
-            font_size=sp(14),
-            color=COLORS['text_secondary']
-        )
+            font_size=sp(14)
+        ), 'text_secondary')
         status_row.add_widget(self.status_label)
         status_row.add_widget(Widget())
         timer_section.add_widget(status_row)
         
         content.add_widget(timer_section)
         
-        presets_label = Label(
+        presets_label = theme.tint(Label(
             text='Quick Presets',
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             size_hint_y=0.05,
             halign='left'
-        )
+        ), 'text_secondary')
         content.add_widget(presets_label)
         
         presets_row = BoxLayout(size_hint_y=0.08, spacing=dp(10))
         for preset in TIME_PRESETS:
             btn = StyledButton(
                 text=preset['label'],
-                btn_color=COLORS['surface_light'],
+                btn_color='surface_light',
                 font_size=sp(14)
             )
             btn.preset_minutes = preset['minutes']
@@ -911,12 +1619,11 @@ class MainScreen(Screen):
         content.add_widget(presets_row)
         
         slider_section = BoxLayout(orientation='vertical', size_hint_y=0.1, spacing=dp(3))
-        self.limit_label = Label(
+        self.limit_label = theme.tint(Label(
             text=f"Custom: {self.config['timer_minutes']} min",
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             halign='left'
-        )
+        ), 'text_secondary')
         slider_section.add_widget(self.limit_label)
         
         self.limit_slider = Slider(
@@ -929,23 +1636,22 @@ class MainScreen(Screen):
         content.add_widget(slider_section)
         
         btn_row = BoxLayout(size_hint_y=0.1, spacing=dp(15))
-        self.start_btn = StyledButton(text='START', btn_color=COLORS['success'], font_size=sp(16))
+        self.start_btn = StyledButton(text='START', btn_color='success', font_size=sp(16))
         self.start_btn.bind(on_release=self.start_timer)
         btn_row.add_widget(self.start_btn)
         
-        self.stop_btn = StyledButton(text='STOP', btn_color=COLORS['error'], font_size=sp(16))
+        self.stop_btn = StyledButton(text='STOP', btn_color='error', font_size=sp(16))
         self.stop_btn.bind(on_release=self.stop_timer)
         btn_row.add_widget(self.stop_btn)
         content.add_widget(btn_row)
         
         overlay_section = BoxLayout(orientation='vertical', size_hint_y=0.18, spacing=dp(3))
-        overlay_section.add_widget(Label(
+        overlay_section.add_widget(theme.tint(Label(
             text='Overlay Style',
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             halign='left',
             size_hint_y=0.25
-        ))
+        ), 'text_secondary'))
         
         overlay_names = ['Random'] + [k.replace('_', ' ').title() for k in OVERLAY_THEMES.keys()]
         
@@ -956,7 +1662,7 @@ class MainScreen(Screen):
         for i, name in enumerate(overlay_names[:4]):
             btn = StyledButton(
                 text=name,
-                btn_color=COLORS['primary'] if i == 0 else COLORS['surface_light'],
+                btn_color='primary' if i == 0 else 'surface_light',
                 font_size=sp(10)
             )
             btn.overlay_name = name.lower().replace(' ', '_')
@@ -967,7 +1673,7 @@ class MainScreen(Screen):
         for name in overlay_names[4:]:
             btn = StyledButton(
                 text=name,
-                btn_color=COLORS['surface_light'],
+                btn_color='surface_light',
                 font_size=sp(10)
             )
             btn.overlay_name = name.lower().replace(' ', '_')
@@ -980,17 +1686,16 @@ class MainScreen(Screen):
         content.add_widget(overlay_section)
         
         perm_row = BoxLayout(size_hint_y=0.08, spacing=dp(10))
-        self.perm_status = Label(
+        self.perm_status = theme.tint(Label(
             text='Checking...',
             font_size=sp(11),
-            color=COLORS['warning'],
             size_hint_x=0.5
-        )
+        ), 'warning')
         perm_row.add_widget(self.perm_status)
         
         perm_btn = StyledButton(
             text='Grant Permission',
-            btn_color=COLORS['surface_light'],
+            btn_color='surface_light',
             font_size=sp(11),
             size_hint_x=0.5
         )
@@ -1009,22 +1714,24 @@ class MainScreen(Screen):
     
     def select_overlay(self, instance):
         for btn in self.overlay_buttons:
-            btn.set_color(COLORS['surface_light'])
-        instance.set_color(COLORS['primary'])
+            btn.set_color('surface_light')
+        instance.set_color('primary')
         self.config['selected_overlay'] = instance.overlay_name
         Config.save(self.config)
     
     def check_permission(self):
         if AndroidHelper.has_overlay_permission():
             self.perm_status.text = "Permission: Granted"
-            self.perm_status.color = COLORS['success']
+            theme.tint(self.perm_status, 'success')
         else:
             self.perm_status.text = "Permission: Required"
-            self.perm_status.color = COLORS['error']
+            theme.tint(self.perm_status, 'error')
     
     def check_existing_timer(self):
         if self.config.get('is_timer_active') and self.config.get('timer_end_timestamp'):
             end_time = datetime.fromisoformat(self.config['timer_end_timestamp'])
+            if self.config.get('timer_start_timestamp'):
+                self.timer_start_time = datetime.fromisoformat(self.config['timer_start_timestamp'])
             if datetime.now() < end_time:
                 self.timer_end_time = end_time
                 self.resume_countdown()
@@ -1040,29 +1747,40 @@ class MainScreen(Screen):
     
     def start_timer(self, instance):
         if not AndroidHelper.has_overlay_permission():
-            popup = Popup(
-                title='Permission Required',
-                content=Label(text='Please grant Overlay\npermission first!'),
-                size_hint=(0.8, 0.3)
-            )
-            popup.open()
+            PopupManager.show('Permission Required', 'Please grant Overlay\npermission first!', size_hint=(0.8, 0.3))
             return
         
         minutes = int(self.limit_slider.value)
+        now = datetime.now()
+        profile_id = self.config.get('active_profile', 'default')
+        schedule = schedule_engine.active_schedule(self.config)
+        allowed = Config.quota_ledger().allowed_minutes(
+            profile_id, profile_store.load(profile_id), now)
+        if allowed == 0:
+            boundary = schedule.next_boundary(now)
+            if not schedule.is_allowed(now) and boundary:
+                message = f"Screen time is not allowed\nuntil {boundary.strftime('%a %H:%M')}"
+            else:
+                message = "Today's screen time\nis used up"
+            PopupManager.show('Not Allowed', message, size_hint=(0.8, 0.3))
+            return
+        if allowed is not None and minutes > allowed:
+            minutes = allowed
+            PopupManager.show('Daily Limit', f'Timer shortened to {minutes} min\nto fit the daily limit', size_hint=(0.8, 0.3))
         self.timer_end_time = datetime.now() + timedelta(minutes=minutes)
         self.timer_start_time = datetime.now()
         self.total_timer_minutes = minutes
         
         self.config['timer_end_timestamp'] = self.timer_end_time.isoformat()
+        self.config['timer_start_timestamp'] = self.timer_start_time.isoformat()
         self.config['is_timer_active'] = True
         self.config['timer_minutes'] = minutes
-        Config.save(self.config)
-        
-        AndroidHelper.start_timer_service()
+        # The service reads the timer from disk, so start it once the save lands.
+        Config.save(self.config, lambda saved: saved is not None and AndroidHelper.start_timer_service())
         
         self.status_label.text = "Timer Active"
-        self.status_label.color = COLORS['success']
-        self.status_indicator.color = COLORS['success']
+        theme.tint(self.status_label, 'success')
+        theme.tint(self.status_indicator, 'success')
         
         self.warning_shown = False
         self.last_break_reminder = datetime.now()
@@ -1072,20 +1790,15 @@ class MainScreen(Screen):
         if self.config.get('sound_enabled', True):
             SoundManager.play_tick()
         
-        popup = Popup(
-            title='Timer Started',
-            content=Label(text=f'Limit: {minutes} min\n\nOverlay appears when done.', halign='center'),
-            size_hint=(0.75, 0.35)
-        )
-        popup.open()
+        PopupManager.show('Timer Started', f'Limit: {minutes} min\n\nOverlay appears when done.')
     
     def resume_countdown(self):
         if hasattr(self, 'countdown_event') and self.countdown_event:
             self.countdown_event.cancel()
         self.countdown_event = Clock.schedule_interval(self.update_countdown, 0.5)
         self.status_label.text = "Timer Active"
-        self.status_label.color = COLORS['success']
-        self.status_indicator.color = COLORS['success']
+        theme.tint(self.status_label, 'success')
+        theme.tint(self.status_indicator, 'success')
     
     def update_countdown(self, dt):
         if not hasattr(self, 'timer_end_time') or not self.timer_end_time:
@@ -1097,7 +1810,7 @@ class MainScreen(Screen):
         if remaining.total_seconds() <= 0:
             self.time_display.text = "00:00"
             self.progress_widget.progress = 1
-            self.trigger_overlay()
+            self.on_timer_elapsed()
             return
         
         total_seconds = int(remaining.total_seconds())
@@ -1115,9 +1828,9 @@ class MainScreen(Screen):
             self.show_warning()
         
         if total_seconds <= 60:
-            self.progress_widget.color = list(COLORS['error'])
+            theme.tint(self.progress_widget, 'error')
         elif total_seconds <= warning_time * 60:
-            self.progress_widget.color = list(COLORS['warning'])
+            theme.tint(self.progress_widget, 'warning')
         
         if self.config.get('break_reminder_enabled', True):
             break_interval = self.config.get('break_reminder_interval', 30) * 60
@@ -1132,40 +1845,87 @@ class MainScreen(Screen):
         if self.config.get('sound_enabled', True):
             SoundManager.play_warning()
         
-        popup = Popup(
-            title='Time Warning',
-            content=Label(text=f'Only {warning_time} minutes remaining!\n\nSave your work.', halign='center'),
-            size_hint=(0.75, 0.35),
-            auto_dismiss=True
-        )
-        popup.open()
-        Clock.schedule_once(lambda dt: popup.dismiss(), 5)
+        PopupManager.show('Time Warning', f'Only {warning_time} minutes remaining!\n\nSave your work.', timeout=5)
     
     def show_break_reminder(self):
-        popup = Popup(
-            title='Break Time',
-            content=Label(text='Remember to take a break!\n\nStretch and rest your eyes.', halign='center'),
-            size_hint=(0.75, 0.35),
-            auto_dismiss=True
-        )
-        popup.open()
-        Clock.schedule_once(lambda dt: popup.dismiss(), 5)
+        PopupManager.show('Break Time', 'Remember to take a break!\n\nStretch and rest your eyes.', timeout=5)
     
-    def trigger_overlay(self):
-        if hasattr(self, 'countdown_event') and self.countdown_event:
+    def on_timer_elapsed(self):
+        """The countdown reached zero. While connected, the service owns expiry
+        and this only waits for its event; otherwise expire locally."""
+        if self.countdown_event:
+            self.countdown_event.cancel()
+            self.countdown_event = None
+        app = App.get_running_app()
+        if app and app.service_events.connected:
+            if not self.expiry_fallback:
+                self.expiry_fallback = Clock.schedule_once(lambda dt: self.trigger_overlay(), SERVICE_EXPIRY_GRACE)
+        else:
+            self.trigger_overlay()
+    
+    def on_service_expired(self, event):
+        """The service ended the timer and already cleared it in the config."""
+        if self.expiry_fallback:
+            self.expiry_fallback.cancel()
+            self.expiry_fallback = None
+        if self.countdown_event:
             self.countdown_event.cancel()
             self.countdown_event = None
         
-        elapsed_minutes = self.config.get('timer_minutes', 5)
-        Config.record_usage(elapsed_minutes)
-        
+        self.record_timer_usage(
+            datetime.fromisoformat(event['start']),
+            datetime.fromisoformat(event['ended']),
+            event['profile'],
+            session_id=event['session'],
+            logged=True
+        )
+        self.timer_end_time = None
+        self.timer_start_time = None
+        self.config = Config.load()
+        self.show_times_up()
+        self.show_blocked()
+    
+    def record_timer_usage(self, start, end, profile_id=None, session_id=None, logged=False):
+        """Record a finished timer once, whether the service or the app ended it."""
+        profile_id = profile_id or self.config.get('active_profile', 'default')
+        session_id = session_id or usage_log.timer_session_id(profile_id, start.isoformat())
+        if session_id == self.recorded_session:
+            return
+        self.recorded_session = session_id
+        Config.record_session(start, end, profile_id, session_id, logged)
+    
+    def show_times_up(self):
         self.status_label.text = "Time's Up!"
-        self.status_label.color = COLORS['error']
-        self.status_indicator.color = COLORS['error']
+        theme.tint(self.status_label, 'error')
+        theme.tint(self.status_indicator, 'error')
         self.time_display.text = "00:00"
         
         if self.config.get('sound_enabled', True):
             SoundManager.play_alert()
+    
+    def show_blocked(self):
+        selected = self.config.get('selected_overlay', 'random')
+        if selected == 'random':
+            selected = random.choice(list(OVERLAY_THEMES.keys()))
+        
+        self.manager.get_screen('blocked').set_custom_message(
+            self.config.get('custom_overlay_message', '')
+        )
+        self.manager.get_screen('blocked').set_theme(selected)
+        self.manager.current = 'blocked'
+    
+    def trigger_overlay(self):
+        """Expire the timer from the app, used when the service is not running."""
+        self.expiry_fallback = None
+        if hasattr(self, 'countdown_event') and self.countdown_event:
+            self.countdown_event.cancel()
+            self.countdown_event = None
+        
+        end = getattr(self, 'timer_end_time', None) or datetime.now()
+        start = getattr(self, 'timer_start_time', None) or end - timedelta(minutes=self.config.get('timer_minutes', 5))
+        self.record_timer_usage(start, min(end, datetime.now()))
+        
+        self.show_times_up()
         
         success = AndroidHelper.show_overlay_window()
         
@@ -1173,16 +1933,7 @@ class MainScreen(Screen):
             self.config['is_timer_active'] = False
             self.config['timer_end_timestamp'] = None
             Config.save(self.config)
-            
-            selected = self.config.get('selected_overlay', 'random')
-            if selected == 'random':
-                selected = random.choice(list(OVERLAY_THEMES.keys()))
-            
-            self.manager.get_screen('blocked').set_theme(selected)
-            self.manager.get_screen('blocked').set_custom_message(
-                self.config.get('custom_overlay_message', '')
-            )
-            self.manager.current = 'blocked'
+            self.show_blocked()
     
     def stop_timer(self, instance):
         if hasattr(self, 'countdown_event') and self.countdown_event:
@@ -1190,8 +1941,8 @@ class MainScreen(Screen):
             self.countdown_event = None
         
         if hasattr(self, 'timer_start_time') and self.timer_start_time:
-            elapsed = (datetime.now() - self.timer_start_time).total_seconds() / 60
-            Config.record_usage(int(elapsed))
+            self.record_timer_usage(self.timer_start_time, datetime.now())
+            self.timer_start_time = None
         
         self.timer_end_time = None
         self.config['is_timer_active'] = False
@@ -1202,11 +1953,11 @@ class MainScreen(Screen):
         AndroidHelper.hide_overlay_window()
         
         self.status_label.text = "Stopped"
-        self.status_label.color = COLORS['text_secondary']
-        self.status_indicator.color = COLORS['text_secondary']
+        theme.tint(self.status_label, 'text_secondary')
+        theme.tint(self.status_indicator, 'text_secondary')
         self.time_display.text = "00:00"
         self.progress_widget.progress = 0
-        self.progress_widget.color = list(COLORS['primary'])
+        theme.tint(self.progress_widget, 'primary')
     
     def build_schedule_tab(self):
         self.config = Config.load()
@@ -1215,26 +1966,24 @@ class MainScreen(Screen):
         content = BoxLayout(orientation='vertical', spacing=dp(10), size_hint_y=None)
         content.bind(minimum_height=content.setter('height'))
         
-        title = Label(
+        title = theme.tint(Label(
             text='Weekly Schedule',
             font_size=sp(18),
             bold=True,
-            color=COLORS['text_primary'],
             size_hint_y=None,
             height=dp(40)
-        )
+        ), 'text_primary')
         content.add_widget(title)
         
-        subtitle = Label(
-            text='Set daily time limits for each day',
+        subtitle = theme.tint(Label(
+            text='Set daily time limits and bedtime for each day',
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             size_hint_y=None,
             height=dp(25)
-        )
+        ), 'text_secondary')
         content.add_widget(subtitle)
         
-        profile = self.config['profiles'].get(self.config['active_profile'], {})
+        profile = profile_store.load(self.config['active_profile'])
         schedule = profile.get('schedule', {})
         
         self.day_sliders = {}
@@ -1245,35 +1994,82 @@ class MainScreen(Screen):
             day_limit = schedule.get(day, 120)
             
             header = BoxLayout(size_hint_y=0.4)
-            header.add_widget(Label(
+            header.add_widget(theme.tint(Label(
                 text=day,
                 font_size=sp(14),
-                color=COLORS['text_primary'],
                 halign='left',
-                size_hint_x=0.5
-            ))
-            limit_label = Label(
+                size_hint_x=0.35
+            ), 'text_primary'))
+            suggest_label = theme.tint(Label(
+                text='',
+                font_size=sp(11),
+                size_hint_x=0.35
+            ), 'text_secondary')
+            header.add_widget(suggest_label)
+            limit_label = theme.tint(Label(
                 text=f'{day_limit} min',
                 font_size=sp(14),
-                color=COLORS['primary'],
                 halign='right',
-                size_hint_x=0.5
-            )
+                size_hint_x=0.3
+            ), 'primary')
             header.add_widget(limit_label)
             day_box.add_widget(header)
             
             slider = Slider(min=0, max=240, value=day_limit, size_hint_y=0.6)
             slider.day = day
             slider.limit_label = limit_label
+            slider.suggest_label = suggest_label
             slider.bind(value=self.on_schedule_change)
             self.day_sliders[day] = slider
             day_box.add_widget(slider)
             
             content.add_widget(day_box)
         
+        bedtime = next(iter(profile.get('blocked_windows', [])), None)
+        bedtime_times = [schedule_engine.format_time(m) for m in range(0, 24 * 60, 30)]
+        bedtime_row = BoxLayout(size_hint_y=None, height=dp(45), spacing=dp(8))
+        bedtime_row.add_widget(theme.tint(Label(
+            text='School-night bedtime',
+            font_size=sp(14),
+            size_hint_x=0.4
+        ), 'text_primary'))
+        self.bedtime_switch = Switch(active=bedtime is not None, size_hint_x=0.2)
+        bedtime_row.add_widget(self.bedtime_switch)
+        self.bedtime_start = Spinner(
+            text=bedtime['start'] if bedtime else '21:00',
+            values=bedtime_times,
+            size_hint_x=0.2
+        )
+        bedtime_row.add_widget(self.bedtime_start)
+        self.bedtime_end = Spinner(
+            text=bedtime['end'] if bedtime else '07:00',
+            values=bedtime_times,
+            size_hint_x=0.2
+        )
+        bedtime_row.add_widget(self.bedtime_end)
+        content.add_widget(bedtime_row)
+        
+        self.recommendation_label = theme.tint(Label(
+            text='Analyzing usage...',
+            font_size=sp(12),
+            size_hint_y=None,
+            height=dp(40)
+        ), 'text_secondary')
+        content.add_widget(self.recommendation_label)
+        
+        apply_btn = StyledButton(
+            text='Apply Suggestions',
+            btn_color='surface_light',
+            size_hint_y=None,
+            height=dp(45),
+            font_size=sp(14)
+        )
+        apply_btn.bind(on_release=self.apply_recommendations)
+        content.add_widget(apply_btn)
+        
         save_btn = StyledButton(
             text='Save Schedule',
-            btn_color=COLORS['success'],
+            btn_color='success',
             size_hint_y=None,
             height=dp(50),
             font_size=sp(16)
@@ -1285,25 +2081,79 @@ class MainScreen(Screen):
         
         scroll.add_widget(content)
         self.tab_content.add_widget(scroll)
+        self.load_recommendations()
+    
+    def load_recommendations(self):
+        end = datetime.now().date()
+        start = end - timedelta(days=usage_analytics.HISTORY_DAYS - 1)
+        
+        def load_profile(profile_id):
+            stats = Config.load_stats(profile_id)
+            series = usage_query.DayIndex.from_daily(stats.get('daily', {})).series(start, end)
+            extensions = sum(
+                count for day, count in stats.get('extensions', {}).items()
+                if start.isoformat() <= day <= end.isoformat()
+            )
+            return series, extensions
+        
+        usage_analytics.analyze_async(
+            load_profile,
+            profile_store.ids(),
+            end,
+            lambda results: Clock.schedule_once(lambda dt: self.show_recommendations(results))
+        )
+    
+    def show_recommendations(self, results):
+        self.recommendations = results.get(usage_store.active_profile)
+        if not self.recommendations or not hasattr(self, 'day_sliders'):
+            return
+        rec = self.recommendations
+        for i, day in enumerate(DAYS_OF_WEEK):
+            suggested = rec['weekday'][i]
+            self.day_sliders[day].suggest_label.text = f"suggest {suggested}" if suggested is not None else ''
+        if rec['daily_limit'] is None:
+            self.recommendation_label.text = (
+                f"Not enough usage history for suggestions yet\n"
+                f"({rec['history']} of {usage_analytics.MIN_DAILY_HISTORY} days with usage)"
+            )
+            return
+        trend = f"+{rec['trend']}" if rec['trend'] > 0 else f"{rec['trend']}"
+        self.recommendation_label.text = (
+            f"Suggested daily limit: {rec['daily_limit']} min\n"
+            f"Weekdays avg {rec['weekday_avg']} / weekends avg {rec['weekend_avg']} min, "
+            f"trend {trend} min/week"
+        )
+    
+    def apply_recommendations(self, instance):
+        rec = getattr(self, 'recommendations', None)
+        if not rec:
+            return
+        for i, day in enumerate(DAYS_OF_WEEK):
+            if rec['weekday'][i] is not None:
+                self.day_sliders[day].value = rec['weekday'][i]
     
     def on_schedule_change(self, instance, value):
         instance.limit_label.text = f'{int(value)} min'
     
     def save_schedule(self, instance):
-        profile_name = self.config['active_profile']
+        profile_id = self.config['active_profile']
+        profile = profile_store.load(profile_id)
         schedule = {}
         for day, slider in self.day_sliders.items():
             schedule[day] = int(slider.value)
         
-        self.config['profiles'][profile_name]['schedule'] = schedule
-        Config.save(self.config)
+        profile['schedule'] = schedule
+        blocked_windows = []
+        if self.bedtime_switch.active:
+            blocked_windows.append({
+                'days': schedule_engine.SCHOOL_NIGHTS,
+                'start': self.bedtime_start.text,
+                'end': self.bedtime_end.text
+            })
+        profile['blocked_windows'] = blocked_windows
+        Config.save_profile(profile_id, profile)
         
-        popup = Popup(
-            title='Saved',
-            content=Label(text='Schedule saved successfully!'),
-            size_hint=(0.7, 0.25)
-        )
-        popup.open()
+        PopupManager.show('Saved', 'Schedule saved successfully!', size_hint=(0.7, 0.25))
     
     def build_profiles_tab(self):
         self.config = Config.load()
@@ -1312,86 +2162,30 @@ class MainScreen(Screen):
         content = BoxLayout(orientation='vertical', spacing=dp(15), size_hint_y=None)
         content.bind(minimum_height=content.setter('height'))
         
-        title = Label(
+        title = theme.tint(Label(
             text='Child Profiles',
             font_size=sp(18),
             bold=True,
-            color=COLORS['text_primary'],
             size_hint_y=None,
             height=dp(40)
-        )
+        ), 'text_primary')
         content.add_widget(title)
         
-        for profile_id, profile_data in self.config['profiles'].items():
-            profile_box = BoxLayout(
-                orientation='vertical',
-                size_hint_y=None,
-                height=dp(100),
-                padding=dp(10),
-                spacing=dp(5)
-            )
-            
-            with profile_box.canvas.before:
-                Color(*COLORS['surface'])
-                profile_box._rect = RoundedRectangle(pos=profile_box.pos, size=profile_box.size, radius=[dp(10)])
-            profile_box.bind(pos=lambda w, p: setattr(w._rect, 'pos', p))
-            profile_box.bind(size=lambda w, s: setattr(w._rect, 'size', s))
-            
-            header = BoxLayout(size_hint_y=0.4)
-            header.add_widget(Label(
-                text=f"  {profile_data.get('name', 'Child')}",
-                font_size=sp(16),
-                bold=True,
-                color=COLORS['text_primary'],
-                halign='left'
-            ))
-            
-            if profile_id == self.config['active_profile']:
-                active_label = Label(
-                    text='ACTIVE',
-                    font_size=sp(10),
-                    color=COLORS['success'],
-                    size_hint_x=0.3
-                )
-                header.add_widget(active_label)
-            
-            profile_box.add_widget(header)
-            
-            info = Label(
-                text=f"Daily limit: {profile_data.get('daily_limit', 120)} min",
-                font_size=sp(12),
-                color=COLORS['text_secondary'],
-                halign='left',
-                size_hint_y=0.3
-            )
-            profile_box.add_widget(info)
-            
-            btn_row = BoxLayout(size_hint_y=0.3, spacing=dp(10))
-            
-            select_btn = StyledButton(
-                text='Select',
-                btn_color=COLORS['primary'],
-                font_size=sp(11)
-            )
-            select_btn.profile_id = profile_id
-            select_btn.bind(on_release=self.select_profile)
-            btn_row.add_widget(select_btn)
-            
-            edit_btn = StyledButton(
-                text='Edit',
-                btn_color=COLORS['surface_light'],
-                font_size=sp(11)
-            )
-            edit_btn.profile_id = profile_id
-            edit_btn.bind(on_release=self.edit_profile)
-            btn_row.add_widget(edit_btn)
-            
-            profile_box.add_widget(btn_row)
-            content.add_widget(profile_box)
+        self.profiles_content = content
+        self.profiles_shown = 0
+        self.more_profiles_btn = StyledButton(
+            text='Show More',
+            btn_color='surface_light',
+            size_hint_y=None,
+            height=dp(45),
+            font_size=sp(14)
+        )
+        self.more_profiles_btn.bind(on_release=self.show_more_profiles)
+        self.show_more_profiles()
         
         add_btn = StyledButton(
             text='+ Add New Profile',
-            btn_color=COLORS['secondary'],
+            btn_color='secondary',
             size_hint_y=None,
             height=dp(50),
             font_size=sp(16)
@@ -1404,14 +2198,90 @@ class MainScreen(Screen):
         scroll.add_widget(content)
         self.tab_content.add_widget(scroll)
     
+    def show_more_profiles(self, *args):
+        content = self.profiles_content
+        if self.more_profiles_btn.parent:
+            content.remove_widget(self.more_profiles_btn)
+        insert_at = len(content.children) - 1 - self.profiles_shown
+        for profile_id, profile_data in profile_store.page(self.profiles_shown, PROFILES_PAGE_SIZE):
+            content.add_widget(self.build_profile_card(profile_id, profile_data), index=insert_at)
+            self.profiles_shown += 1
+        if self.profiles_shown < len(profile_store.index()):
+            content.add_widget(self.more_profiles_btn, index=len(content.children) - 1 - self.profiles_shown)
+    
+    def build_profile_card(self, profile_id, profile_data):
+        profile_box = BoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            height=dp(100),
+            padding=dp(10),
+            spacing=dp(5)
+        )
+        
+        with profile_box.canvas.before:
+            theme.tint(Color(), 'surface', 'rgba')
+            profile_box._rect = RoundedRectangle(pos=profile_box.pos, size=profile_box.size, radius=[dp(10)])
+        profile_box.bind(pos=lambda w, p: setattr(w._rect, 'pos', p))
+        profile_box.bind(size=lambda w, s: setattr(w._rect, 'size', s))
+        
+        header = BoxLayout(size_hint_y=0.4)
+        header.add_widget(theme.tint(Label(
+            text=f"  {profile_data.get('name', 'Child')}",
+            font_size=sp(16),
+            bold=True,
+            halign='left'
+        ), 'text_primary'))
+        
+        if profile_id == self.config['active_profile']:
+            active_label = theme.tint(Label(
+                text='ACTIVE',
+                font_size=sp(10),
+                size_hint_x=0.3
+            ), 'success')
+            header.add_widget(active_label)
+        
+        profile_box.add_widget(header)
+        
+        info = theme.tint(Label(
+            text=f"Daily limit: {profile_data.get('daily_limit', 120)} min",
+            font_size=sp(12),
+            halign='left',
+            size_hint_y=0.3
+        ), 'text_secondary')
+        profile_box.add_widget(info)
+        
+        btn_row = BoxLayout(size_hint_y=0.3, spacing=dp(10))
+        
+        select_btn = StyledButton(
+            text='Select',
+            btn_color='primary',
+            font_size=sp(11)
+        )
+        select_btn.profile_id = profile_id
+        select_btn.bind(on_release=self.select_profile)
+        btn_row.add_widget(select_btn)
+        
+        edit_btn = StyledButton(
+            text='Edit',
+            btn_color='surface_light',
+            font_size=sp(11)
+        )
+        edit_btn.profile_id = profile_id
+        edit_btn.bind(on_release=self.edit_profile)
+        btn_row.add_widget(edit_btn)
+        
+        profile_box.add_widget(btn_row)
+        return profile_box
+    
     def select_profile(self, instance):
         self.config['active_profile'] = instance.profile_id
+        usage_store.activate(instance.profile_id)
         Config.save(self.config)
         self.switch_tab(self.tab_buttons[2])
     
     def edit_profile(self, instance):
         profile_id = instance.profile_id
-        profile = self.config['profiles'].get(profile_id, {})
+        profile = profile_store.load(profile_id)
         
         content = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(15))
         
@@ -1429,13 +2299,13 @@ class MainScreen(Screen):
         content.add_widget(limit_input)
         
         def save_profile(btn):
-            self.config['profiles'][profile_id]['name'] = name_input.text
-            self.config['profiles'][profile_id]['daily_limit'] = int(limit_input.text or 120)
-            Config.save(self.config)
+            profile['name'] = name_input.text
+            profile['daily_limit'] = int(limit_input.text or 120)
+            Config.save_profile(profile_id, profile)
             popup.dismiss()
             self.switch_tab(self.tab_buttons[2])
         
-        save_btn = StyledButton(text='Save', btn_color=COLORS['success'], size_hint_y=0.15)
+        save_btn = StyledButton(text='Save', btn_color='success', size_hint_y=0.15)
         save_btn.bind(on_release=save_profile)
         content.add_widget(save_btn)
         
@@ -1456,17 +2326,15 @@ class MainScreen(Screen):
         content.add_widget(limit_input)
         
         def create_profile(btn):
-            profile_id = f"profile_{len(self.config['profiles'])}"
-            self.config['profiles'][profile_id] = {
+            Config.save_profile(profile_store.new_id(), {
                 'name': name_input.text or 'Child',
                 'daily_limit': int(limit_input.text or 120),
                 'schedule': {}
-            }
-            Config.save(self.config)
+            })
             popup.dismiss()
             self.switch_tab(self.tab_buttons[2])
         
-        create_btn = StyledButton(text='Create', btn_color=COLORS['success'], size_hint_y=0.15)
+        create_btn = StyledButton(text='Create', btn_color='success', size_hint_y=0.15)
         create_btn.bind(on_release=create_profile)
         content.add_widget(create_btn)
         
@@ -1475,6 +2343,12 @@ class MainScreen(Screen):
         popup = Popup(title='New Profile', content=content, size_hint=(0.85, 0.55))
         popup.open()
     
+    def on_stats_folded(self, folded):
+        """Redraw the Stats tab when the usage it shows has been folded."""
+        if self.current_tab == 3 and usage_store.active_profile in folded:
+            self.tab_content.clear_widgets()
+            self.build_stats_tab()
+    
     def build_stats_tab(self):
         stats = Config.load_stats()
         
@@ -1482,33 +2356,31 @@ class MainScreen(Screen):
         content = BoxLayout(orientation='vertical', spacing=dp(10), size_hint_y=None)
         content.bind(minimum_height=content.setter('height'))
         
-        title = Label(
-            text='Usage Statistics',
+        profile = profile_store.index().get(usage_store.active_profile, {})
+        title = theme.tint(Label(
+            text=f"Usage Statistics - {profile.get('name', 'Child')}",
             font_size=sp(18),
             bold=True,
-            color=COLORS['text_primary'],
             size_hint_y=None,
             height=dp(40)
-        )
+        ), 'text_primary')
         content.add_widget(title)
         
         today = datetime.now().strftime("%Y-%m-%d")
         today_usage = stats.get('daily', {}).get(today, 0)
         
         today_box = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(80))
-        today_box.add_widget(Label(
+        today_box.add_widget(theme.tint(Label(
             text='Today',
             font_size=sp(14),
-            color=COLORS['text_secondary'],
             size_hint_y=0.3
-        ))
-        today_box.add_widget(Label(
+        ), 'text_secondary'))
+        today_box.add_widget(theme.tint(Label(
             text=f'{today_usage} minutes',
             font_size=sp(28),
             bold=True,
-            color=COLORS['primary'],
             size_hint_y=0.5
-        ))
+        ), 'primary'))
         today_bar = StatBar(
             value=today_usage,
             max_value=120,
@@ -1519,59 +2391,146 @@ class MainScreen(Screen):
         today_box.add_widget(today_bar)
         content.add_widget(today_box)
         
-        week_label = Label(
-            text='Last 7 Days',
+        range_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
+        self.range_buttons = []
+        for preset in STATS_RANGES:
+            btn = StyledButton(
+                text=preset['label'],
+                btn_color='primary' if preset['days'] == self.stats_range else 'surface_light',
+                font_size=sp(12)
+            )
+            btn.range_days = preset['days']
+            btn.bind(on_release=self.select_stats_range)
+            self.range_buttons.append(btn)
+            range_row.add_widget(btn)
+        content.add_widget(range_row)
+        
+        self.range_label = theme.tint(Label(
+            text='',
             font_size=sp(14),
-            color=COLORS['text_secondary'],
             size_hint_y=None,
             height=dp(30)
+        ), 'text_secondary')
+        content.add_widget(self.range_label)
+        
+        self.usage_index = Config.usage_index()
+        self.usage_chart = UsageChart(
+            bar_color=COLORS['primary'],
+            highlight_color=COLORS['secondary'],
+            size_hint_y=None,
+            height=dp(160)
         )
-        content.add_widget(week_label)
-        
-        week_total = 0
-        for i in range(7):
-            day = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            day_name = (datetime.now() - timedelta(days=i)).strftime("%a")
-            usage = stats.get('daily', {}).get(day, 0)
-            week_total += usage
-            
-            day_row = BoxLayout(size_hint_y=None, height=dp(35), spacing=dp(10))
-            day_row.add_widget(Label(
-                text=day_name,
-                font_size=sp(12),
-                color=COLORS['text_secondary'],
-                size_hint_x=0.2
-            ))
-            day_bar = StatBar(
-                value=usage,
-                max_value=180,
-                bar_color=COLORS['secondary'] if i == 0 else COLORS['surface_light'],
-                size_hint_x=0.6
-            )
-            day_row.add_widget(day_bar)
-            day_row.add_widget(Label(
-                text=f'{usage}m',
-                font_size=sp(12),
-                color=COLORS['text_primary'],
-                size_hint_x=0.2
-            ))
-            content.add_widget(day_row)
+        content.add_widget(self.usage_chart)
         
-        avg_daily = week_total // 7 if week_total > 0 else 0
-        summary = Label(
-            text=f'Weekly Total: {week_total} min  |  Daily Average: {avg_daily} min',
+        self.stats_summary = theme.tint(Label(
+            text='',
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             size_hint_y=None,
             height=dp(35)
-        )
-        content.add_widget(summary)
+        ), 'text_secondary')
+        content.add_widget(self.stats_summary)
+        self.show_stats_range(self.stats_range)
+        
+        content.add_widget(theme.tint(Label(
+            text='Usage by Hour',
+            font_size=sp(14),
+            size_hint_y=None,
+            height=dp(30)
+        ), 'text_secondary'))
+        
+        heatmap_row = BoxLayout(size_hint_y=None, height=dp(140), spacing=dp(5))
+        day_labels = BoxLayout(orientation='vertical', size_hint_x=0.1)
+        for day in DAYS_OF_WEEK:
+            day_labels.add_widget(theme.tint(Label(text=day[:2], font_size=sp(10)), 'text_secondary'))
+        heatmap_row.add_widget(day_labels)
+        
+        heatmap = HeatmapChart(rows=7, cols=24, high_color=COLORS['accent'], size_hint_x=0.9)
+        store = HeatmapStore.for_profile(usage_store.active_profile)
+        heatmap.set_values([seconds for row in store.grid(24) for seconds in row])
+        heatmap_row.add_widget(heatmap)
+        content.add_widget(heatmap_row)
+        
+        content.add_widget(theme.tint(Label(
+            text='00:00          06:00          12:00          18:00          24:00',
+            font_size=sp(10),
+            size_hint_y=None,
+            height=dp(20)
+        ), 'text_secondary'))
+        
+        export_row = BoxLayout(size_hint_y=None, height=dp(45), spacing=dp(10))
+        for fmt in usage_export.FORMATS:
+            btn = StyledButton(
+                text=f'Export {fmt.upper()}',
+                btn_color='surface_light',
+                font_size=sp(12)
+            )
+            btn.export_format = fmt
+            btn.bind(on_release=self.export_usage)
+            export_row.add_widget(btn)
+        content.add_widget(export_row)
         
         content.add_widget(Widget(size_hint_y=None, height=dp(20)))
         
         scroll.add_widget(content)
         self.tab_content.add_widget(scroll)
     
+    def select_stats_range(self, instance):
+        for btn in self.range_buttons:
+            btn.set_color('surface_light')
+        instance.set_color('primary')
+        self.show_stats_range(instance.range_days)
+    
+    def show_stats_range(self, days):
+        self.stats_range = days
+        end = datetime.now().date()
+        start = end - timedelta(days=days - 1)
+        values = self.usage_index.series(start, end)
+        total = self.usage_index.range_sum(start, end)
+        busiest = self.usage_index.max_day(start, end)[1]
+        label = next(p['label'] for p in STATS_RANGES if p['days'] == days)
+        self.range_label.text = f'Last {label}'
+        self.usage_chart.highlight_index = days - 1
+        self.usage_chart.set_values(values)
+        self.stats_summary.text = (
+            f'Total: {total} min  |  Daily Average: {total // days} min  |  Max: {busiest} min'
+        )
+    
+    def export_usage(self, instance):
+        fmt = instance.export_format
+        profile_id = usage_store.active_profile
+        
+        def write_files():
+            directory = os.path.join(usage_store.base_dir, EXPORT_DIR)
+            os.makedirs(directory, exist_ok=True)
+            paths = []
+            counts = []
+            for kind in usage_export.KINDS:
+                path = os.path.join(directory, f'usage_{kind}_{profile_id}.{fmt}')
+                counts.append(usage_export.export(kind, fmt, path, profile=profile_id))
+                paths.append(path)
+            return paths, counts
+        
+        def exported(future):
+            try:
+                paths, counts = future.result()
+            except Exception as e:
+                print(f"Error exporting usage: {e}")
+                message = str(e)
+                Clock.schedule_once(lambda dt: PopupManager.show('Export Failed', message, size_hint=(0.8, 0.3)))
+                return
+            Clock.schedule_once(lambda dt: self.share_export(fmt, paths, counts))
+        
+        # Streams from the stats file on the I/O thread, after any queued usage.
+        io_executor.submit(write_files).add_done_callback(exported)
+    
+    def share_export(self, fmt, paths, counts):
+        AndroidHelper.share_files(paths, 'text/csv' if fmt == 'csv' else 'application/x-ndjson')
+        PopupManager.show(
+            'Exported',
+            f'{counts[0]} sessions, {counts[1]} days and {counts[2]} weeks\nwritten to {fmt.upper()}',
+            size_hint=(0.75, 0.3)
+        )
+    
     def build_settings_tab(self):
         self.config = Config.load()
         
@@ -1579,25 +2538,24 @@ class MainScreen(Screen):
         content = BoxLayout(orientation='vertical', spacing=dp(12), size_hint_y=None)
         content.bind(minimum_height=content.setter('height'))
         
-        title = Label(
+        title = theme.tint(Label(
             text='Settings',
             font_size=sp(18),
             bold=True,
-            color=COLORS['text_primary'],
             size_hint_y=None,
             height=dp(40)
-        )
+        ), 'text_primary')
+        title.bind(on_touch_down=self.on_settings_title_touch)
         content.add_widget(title)
         
         def setting_row(label_text, widget):
             row = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(10))
-            row.add_widget(Label(
+            row.add_widget(theme.tint(Label(
                 text=label_text,
                 font_size=sp(14),
-                color=COLORS['text_primary'],
                 halign='left',
                 size_hint_x=0.6
-            ))
+            ), 'text_primary'))
             row.add_widget(widget)
             return row
         
@@ -1618,13 +2576,12 @@ class MainScreen(Screen):
         content.add_widget(setting_row('Allow Extension Requests', self.extension_switch))
         
         warning_section = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(70))
-        warning_section.add_widget(Label(
+        warning_section.add_widget(theme.tint(Label(
             text=f"Warning before end: {self.config.get('warning_before_end', 5)} min",
             font_size=sp(12),
-            color=COLORS['text_secondary'],
             halign='left',
             size_hint_y=0.4
-        ))
+        ), 'text_secondary'))
         self.warning_slider = Slider(min=1, max=15, value=self.config.get('warning_before_end', 5))
         self.warning_slider.bind(value=self.on_warning_change)
         warning_section.add_widget(self.warning_slider)
@@ -1634,13 +2591,12 @@ class MainScreen(Screen):
         content.add_widget(divider)
         
         pin_section = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(90), spacing=dp(5))
-        pin_section.add_widget(Label(
+        pin_section.add_widget(theme.tint(Label(
             text='Change PIN',
             font_size=sp(14),
-            color=COLORS['text_primary'],
             halign='left',
             size_hint_y=0.25
-        ))
+        ), 'text_primary'))
         
         pin_row = BoxLayout(size_hint_y=0.4, spacing=dp(10))
         self.new_pin_input = StyledTextInput(
@@ -1652,20 +2608,19 @@ class MainScreen(Screen):
         )
         pin_row.add_widget(self.new_pin_input)
         
-        pin_btn = StyledButton(text='Update', btn_color=COLORS['primary'], font_size=sp(12), size_hint_x=0.4)
+        pin_btn = StyledButton(text='Update', btn_color='primary', font_size=sp(12), size_hint_x=0.4)
         pin_btn.bind(on_release=self.change_pin)
         pin_row.add_widget(pin_btn)
         pin_section.add_widget(pin_row)
         content.add_widget(pin_section)
         
         recovery_section = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(120), spacing=dp(5))
-        recovery_section.add_widget(Label(
+        recovery_section.add_widget(theme.tint(Label(
             text='PIN Recovery Question',
             font_size=sp(14),
-            color=COLORS['text_primary'],
             halign='left',
             size_hint_y=0.2
-        ))
+        ), 'text_primary'))
         
         self.question_input = StyledTextInput(
             text=self.config.get('recovery_question', 'What is your favorite color?'),
@@ -1676,9 +2631,8 @@ class MainScreen(Screen):
         recovery_section.add_widget(self.question_input)
         
         self.answer_input = StyledTextInput(
-            text=self.config.get('recovery_answer', 'blue'),
             multiline=False,
-            hint_text='Answer',
+            hint_text='New answer (leave empty to keep)',
             size_hint_y=0.35
         )
         recovery_section.add_widget(self.answer_input)
@@ -1686,7 +2640,7 @@ class MainScreen(Screen):
         
         save_recovery_btn = StyledButton(
             text='Save Recovery Settings',
-            btn_color=COLORS['secondary'],
+            btn_color='secondary',
             size_hint_y=None,
             height=dp(45),
             font_size=sp(14)
@@ -1695,13 +2649,12 @@ class MainScreen(Screen):
         content.add_widget(save_recovery_btn)
         
         overlay_msg_section = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(90), spacing=dp(5))
-        overlay_msg_section.add_widget(Label(
+        overlay_msg_section.add_widget(theme.tint(Label(
             text='Custom Overlay Message',
             font_size=sp(14),
-            color=COLORS['text_primary'],
             halign='left',
             size_hint_y=0.25
-        ))
+        ), 'text_primary'))
         self.custom_msg_input = StyledTextInput(
             text=self.config.get('custom_overlay_message', ''),
             hint_text='Optional custom message...',
@@ -1710,16 +2663,71 @@ class MainScreen(Screen):
         )
         overlay_msg_section.add_widget(self.custom_msg_input)
         
-        save_msg_btn = StyledButton(text='Save Message', btn_color=COLORS['surface_light'], font_size=sp(12), size_hint_y=0.35)
+        save_msg_btn = StyledButton(text='Save Message', btn_color='surface_light', font_size=sp(12), size_hint_y=0.35)
         save_msg_btn.bind(on_release=self.save_custom_message)
         overlay_msg_section.add_widget(save_msg_btn)
         content.add_widget(overlay_msg_section)
         
+        sync_section = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(200), spacing=dp(5))
+        sync_section.add_widget(theme.tint(Label(
+            text='Device Sync',
+            font_size=sp(14),
+            halign='left',
+            size_hint_y=0.12
+        ), 'text_primary'))
+        self.sync_server_input = StyledTextInput(
+            text=self.config.get('sync_server', ''),
+            hint_text='Server URL (http://...)',
+            multiline=False,
+            size_hint_y=0.22
+        )
+        sync_section.add_widget(self.sync_server_input)
+        self.sync_group_input = StyledTextInput(
+            text=self.config.get('sync_group', ''),
+            hint_text='Family code (same on parent and child)',
+            multiline=False,
+            size_hint_y=0.22
+        )
+        sync_section.add_widget(self.sync_group_input)
+        self.stats_server_input = StyledTextInput(
+            text=self.config.get('stats_server', ''),
+            hint_text='Usage stats server URL (optional)',
+            multiline=False,
+            size_hint_y=0.22
+        )
+        sync_section.add_widget(self.stats_server_input)
+        sync_row = BoxLayout(size_hint_y=0.22, spacing=dp(10))
+        self.sync_status_label = theme.tint(Label(
+            text=f"{sync.client.pending()} changes waiting" if self.config.get('sync_server') else 'Not set up',
+            font_size=sp(11),
+            size_hint_x=0.6
+        ), 'text_secondary')
+        sync_row.add_widget(self.sync_status_label)
+        sync_btn = StyledButton(text='Save & Sync', btn_color='primary', font_size=sp(12), size_hint_x=0.4)
+        sync_btn.bind(on_release=self.save_sync_settings)
+        sync_row.add_widget(sync_btn)
+        sync_section.add_widget(sync_row)
+        content.add_widget(sync_section)
+        
         content.add_widget(Widget(size_hint_y=None, height=dp(30)))
         
         scroll.add_widget(content)
         self.tab_content.add_widget(scroll)
     
+    def on_settings_title_touch(self, instance, touch):
+        if not instance.collide_point(*touch.pos):
+            return False
+        now = datetime.now()
+        taps = [t for t in getattr(self, 'title_taps', []) if (now - t).total_seconds() < 3]
+        taps.append(now)
+        self.title_taps = taps
+        if len(taps) >= 5:
+            self.title_taps = []
+            App.get_running_app().set_profiling(not profiler.enabled)
+            state = 'enabled' if profiler.enabled else 'disabled (profile saved)'
+            PopupManager.show('Profiling', f'UI profiling {state}', size_hint=(0.7, 0.2))
+        return False
+    
     def on_sound_toggle(self, instance, value):
         self.config['sound_enabled'] = value
         Config.save(self.config)
@@ -1730,7 +2738,7 @@ class MainScreen(Screen):
         Config.save(self.config)
         COLORS = COLORS_DARK if value else COLORS_LIGHT
         Window.clearcolor = COLORS['background']
-        self.bg.update_colors([COLORS['background'], COLORS['surface']])
+        theme.use(COLORS, dark=value)
     
     def on_break_toggle(self, instance, value):
         self.config['break_reminder_enabled'] = value
@@ -1747,36 +2755,180 @@ class MainScreen(Screen):
     def change_pin(self, instance):
         new_pin = self.new_pin_input.text
         if len(new_pin) >= 4:
-            self.config['parent_pin'] = new_pin
-            Config.save(self.config)
             self.new_pin_input.text = ''
-            popup = Popup(title='Success', content=Label(text='PIN updated!'), size_hint=(0.6, 0.2))
-            popup.open()
+            Config.set_secret('parent_pin', new_pin, lambda: PopupManager.show('Success', 'PIN updated!', size_hint=(0.6, 0.2)))
         else:
-            popup = Popup(title='Error', content=Label(text='PIN must be at least 4 digits'), size_hint=(0.7, 0.2))
-            popup.open()
+            PopupManager.show('Error', 'PIN must be at least 4 digits', size_hint=(0.7, 0.2))
     
     def save_recovery(self, instance):
         self.config['recovery_question'] = self.question_input.text
-        self.config['recovery_answer'] = self.answer_input.text
         Config.save(self.config)
-        popup = Popup(title='Saved', content=Label(text='Recovery settings saved!'), size_hint=(0.6, 0.2))
-        popup.open()
+        if self.answer_input.text.strip():
+            Config.set_secret('recovery_answer', pin_security.normalize_answer(self.answer_input.text))
+            self.answer_input.text = ''
+        PopupManager.show('Saved', 'Recovery settings saved!', size_hint=(0.6, 0.2))
     
     def save_custom_message(self, instance):
         self.config['custom_overlay_message'] = self.custom_msg_input.text
         Config.save(self.config)
-        popup = Popup(title='Saved', content=Label(text='Custom message saved!'), size_hint=(0.6, 0.2))
-        popup.open()
+        self.manager.get_screen('blocked').set_custom_message(self.custom_msg_input.text)
+        PopupManager.show('Saved', 'Custom message saved!', size_hint=(0.6, 0.2))
+    
+    def show_remote_extension(self, request):
+        """An extension request synced from a child's device."""
+        profile = profile_store.index().get(request.get('profile'), {})
+        minutes = request.get('minutes', 10)
+        
+        def answer(granted):
+            decided = extension_queue.decide(request['id'], granted)
+            if decided:
+                Config.track_extension(decided)
+        
+        PopupManager.show(
+            'Extension Request',
+            f"{profile.get('name', 'Child')} requested {minutes} more minutes.\n\nGrant extension?",
+            size_hint=(0.85, 0.4),
+            buttons=[
+                (f'Grant {minutes}m', 'success', lambda: answer(True)),
+                ('Deny', 'error', lambda: answer(False)),
+            ]
+        )
+    
+    def save_sync_settings(self, instance):
+        self.config['sync_server'] = self.sync_server_input.text.strip()
+        self.config['sync_group'] = self.sync_group_input.text.strip()
+        self.config['stats_server'] = self.stats_server_input.text.strip()
+        Config.save(self.config)
+        App.get_running_app().sync_now()
+    
+    def on_sync_done(self, sent, received, error):
+        if not hasattr(self, 'sync_status_label'):
+            return
+        if error:
+            self.sync_status_label.text = 'Sync failed, will retry'
+        else:
+            self.sync_status_label.text = f'Synced: {sent} sent, {received} received'
     
     def on_enter(self):
         self.config = Config.load()
         if self.current_tab == 0:
             self.check_permission()
             self.check_existing_timer()
-    
-    def update_theme(self):
-        self.bg.update_colors([COLORS['background'], COLORS['surface']])
+
+
+OVERLAY_LAYOUT = {
+    'icon': 0.82,
+    'title': 0.7,
+    'subtitle': 0.635,
+    'progress': 0.59,
+    'percent': 0.53,
+    'detail': 0.455,
+    'custom': 0.4,
+    'extension': 0.3,
+    'hint': 0.225,
+    'pin': 0.17,
+    'status': 0.115,
+}
+
+
+class OverlayThemeCache:
+    """Renders the static part of an overlay theme into an Fbo texture.
+
+    Only the theme in use is kept, keyed by theme and window size, since
+    every texture is a full-screen Fbo. prewarm() renders the configured
+    theme a frame ahead so showing the block screen is just a texture
+    swap; other themes are rendered on first use and replace it. The
+    texture is dropped when the window is resized or the custom overlay
+    message changes.
+    """
+
+    def __init__(self, message=''):
+        self.message = message
+        self.active = None
+        self._fbos = {}
+        self._prewarm_event = None
+        self._resize_trigger = Clock.create_trigger(self._on_resized, 0.3)
+        Window.bind(size=lambda *args: self._resize_trigger())
+
+    def _key(self, theme_name):
+        return (theme_name, tuple(int(v) for v in Window.size))
+
+    def get(self, theme_name):
+        self.active = theme_name
+        key = self._key(theme_name)
+        fbo = self._fbos.get(key)
+        if fbo is None:
+            fbo = self._render(theme_name)
+            self._fbos = {key: fbo}
+        return fbo.texture
+
+    def set_message(self, message):
+        if message != self.message:
+            self.message = message
+            self.invalidate()
+
+    def invalidate(self):
+        self._fbos.clear()
+        self.prewarm(self.active)
+
+    def prewarm(self, theme_name):
+        """Render theme_name on the next frame; 'random' or None waits for first use."""
+        if self._prewarm_event:
+            self._prewarm_event.cancel()
+            self._prewarm_event = None
+        if theme_name not in OVERLAY_THEMES or self._key(theme_name) in self._fbos:
+            return
+        self.active = theme_name
+
+        def render(dt):
+            self._prewarm_event = None
+            self.get(theme_name)
+
+        self._prewarm_event = Clock.schedule_once(render, 0)
+
+    def _on_resized(self, dt):
+        self._fbos.clear()
+        self.prewarm(self.active)
+
+    def _text(self, text, font_size, bold=False, wrap_width=None):
+        label = CoreLabel(
+            text=text,
+            font_size=font_size,
+            bold=bold,
+            halign='center',
+            text_size=(wrap_width, None)
+        )
+        label.refresh()
+        return label.texture
+
+    def _render(self, theme_name):
+        theme = OVERLAY_THEMES[theme_name]
+        width, height = (int(v) for v in Window.size)
+        items = [
+            ('icon', theme['icon'], sp(90), False, COLORS_DARK['text_primary']),
+            ('title', theme['title'], sp(32), True, COLORS_DARK['text_primary']),
+            ('subtitle', theme['subtitle'], sp(16), False, COLORS_DARK['text_secondary']),
+            ('percent', theme['percent'], sp(42), True, theme['accent_color']),
+            ('detail', theme['detail'], sp(13), False, COLORS_DARK['text_secondary']),
+            ('custom', self.message, sp(12), False, (0.5, 0.5, 0.55, 1)),
+            ('hint', 'Parent: Enter PIN', sp(11), False, (0.3, 0.3, 0.35, 1)),
+        ]
+        fbo = Fbo(size=(width, height))
+        with fbo:
+            ClearColor(*theme['bg_color'])
+            ClearBuffers()
+            for slot, text, font_size, bold, color in items:
+                if not text:
+                    continue
+                tex = self._text(text, font_size, bold, width - dp(80))
+                Color(*color)
+                Rectangle(
+                    texture=tex,
+                    size=tex.size,
+                    pos=(int((width - tex.width) / 2), int(height * OVERLAY_LAYOUT[slot] - tex.height / 2))
+                )
+        fbo.draw()
+        return fbo
 
 
 class BlockedScreen(Screen):
@@ -1785,8 +2937,12 @@ class BlockedScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.theme_data = OVERLAY_THEMES['battery_drained']
-        self.custom_message = ''
+        config = Config.load()
+        self.custom_message = config.get('custom_overlay_message', '')
+        self.theme_cache = OverlayThemeCache(self.custom_message)
         self.build_ui()
+        selected = config.get('selected_overlay', 'random')
+        Clock.schedule_once(lambda dt: self.theme_cache.prewarm(selected), 1)
     
     def set_theme(self, theme_name):
         if theme_name in OVERLAY_THEMES:
@@ -1796,107 +2952,38 @@ class BlockedScreen(Screen):
     
     def set_custom_message(self, message):
         self.custom_message = message
+        self.theme_cache.set_message(message)
     
     def build_ui(self):
         self.layout = FloatLayout()
         
-        self.bg_widget = Widget()
-        self.layout.add_widget(self.bg_widget)
-        
-        self.content = BoxLayout(
-            orientation='vertical',
-            padding=[dp(40), dp(50)],
-            spacing=dp(12),
-            size_hint=(1, 1)
-        )
-        
-        self.content.add_widget(Widget(size_hint_y=0.08))
-        
-        self.icon_label = Label(
-            text=self.theme_data['icon'],
-            font_size=sp(90),
-            size_hint_y=0.18
-        )
-        self.content.add_widget(self.icon_label)
-        
-        self.title_label = Label(
-            text=self.theme_data['title'],
-            font_size=sp(32),
-            bold=True,
-            color=COLORS['text_primary'],
-            size_hint_y=0.08,
-            halign='center'
-        )
-        self.content.add_widget(self.title_label)
-        
-        self.subtitle_label = Label(
-            text=self.theme_data['subtitle'],
-            font_size=sp(16),
-            color=COLORS['text_secondary'],
-            size_hint_y=0.05
-        )
-        self.content.add_widget(self.subtitle_label)
+        with self.layout.canvas.before:
+            Color(1, 1, 1, 1)
+            self.bg_rect = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_bg, size=self._update_bg)
         
         self.progress_bar = AnimatedProgressBar(
             progress=0.75,
             color=self.theme_data['accent_color'],
             size_hint=(0.7, None),
             height=dp(8),
-            pos_hint={'center_x': 0.5}
-        )
-        self.content.add_widget(self.progress_bar)
-        
-        self.percent_label = Label(
-            text=self.theme_data['percent'],
-            font_size=sp(42),
-            bold=True,
-            size_hint_y=0.1
-        )
-        self.content.add_widget(self.percent_label)
-        
-        self.detail_label = Label(
-            text=self.theme_data['detail'],
-            font_size=sp(13),
-            color=COLORS['text_secondary'],
-            size_hint_y=0.06,
-            halign='center',
-            text_size=(Window.width - dp(80), None)
+            pos_hint={'center_x': 0.5, 'center_y': OVERLAY_LAYOUT['progress']}
         )
-        self.content.add_widget(self.detail_label)
-        
-        self.custom_msg_label = Label(
-            text='',
-            font_size=sp(12),
-            color=(0.5, 0.5, 0.55, 1),
-            size_hint_y=0.04
-        )
-        self.content.add_widget(self.custom_msg_label)
-        
-        self.content.add_widget(Widget(size_hint_y=0.06))
+        self.layout.add_widget(self.progress_bar)
         
         extension_btn = Button(
             text='Request More Time',
             font_size=sp(12),
             background_color=(0.2, 0.2, 0.25, 1),
             size_hint=(0.6, 0.05),
-            pos_hint={'center_x': 0.5}
+            pos_hint={'center_x': 0.5, 'center_y': OVERLAY_LAYOUT['extension']}
         )
         extension_btn.bind(on_release=self.request_extension)
-        self.content.add_widget(extension_btn)
-        
-        self.content.add_widget(Widget(size_hint_y=0.03))
-        
-        unlock_hint = Label(
-            text='Parent: Enter PIN',
-            font_size=sp(11),
-            color=(0.3, 0.3, 0.35, 1),
-            size_hint_y=0.03
-        )
-        self.content.add_widget(unlock_hint)
+        self.layout.add_widget(extension_btn)
         
         pin_box = BoxLayout(
-            size_hint=(0.75, 0.07),
-            pos_hint={'center_x': 0.5},
+            size_hint=(0.75, 0.065),
+            pos_hint={'center_x': 0.5, 'center_y': OVERLAY_LAYOUT['pin']},
             spacing=dp(10)
         )
         
@@ -1908,10 +2995,10 @@ class BlockedScreen(Screen):
             font_size=sp(18),
             halign='center',
             background_color=(0.12, 0.12, 0.15, 1),
-            foreground_color=COLORS['text_primary'],
-            cursor_color=COLORS['primary'],
             size_hint_x=0.6
         )
+        theme.tint(self.pin_input, 'text_primary', 'foreground_color')
+        theme.tint(self.pin_input, 'primary', 'cursor_color')
         pin_box.add_widget(self.pin_input)
         
         unlock_btn = Button(
@@ -1923,37 +3010,27 @@ class BlockedScreen(Screen):
         unlock_btn.bind(on_release=self.try_unlock)
         pin_box.add_widget(unlock_btn)
         
-        self.content.add_widget(pin_box)
+        self.layout.add_widget(pin_box)
         
-        self.status_label = Label(
+        self.status_label = theme.tint(Label(
             text='',
             font_size=sp(11),
-            color=COLORS['error'],
-            size_hint_y=0.03
-        )
-        self.content.add_widget(self.status_label)
+            size_hint=(1, 0.03),
+            pos_hint={'center_x': 0.5, 'center_y': OVERLAY_LAYOUT['status']}
+        ), 'error')
+        self.layout.add_widget(self.status_label)
         
-        self.content.add_widget(Widget(size_hint_y=0.03))
-        
-        self.layout.add_widget(self.content)
         self.add_widget(self.layout)
     
+    def _update_bg(self, *args):
+        self.bg_rect.pos = self.pos
+        self.bg_rect.size = self.size
+        if self.manager and self.manager.current == self.name:
+            self.update_ui()
+    
     def update_ui(self):
-        self.icon_label.text = self.theme_data['icon']
-        self.title_label.text = self.theme_data['title']
-        self.subtitle_label.text = self.theme_data['subtitle']
-        self.percent_label.text = self.theme_data['percent']
-        self.percent_label.color = self.theme_data['accent_color']
-        self.detail_label.text = self.theme_data['detail']
+        self.bg_rect.texture = self.theme_cache.get(self.current_theme)
         self.progress_bar.color = list(self.theme_data['accent_color'])
-        
-        if self.custom_message:
-            self.custom_msg_label.text = self.custom_message
-        
-        self.bg_widget.canvas.clear()
-        with self.bg_widget.canvas:
-            Color(*self.theme_data['bg_color'])
-            Rectangle(pos=(0, 0), size=Window.size)
     
     def request_extension(self, instance):
         config = Config.load()
@@ -1961,87 +3038,103 @@ class BlockedScreen(Screen):
             self.status_label.text = 'Extension requests disabled'
             return
         
-        config['pending_extension_request'] = {
-            'time': datetime.now().isoformat(),
-            'minutes': config.get('max_extension_minutes', 10)
-        }
-        Config.save(config)
+        profile_id = config.get('active_profile', 'default')
+        request = extension_queue.submit(profile_id, config.get('max_extension_minutes', 10))
+        Config.track_extension(request)
+        Config.log_usage([usage_log.extension(profile_id)])
         
-        self.status_label.color = COLORS['warning']
-        self.status_label.text = 'Extension request sent to parent'
+        waiting = len(extension_queue.pending())
+        theme.tint(self.status_label, 'warning')
+        self.status_label.text = 'Extension request sent to parent' + (f' ({waiting} waiting)' if waiting > 1 else '')
     
     def on_enter(self):
         self.update_ui()
         AndroidHelper.start_lock_task()
         AndroidHelper.keep_screen_on(True)
+        self.queue_mtime = None
+        self.extension_event = Clock.schedule_interval(self.check_extensions, EXTENSION_POLL_SECONDS)
+        self.parent_poll_event = Clock.schedule_interval(self.poll_parent, EXTENSION_SYNC_SECONDS)
     
     def on_leave(self):
         AndroidHelper.stop_lock_task()
         AndroidHelper.keep_screen_on(False)
+        for name in ('extension_event', 'parent_poll_event'):
+            if getattr(self, name, None):
+                getattr(self, name).cancel()
+                setattr(self, name, None)
+    
+    def poll_parent(self, dt):
+        # Pull answers from a parent's device quickly while a request waits.
+        if sync.client.enabled and extension_queue.pending():
+            App.get_running_app().sync_now()
+    
+    def check_extensions(self, dt):
+        """Leave the block screen once a granted extension has been applied."""
+        mtime = extension_queue.mtime()
+        if mtime == self.queue_mtime:
+            return
+        self.queue_mtime = mtime
+        now = time.time()
+        for request in extension_queue.load():
+            if request['state'] == 'granted' and (
+                    not AndroidHelper.service_running or now - request['decided'] > SERVICE_APPLY_TIMEOUT):
+                # No service to apply it (desktop, or it died): apply here.
+                io_executor.submit(extension_queue.apply_granted, Config.load, Config.save_now)
+                self.queue_mtime = None
+                return
+            if request['state'] == 'applied' and not request.get('unblocked'):
+                extension_queue.mark_unblocked(request['id'])
+                print(f"Extension {request['id']} unblocked {time.time() - request['requested']:.2f}s after request")
+                self.dismiss_overlay()
+                return
     
     def try_unlock(self, instance):
-        config = Config.load()
-        if self.pin_input.text == config['parent_pin']:
-            if config.get('pending_extension_request'):
-                self.show_extension_popup(config)
+        theme.tint(self.status_label, 'text_secondary')
+        self.status_label.text = 'Checking...'
+        Config.check_pin(self.pin_input.text, self.on_pin_checked)
+    
+    def on_pin_checked(self, ok, wait):
+        if ok:
+            self.status_label.text = ''
+            requests = extension_queue.pending()
+            if requests:
+                self.show_extension_popup(requests[0], len(requests))
             else:
                 self.dismiss_overlay()
         else:
-            self.status_label.color = COLORS['error']
-            self.status_label.text = 'Incorrect PIN'
+            theme.tint(self.status_label, 'error')
+            self.status_label.text = f'Too many attempts. Try again in {lockout_text(wait)}' if wait else 'Incorrect PIN'
             self.pin_input.text = ''
     
-    def show_extension_popup(self, config):
-        ext_req = config['pending_extension_request']
-        minutes = ext_req.get('minutes', 10)
-        
-        content = BoxLayout(orientation='vertical', padding=dp(15), spacing=dp(15))
-        content.add_widget(Label(
-            text=f'Child requested {minutes} more minutes.\n\nGrant extension?',
-            font_size=sp(14),
-            halign='center',
-            size_hint_y=0.4
-        ))
-        
-        btn_row = BoxLayout(size_hint_y=0.3, spacing=dp(15))
+    def show_extension_popup(self, request, waiting=1):
+        minutes = request.get('minutes', 10)
+        more = f'\n({waiting - 1} more waiting)' if waiting > 1 else ''
         
-        def grant_extension(btn):
-            self.grant_extension(minutes)
-            popup.dismiss()
-        
-        def deny_extension(btn):
-            config['pending_extension_request'] = None
-            Config.save(config)
-            popup.dismiss()
+        def deny_extension():
+            decided = extension_queue.decide(request['id'], False)
+            if decided:
+                Config.track_extension(decided)
             self.dismiss_overlay()
         
-        grant_btn = StyledButton(text=f'Grant {minutes}m', btn_color=COLORS['success'])
-        grant_btn.bind(on_release=grant_extension)
-        btn_row.add_widget(grant_btn)
-        
-        deny_btn = StyledButton(text='Deny', btn_color=COLORS['error'])
-        deny_btn.bind(on_release=deny_extension)
-        btn_row.add_widget(deny_btn)
-        
-        content.add_widget(btn_row)
-        content.add_widget(Widget(size_hint_y=0.3))
-        
-        popup = Popup(title='Extension Request', content=content, size_hint=(0.85, 0.4))
-        popup.open()
+        PopupManager.show(
+            'Extension Request',
+            f'Child requested {minutes} more minutes.{more}\n\nGrant extension?',
+            size_hint=(0.85, 0.4),
+            buttons=[
+                (f'Grant {minutes}m', 'success', lambda: self.grant_extension(request)),
+                ('Deny', 'error', deny_extension),
+            ]
+        )
     
-    def grant_extension(self, minutes):
-        config = Config.load()
-        config['pending_extension_request'] = None
-        config['is_timer_active'] = True
-        config['timer_minutes'] = minutes
-        config['timer_end_timestamp'] = (datetime.now() + timedelta(minutes=minutes)).isoformat()
-        Config.save(config)
-        
-        AndroidHelper.hide_overlay_window()
-        AndroidHelper.stop_lock_task()
+    def grant_extension(self, request):
+        decided = extension_queue.decide(request['id'], True)
+        if decided:
+            Config.track_extension(decided)
         self.pin_input.text = ''
-        self.status_label.text = ''
-        self.manager.current = 'main'
+        theme.tint(self.status_label, 'success')
+        self.status_label.text = 'Extension granted'
+        # The service applies the grant; check_extensions unblocks when it has.
+        self.queue_mtime = None
     
     def dismiss_overlay(self):
         AndroidHelper.hide_overlay_window()
@@ -2054,13 +3147,26 @@ class BlockedScreen(Screen):
 class ScreenGuardianApp(App):
     def build(self):
         global COLORS
+        io_executor.dispatch = lambda callback, result: Clock.schedule_once(lambda dt: callback(result))
+        self.service_events = Subscriber(
+            os.path.abspath(SERVICE_SOCKET),
+            lambda event: Clock.schedule_once(lambda dt: self.on_service_event(event))
+        )
         config = Config.load()
         COLORS = COLORS_DARK if config.get('dark_mode', True) else COLORS_LIGHT
+        theme.use(COLORS, dark=config.get('dark_mode', True))
+        usage_store.migrate_legacy(config.get('active_profile', 'default'))
+        usage_store.activate(config.get('active_profile', 'default'))
         
         Window.clearcolor = COLORS['background']
         Window.bind(on_keyboard=self.on_keyboard)
         AndroidHelper.request_all_permissions()
         SoundManager.init()
+        PopupManager.init()
+        self.secure_pin(config)
+        
+        if os.environ.get(PROFILE_ENV) or config.get('profiling_enabled'):
+            self.set_profiling(True, persist=False)
         
         self.sm = ScreenManager(transition=FadeTransition(duration=0.25))
         self.sm.add_widget(LoginScreen(name='login'))
@@ -2069,6 +3175,96 @@ class ScreenGuardianApp(App):
         
         return self.sm
     
+    def set_profiling(self, enabled, persist=True):
+        if enabled:
+            profiler.start(
+                widget_classes=[
+                    GradientBackground, StyledButton, CircularProgress, AnimatedProgressBar,
+                    PulsingDot, StatBar, UsageChart, HeatmapChart, DigitDisplay,
+                ],
+                tab_builders={MainScreen: [
+                    'build_timer_tab', 'build_schedule_tab', 'build_profiles_tab',
+                    'build_stats_tab', 'build_settings_tab',
+                ]}
+            )
+        else:
+            profiler.stop()
+            profiler.dump()
+        if persist:
+            config = Config.load()
+            config['profiling_enabled'] = enabled
+            Config.save(config)
+    
+    def secure_pin(self, config):
+        """Calibrate PIN hashing on first run and hash any plaintext secrets."""
+        if (config.get('pin_hash_iterations')
+                and pin_security.is_hashed(config.get('parent_pin'))
+                and pin_security.is_hashed(config.get('recovery_answer'))):
+            return
+        pin_security.migrate_async(
+            config.get('parent_pin'),
+            config.get('recovery_answer'),
+            config.get('pin_hash_iterations'),
+            lambda updates: Clock.schedule_once(lambda dt: Config.store_secrets(updates))
+        )
+    
+    def sync_now(self, *args):
+        config = Config.load()
+        sync.stats.enabled = bool(config.get('stats_server'))
+        if sync.stats.enabled:
+            sync.stats.sync_async(config['stats_server'], config.get('sync_group', ''), lambda record: None)
+        sync.client.enabled = bool(config.get('sync_server'))
+        if not sync.client.enabled:
+            return
+        received = []
+        
+        def done(sent, count, error):
+            def finish(dt):
+                if received:
+                    Config.apply_remote(received)
+                self.sm.get_screen('main').on_sync_done(sent, count, error)
+                for record in received:
+                    if record['kind'] == 'extension' and record['value']['state'] == 'pending':
+                        self.sm.get_screen('main').show_remote_extension(record['value'])
+            Clock.schedule_once(finish)
+        
+        sync.client.sync_async(config['sync_server'], config.get('sync_group', ''), received.append, done)
+    
+    def arm_quota_rollover(self):
+        ledger = Config.quota_ledger()
+        Clock.schedule_once(self.on_quota_rollover, ledger.seconds_until_rollover() + 1)
+    
+    def on_quota_rollover(self, dt):
+        Config.quota_ledger().rollover()
+        print(f"Quota rolled over to {Config.quota_ledger().day}")
+        self.arm_quota_rollover()
+    
+    def on_pause(self):
+        if profiler.enabled:
+            profiler.dump()
+        # Android may kill a paused app without calling on_stop.
+        io_executor.flush(IO_FLUSH_TIMEOUT)
+        return True
+    
+    def on_resume(self):
+        # The midnight event can fire late while paused; catch up on resume.
+        if Config.quota_ledger().seconds_until_rollover() == 0:
+            Clock.unschedule(self.on_quota_rollover)
+            self.on_quota_rollover(0)
+    
+    def on_service_event(self, event):
+        if event['type'] == 'expired':
+            print(f"Service ended the timer ({event['reason']})")
+            self.sm.get_screen('main').on_service_expired(event)
+        elif event['type'] == 'folded':
+            Config.on_usage_folded(event['folded'])
+    
+    def on_stop(self):
+        self.service_events.stop()
+        if profiler.enabled:
+            profiler.dump()
+        io_executor.flush(IO_FLUSH_TIMEOUT)
+    
     def on_keyboard(self, window, key, scancode, codepoint, modifier):
         if key == 27:
             if self.sm.current == 'blocked':
@@ -2077,6 +3273,10 @@ class ScreenGuardianApp(App):
         return False
     
     def on_start(self):
+        self.service_events.start()
+        self.arm_quota_rollover()
+        self.sync_now()
+        Clock.schedule_interval(self.sync_now, SYNC_INTERVAL)
         should_block = False
         
         if ANDROID_AVAILABLE:
@@ -0,0 +1,106 @@
+"""
+Lockout for wrong PIN and recovery answers.
+
+A token bucket of CAPACITY attempts, refilled at one token per
+REFILL_SECONDS outside lockouts. Each attempt takes a token and a correct
+answer resets the bucket. With the bucket empty, every further attempt
+locks entry for BASE_LOCKOUT seconds, doubling each time up to
+MAX_LOCKOUT. The doubling resets once the bucket has refilled.
+
+The state is one fixed-size 32-byte record (pin_attempts.bin) mapped
+into memory. wait_time() is a single struct read, and every attempt
+rewrites just those bytes, so the limit survives the app being killed
+without rewriting the config.
+"""
+import mmap
+import os
+import struct
+import time
+
+RECORD = struct.Struct("<4sHHddd")
+MAGIC = b"SGPL"
+VERSION = 1
+ATTEMPTS_FILE = "pin_attempts.bin"
+
+CAPACITY = 5
+REFILL_SECONDS = 600
+BASE_LOCKOUT = 30
+MAX_LOCKOUT = 3600
+
+
+class PinLimiter:
+    def __init__(self, path=ATTEMPTS_FILE, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.file = None
+        self.map = None
+        self.record = bytearray(RECORD.size)
+        self.open()
+
+    def open(self):
+        try:
+            exists = os.path.exists(self.path) and os.path.getsize(self.path) == RECORD.size
+            self.file = open(self.path, 'r+b' if exists else 'w+b')
+            if not exists:
+                self.file.write(RECORD.pack(MAGIC, VERSION, 0, CAPACITY, self.clock(), 0.0))
+                self.file.flush()
+            self.map = mmap.mmap(self.file.fileno(), RECORD.size)
+            self.record = self.map
+            if RECORD.unpack_from(self.record)[:2] != (MAGIC, VERSION):
+                self._store(0, CAPACITY, self.clock(), 0.0)
+        except Exception as e:
+            # Keep limiting in memory even if the record can't be persisted.
+            print(f"Error opening {self.path}: {e}")
+            self.record = bytearray(RECORD.size)
+            self._store(0, CAPACITY, self.clock(), 0.0)
+
+    def _load(self):
+        _, _, lockouts, tokens, last, locked_until = RECORD.unpack_from(self.record)
+        return lockouts, tokens, last, locked_until
+
+    def _store(self, lockouts, tokens, last, locked_until):
+        RECORD.pack_into(self.record, 0, MAGIC, VERSION, lockouts, tokens, last, locked_until)
+        if self.map is not None:
+            self.map.flush()
+
+    def wait_time(self):
+        """Seconds until another attempt is allowed (0 when allowed)."""
+        return max(0.0, RECORD.unpack_from(self.record)[5] - self.clock())
+
+    def _refill(self, now):
+        lockouts, tokens, last, locked_until = self._load()
+        # Time spent locked out doesn't earn tokens, otherwise the backoff
+        # would reset itself during every long lockout.
+        earned_from = max(last, locked_until)
+        tokens = min(CAPACITY, tokens + max(0.0, now - earned_from) / REFILL_SECONDS)
+        if tokens >= CAPACITY:
+            lockouts = 0
+        return lockouts, tokens, locked_until
+
+    def attempt(self):
+        """Charge an attempt before checking it; returns the lockout it caused (0 if none).
+
+        Charging first means killing the app mid-check doesn't give a free
+        try; success() clears the charge.
+        """
+        now = self.clock()
+        lockouts, tokens, locked_until = self._refill(now)
+        tokens = max(0.0, tokens - 1)
+        lockout = 0
+        if tokens < 1:
+            lockout = min(MAX_LOCKOUT, BASE_LOCKOUT * 2 ** lockouts)
+            lockouts = min(lockouts + 1, 16)
+            locked_until = now + lockout
+        self._store(lockouts, tokens, now, locked_until)
+        return lockout
+
+    def success(self):
+        self._store(0, CAPACITY, self.clock(), 0.0)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
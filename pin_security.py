@@ -0,0 +1,236 @@
+"""
+PIN and recovery answer hashing.
+
+Secrets are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>" (base64
+salt and hash). The iteration count is calibrated once per device so one
+hash takes about TARGET_MS there. Stored values that are still plaintext,
+or were hashed with fewer iterations than the current calibration, are
+flagged for rehashing on the next successful check.
+
+Hashing is deliberately slow, so verify_async() runs it on a worker
+thread. Successful checks are remembered for CACHE_SECONDS as a keyed
+HMAC, which makes re-entering the right PIN instant. Wrong PINs always
+pay the full cost.
+
+    python pin_security.py --benchmark    cost on this device + recorded device classes
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+ALGORITHM = "pbkdf2_sha256"
+TARGET_MS = 150
+DEFAULT_ITERATIONS = 200000
+MIN_ITERATIONS = 20000
+PROBE_ITERATIONS = 20000
+SALT_BYTES = 16
+CACHE_SECONDS = 600
+BENCHMARK_FILE = "pin_benchmark.json"
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + "$")
+
+
+def _derive(secret, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), salt, iterations)
+
+
+def hash_secret(secret, iterations=DEFAULT_ITERATIONS, salt=None):
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = _derive(secret, salt, iterations)
+    return "$".join((ALGORITHM, str(iterations),
+                     base64.b64encode(salt).decode("ascii"),
+                     base64.b64encode(digest).decode("ascii")))
+
+
+def parse(stored):
+    """(iterations, salt, digest) of a hashed value."""
+    _, iterations, salt, digest = stored.split("$")
+    return int(iterations), base64.b64decode(salt), base64.b64decode(digest)
+
+
+def normalize_answer(answer):
+    return (answer or "").lower().strip()
+
+
+def iterations_per_second(probe=PROBE_ITERATIONS, rounds=3):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _derive("0000", b"calibration-salt", probe)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return probe / best
+
+
+def calibrate(target_ms=TARGET_MS):
+    """Iterations that take about target_ms on this device."""
+    rate = iterations_per_second()
+    return max(MIN_ITERATIONS, int(rate * target_ms / 1000.0) // 1000 * 1000), rate
+
+
+class VerifyCache:
+    def __init__(self, ttl=CACHE_SECONDS):
+        self.ttl = ttl
+        self.key = os.urandom(32)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _tag(self, secret):
+        return hmac.new(self.key, secret.encode("utf-8"), hashlib.sha256).digest()
+
+    def hit(self, stored, secret):
+        with self.lock:
+            entry = self.entries.get(stored)
+        if entry is None or entry[1] < time.monotonic():
+            return False
+        return hmac.compare_digest(entry[0], self._tag(secret))
+
+    def remember(self, stored, secret):
+        with self.lock:
+            self.entries[stored] = (self._tag(secret), time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+cache = VerifyCache()
+
+
+def verify(secret, stored, iterations=DEFAULT_ITERATIONS):
+    """Check secret against a stored value; returns (ok, rehash or None).
+
+    rehash is a fresh hash to store in place of a plaintext or
+    under-strength value after a successful check.
+    """
+    if not stored:
+        return False, None
+    if cache.hit(stored, secret):
+        return True, None
+    if not is_hashed(stored):
+        ok = hmac.compare_digest(secret.encode("utf-8"), str(stored).encode("utf-8"))
+        new_hash = hash_secret(secret, iterations) if ok else None
+        if ok:
+            cache.remember(new_hash, secret)
+        return ok, new_hash
+    stored_iterations, salt, digest = parse(stored)
+    ok = hmac.compare_digest(_derive(secret, salt, stored_iterations), digest)
+    if not ok:
+        return False, None
+    if stored_iterations < iterations:
+        new_hash = hash_secret(secret, iterations)
+        cache.remember(new_hash, secret)
+        return True, new_hash
+    cache.remember(stored, secret)
+    return True, None
+
+
+def verify_async(secret, stored, iterations, callback):
+    """verify() on a worker thread; callback(ok, rehash) runs on that thread."""
+    def run():
+        try:
+            ok, rehash = verify(secret, stored, iterations)
+        except Exception as e:
+            print(f"Error verifying PIN: {e}")
+            ok, rehash = False, None
+        callback(ok, rehash)
+
+    thread = threading.Thread(target=run, name="pin-verify", daemon=True)
+    thread.start()
+    return thread
+
+
+def hash_async(secret, iterations, callback):
+    """hash_secret() on a worker thread; callback(hashed) runs on that thread."""
+    thread = threading.Thread(target=lambda: callback(hash_secret(secret, iterations)),
+                              name="pin-hash", daemon=True)
+    thread.start()
+    return thread
+
+
+def migrate_async(pin, answer, iterations, callback):
+    """Calibrate if needed and hash plaintext secrets in the background.
+
+    callback(updates) gets the config keys to store: 'pin_hash_iterations'
+    and, for values that were still plaintext, 'parent_pin' and
+    'recovery_answer'. It runs on the worker thread.
+    """
+    def run():
+        count = iterations
+        if not count:
+            try:
+                count, rate = calibrate()
+                record_benchmark(count, rate)
+                print(f"PIN hashing calibrated: {count} iterations (~{TARGET_MS} ms) on {device_class()}")
+            except Exception as e:
+                print(f"Error calibrating PIN hashing: {e}")
+                count = DEFAULT_ITERATIONS
+        updates = {"pin_hash_iterations": count}
+        if pin and not is_hashed(pin):
+            updates["parent_pin"] = hash_secret(pin, count)
+        if answer and not is_hashed(answer):
+            updates["recovery_answer"] = hash_secret(normalize_answer(answer), count)
+        callback(updates)
+
+    thread = threading.Thread(target=run, name="pin-migrate", daemon=True)
+    thread.start()
+    return thread
+
+
+def device_class():
+    """Short description of the hardware, used to group benchmark results."""
+    try:
+        from jnius import autoclass
+        Build = autoclass('android.os.Build')
+        return f"{Build.MANUFACTURER} {Build.MODEL} (SDK {Build.VERSION.SDK_INT})"
+    except Exception:
+        return f"{platform.system()} {platform.machine()} x{os.cpu_count() or 1}"
+
+
+def record_benchmark(iterations, rate, path=BENCHMARK_FILE):
+    try:
+        results = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                results = json.load(f)
+        results[device_class()] = {
+            "iterations": iterations,
+            "iterations_per_second": round(rate),
+            "measured": time.strftime("%Y-%m-%d"),
+        }
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=1)
+    except Exception as e:
+        print(f"Error saving PIN benchmark: {e}")
+
+
+def benchmark(target_ms=TARGET_MS):
+    iterations, rate = calibrate(target_ms)
+    record_benchmark(iterations, rate)
+    print(f"{device_class()}: {rate:,.0f} PBKDF2-SHA256 iterations/s")
+    for count in (MIN_ITERATIONS, 100000, DEFAULT_ITERATIONS, 600000, iterations):
+        print(f"  {count:>8,} iterations: {count / rate * 1000:7.1f} ms")
+    print(f"  calibrated for {target_ms} ms: {iterations:,} iterations")
+    if os.path.exists(BENCHMARK_FILE):
+        with open(BENCHMARK_FILE, 'r') as f:
+            results = json.load(f)
+        print("\nRecorded device classes:")
+        for name, result in sorted(results.items(), key=lambda item: item[1]["iterations_per_second"]):
+            cost = DEFAULT_ITERATIONS / result["iterations_per_second"] * 1000
+            print(f"  {name:40s} {result['iterations_per_second']:>10,}/s  "
+                  f"calibrated {result['iterations']:>8,}  default costs {cost:6.0f} ms")
+
+
+if __name__ == '__main__':
+    if "--benchmark" in sys.argv[1:]:
+        benchmark()
+    else:
+        print(__doc__)
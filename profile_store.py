@@ -0,0 +1,114 @@
+"""
+Per-profile storage, separate from the global config.
+
+Each profile is its own record (profile_<id>.json with name, daily_limit,
+schedule, blocked_windows) and profiles_index.json maps profile ids to
+the few fields the profile list shows. parental_config.json only keeps
+global settings and active_profile, so the hot Config.load/save and the
+service's polling never parse every child's schedule.
+
+Records and the index are cached and revalidated by mtime and size, so
+the app and the service see each other's edits for the cost of a stat().
+"""
+import copy
+import json
+import os
+
+PROFILE_FILE = "profile_{profile}.json"
+INDEX_FILE = "profiles_index.json"
+INDEX_FIELDS = ("name", "daily_limit")
+DEFAULT_PROFILE = {"name": "Child", "daily_limit": 120, "schedule": {}}
+
+base_dir = ""
+
+_cache = {}
+
+
+def path(profile_id):
+    return os.path.join(base_dir, PROFILE_FILE.format(profile=profile_id))
+
+
+def index_path():
+    return os.path.join(base_dir, INDEX_FILE)
+
+
+def _read(file_path, default):
+    try:
+        st = os.stat(file_path)
+        mtime = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        _cache.pop(file_path, None)
+        return default()
+    cached = _cache.get(file_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return default()
+    _cache[file_path] = (mtime, data)
+    return data
+
+
+def _write(file_path, data):
+    try:
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, file_path)
+        st = os.stat(file_path)
+        _cache[file_path] = ((st.st_mtime_ns, st.st_size), copy.deepcopy(data))
+    except Exception as e:
+        print(f"Error saving {file_path}: {e}")
+
+
+def summary(profile):
+    return {field: profile.get(field, DEFAULT_PROFILE[field]) for field in INDEX_FIELDS}
+
+
+def index():
+    """{profile_id: {'name', 'daily_limit'}} in creation order."""
+    return _read(index_path(), lambda: {"default": summary(DEFAULT_PROFILE)})
+
+
+def ids():
+    return list(index())
+
+
+def page(offset, count):
+    """(profile_id, summary) pairs for one page of the profile list."""
+    return list(index().items())[offset:offset + count]
+
+
+def load(profile_id):
+    """A copy of the full profile record; pass it to save() after editing."""
+    return copy.deepcopy(_read(path(profile_id), lambda: dict(DEFAULT_PROFILE, **index().get(profile_id, {}))))
+
+
+def save(profile_id, profile):
+    _write(path(profile_id), profile)
+    profiles = dict(index())
+    if profiles.get(profile_id) != summary(profile):
+        profiles[profile_id] = summary(profile)
+        _write(index_path(), profiles)
+
+
+def new_id():
+    profiles = index()
+    n = len(profiles)
+    while f"profile_{n}" in profiles:
+        n += 1
+    return f"profile_{n}"
+
+
+def migrate(config):
+    """Move an embedded config['profiles'] into the store; True if config changed."""
+    profiles = config.pop('profiles', None)
+    if profiles is None:
+        return False
+    for profile_id, profile in profiles.items():
+        save(profile_id, profile)
+    print(f"Moved {len(profiles)} profiles out of the config")
+    return True
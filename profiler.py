@@ -0,0 +1,224 @@
+"""
+Opt-in profiling hooks for the Kivy UI.
+
+Wraps Clock-scheduled callbacks, widget canvas rebuilds and tab builders,
+records their durations into fixed-size histograms and flags frames that
+run over budget. Enabled with SG_PROFILE=1 or the hidden Settings toggle
+(tap the Settings title five times). Results are written as a text summary
+and a Chrome trace (open in chrome://tracing or ui.perfetto.dev).
+"""
+import json
+import os
+import time
+from collections import deque
+from functools import wraps
+
+from kivy.clock import Clock
+
+PROFILE_ENV = "SG_PROFILE"
+SUMMARY_FILE = "ui_profile_summary.txt"
+TRACE_FILE = "ui_profile_trace.json"
+
+
+class Histogram:
+    """Power-of-two bucketed durations in microseconds; never grows."""
+    BUCKETS = 24
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def add(self, us):
+        us = int(us)
+        self.counts[min(self.BUCKETS - 1, us.bit_length())] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def percentile(self, p):
+        """Upper bound (us) of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0
+        target = self.count * p / 100.0
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(1 << bucket, self.max_us)
+        return self.max_us
+
+
+class Profiler:
+    def __init__(self, frame_budget_ms=1000 / 60, max_events=20000):
+        self.enabled = False
+        self.frame_budget_us = frame_budget_ms * 1000
+        self.histograms = {}
+        self.events = deque(maxlen=max_events)
+        self.frames = 0
+        self.slow_frames = 0
+        self._origin = time.perf_counter()
+        self._patched = []
+        # Clock may hold callbacks weakly, so every wrapper it was given is
+        # kept here, keyed by the original callback, for as long as the
+        # profiler lives. Rescheduling the same callback reuses its wrapper.
+        self._clock_wrappers = {}
+        self._frame_event = None
+        self._last_frame = None
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def record(self, name, cat, start_us, dur_us):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.add(dur_us)
+        self.events.append((name, cat, start_us, dur_us))
+
+    def wrap(self, name, fn, cat):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            start = self._now_us()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, cat, start, self._now_us() - start)
+        timed._profiled = True
+        return timed
+
+    def _callback_name(self, callback):
+        owner = getattr(callback, '__self__', None)
+        if owner is not None:
+            return f"{type(owner).__name__}.{callback.__name__}"
+        return getattr(callback, '__qualname__', repr(callback))
+
+    def _patch(self, target, attr, replacement):
+        self._patched.append((target, attr, target.__dict__.get(attr)))
+        setattr(target, attr, replacement)
+
+    def instrument(self, cls, *method_names, cat='widget'):
+        """Replace cls.<method> with a timed wrapper.
+
+        Canvas ``_update`` methods are bound in __init__, so this only covers
+        widgets created after the call.
+        """
+        for method_name in method_names:
+            fn = cls.__dict__.get(method_name)
+            if fn is None or getattr(fn, '_profiled', False):
+                continue
+            self._patch(cls, method_name, self.wrap(f"{cls.__name__}.{method_name}", fn, cat))
+
+    def _clock_wrapper(self, callback):
+        wrapper = self._clock_wrappers.get(callback)
+        if wrapper is None:
+            wrapper = self.wrap(self._callback_name(callback), callback, 'clock')
+            self._clock_wrappers[callback] = wrapper
+        return wrapper
+
+    def _wrap_clock(self):
+        for method_name in ('schedule_once', 'schedule_interval', 'create_trigger'):
+            original = getattr(Clock, method_name)
+
+            def scheduler(callback, *args, _original=original, **kwargs):
+                if not getattr(callback, '_profiled', False):
+                    callback = self._clock_wrapper(callback)
+                return _original(callback, *args, **kwargs)
+
+            self._patch(Clock, method_name, scheduler)
+
+        original_unschedule = Clock.unschedule
+
+        def unschedule(callback, *args, **kwargs):
+            try:
+                callback = self._clock_wrappers.get(callback, callback)
+            except TypeError:
+                pass
+            return original_unschedule(callback, *args, **kwargs)
+
+        self._patch(Clock, 'unschedule', unschedule)
+
+    def _on_frame(self, dt):
+        now = self._now_us()
+        if self._last_frame is not None:
+            frame_us = now - self._last_frame
+            self.frames += 1
+            if frame_us > self.frame_budget_us:
+                self.slow_frames += 1
+                self.record('frame over budget', 'frame', self._last_frame, frame_us)
+        self._last_frame = now
+
+    def start(self, widget_classes=(), tab_builders=None):
+        if self.enabled:
+            return
+        self.enabled = True
+        self._frame_event = Clock.schedule_interval(self._on_frame, 0)
+        self._wrap_clock()
+        for cls in widget_classes:
+            self.instrument(cls, '_update')
+        for cls, names in (tab_builders or {}).items():
+            self.instrument(cls, *names, cat='tab')
+        print(f"Profiling enabled (frame budget {self.frame_budget_us / 1000:.1f} ms)")
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._frame_event:
+            self._frame_event.cancel()
+            self._frame_event = None
+        self._last_frame = None
+        for target, attr, original in reversed(self._patched):
+            if original is None:
+                delattr(target, attr)
+            else:
+                setattr(target, attr, original)
+        self._patched = []
+
+    def summary(self):
+        lines = [
+            f"frames: {self.frames}  over budget: {self.slow_frames} "
+            f"({self.frame_budget_us / 1000:.1f} ms budget)",
+            f"{'name':<48}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}",
+        ]
+        ranked = sorted(self.histograms.items(), key=lambda item: item[1].total_us, reverse=True)
+        for name, hist in ranked:
+            lines.append(
+                f"{name[:47]:<48}{hist.count:>8}{hist.total_us / hist.count / 1000:>10.2f}"
+                f"{hist.percentile(50) / 1000:>10.2f}{hist.percentile(95) / 1000:>10.2f}"
+                f"{hist.max_us / 1000:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        return {
+            "traceEvents": [
+                {"name": name, "cat": cat, "ph": "X", "ts": round(start, 1),
+                 "dur": round(dur, 1), "pid": 1, "tid": 1}
+                for name, cat, start, dur in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def dump(self, directory="."):
+        """Write the summary and trace files; returns the trace path."""
+        if not self.histograms:
+            return None
+        trace_path = os.path.join(directory, TRACE_FILE)
+        try:
+            with open(os.path.join(directory, SUMMARY_FILE), 'w') as f:
+                f.write(self.summary() + "\n")
+            with open(trace_path, 'w') as f:
+                json.dump(self.chrome_trace(), f)
+            print(f"Profile written to {trace_path}")
+            return trace_path
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+            return None
+
+
+profiler = Profiler()
@@ -0,0 +1,69 @@
+"""
+Daily quota accounting.
+
+QuotaLedger keeps the minutes each profile has used today in memory. It
+is seeded lazily from the usage history and then updated by add() as
+sessions are recorded. The day only changes in rollover(), which the
+app schedules for the next local midnight (seconds_until_rollover()), so
+checks never compare dates. Time comes from an injectable clock that
+returns a POSIX timestamp; local midnight is resolved with mktime so DST
+changes are honoured.
+"""
+import time
+from datetime import datetime, time as dtime, timedelta
+
+import schedule_engine
+
+
+class QuotaLedger:
+    def __init__(self, load_used, clock=time.time):
+        """load_used(profile_id, day) -> minutes already recorded on day."""
+        self.load_used = load_used
+        self.clock = clock
+        self.used = {}
+        self.day = None
+        self.rollover()
+
+    def now(self):
+        return datetime.fromtimestamp(self.clock())
+
+    def rollover(self, *args):
+        """Start a new day; previous totals are dropped, the history keeps them."""
+        self.day = self.now().date()
+        self.used.clear()
+
+    def next_midnight(self):
+        """POSIX timestamp of the local midnight that ends self.day."""
+        midnight = datetime.combine(self.day + timedelta(days=1), dtime())
+        return time.mktime(midnight.timetuple())
+
+    def seconds_until_rollover(self):
+        return max(0.0, self.next_midnight() - self.clock())
+
+    def used_minutes(self, profile_id):
+        if profile_id not in self.used:
+            self.used[profile_id] = self.load_used(profile_id, self.day)
+        return self.used[profile_id]
+
+    def add(self, profile_id, minutes):
+        self.used[profile_id] = self.used_minutes(profile_id) + minutes
+
+    def remaining(self, profile_id, daily_limit):
+        if daily_limit is None:
+            return None
+        return max(0, int(int(daily_limit) - self.used_minutes(profile_id)))
+
+    def allowed_minutes(self, profile_id, profile, now=None):
+        """Longest timer the profile may start now, or None when unlimited.
+
+        The smallest of the daily_limit left, the schedule's minutes left
+        for today and the time until the next blocked window, in whole
+        minutes (a partial minute left is not enough to start a timer).
+        """
+        now = now or self.now()
+        used = self.used_minutes(profile_id)
+        allowed = schedule_engine.compile_profile(profile).allowed_minutes(now, used)
+        left = self.remaining(profile_id, profile.get('daily_limit'))
+        if left is not None:
+            allowed = left if allowed is None else min(allowed, left)
+        return None if allowed is None else max(0, int(allowed))
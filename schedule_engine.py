@@ -0,0 +1,142 @@
+"""
+Compiled weekly schedules.
+
+A profile's schedule is stored as
+    "schedule": {"Monday": 120, ...}                  minutes allowed per day
+    "blocked_windows": [{"days": ["Sunday", ...],
+                         "start": "21:00", "end": "07:00"}, ...]
+A window starts on each listed day and runs until its end time, crossing
+midnight when end <= start. compile_profile() turns this into sorted,
+merged [start, end) intervals measured in minutes from Monday 00:00, so
+"is it allowed now" and "when does that change" are a bisect over the
+interval starts.
+"""
+import json
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+
+import profile_store
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+WEEK_MINUTES = 7 * 24 * 60
+SCHOOL_NIGHTS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+
+
+def parse_time(text):
+    """'HH:MM' -> minutes after midnight."""
+    hours, minutes = text.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_time(minutes):
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+def week_minute(when):
+    return when.weekday() * 24 * 60 + when.hour * 60 + when.minute
+
+
+class CompiledSchedule:
+    def __init__(self, quotas, blocked):
+        """blocked: (start, end) minute pairs, end may run past the week."""
+        self.quotas = quotas
+        self.starts = array('l')
+        self.ends = array('l')
+        pieces = []
+        for start, end in blocked:
+            # A window running past Sunday midnight continues at Monday 00:00.
+            if end > WEEK_MINUTES:
+                pieces.append((0, end - WEEK_MINUTES))
+                end = WEEK_MINUTES
+            pieces.append((start, end))
+        for start, end in sorted(pieces):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def _window(self, minute):
+        """Index of the blocked window containing minute, or -1."""
+        i = bisect_right(self.starts, minute) - 1
+        return i if i >= 0 and minute < self.ends[i] else -1
+
+    def is_allowed(self, when):
+        return self._window(week_minute(when)) < 0
+
+    def next_boundary(self, when):
+        """Datetime of the next allowed/blocked change after when, or None."""
+        if not self.starts or (self.starts[0] == 0 and self.ends[0] == WEEK_MINUTES):
+            return None
+        minute = week_minute(when)
+        i = self._window(minute)
+        if i >= 0:
+            target = self.ends[i]
+            # A window ending at Sunday midnight may continue into Monday.
+            if target == WEEK_MINUTES and self.starts[0] == 0:
+                target += self.ends[0]
+        else:
+            j = bisect_right(self.starts, minute)
+            target = self.starts[j] if j < len(self.starts) else self.starts[0] + WEEK_MINUTES
+        base = when.replace(second=0, microsecond=0)
+        return base + timedelta(minutes=target - minute)
+
+    def quota(self, when):
+        """Minutes allowed on when's day, or None when the day has no quota."""
+        return self.quotas.get(DAYS[when.weekday()])
+
+    def allowed_minutes(self, when, used=0):
+        """How long a session starting at when may run: quota left, cut at the next block."""
+        if not self.is_allowed(when):
+            return 0
+        limits = []
+        quota = self.quota(when)
+        if quota is not None:
+            limits.append(max(0, quota - used))
+        boundary = self.next_boundary(when)
+        if boundary is not None:
+            limits.append(int((boundary - when).total_seconds() // 60))
+        return min(limits) if limits else None
+
+
+def compile_schedule(schedule, blocked_windows):
+    quotas = {day: int(minutes) for day, minutes in (schedule or {}).items() if day in DAYS}
+    blocked = []
+    for window in blocked_windows or ():
+        try:
+            start, end = parse_time(window['start']), parse_time(window['end'])
+        except (KeyError, ValueError) as e:
+            print(f"Skipping invalid blocked window {window}: {e}")
+            continue
+        length = (end - start) % (24 * 60) or 24 * 60
+        for day in window.get('days', DAYS):
+            if day in DAYS:
+                offset = DAYS.index(day) * 24 * 60 + start
+                blocked.append((offset, offset + length))
+    return CompiledSchedule(quotas, blocked)
+
+
+_compiled = {}
+
+
+def compile_profile(profile):
+    """Compiled schedule for a profile dict, cached on its schedule contents."""
+    key = json.dumps([profile.get('schedule', {}), profile.get('blocked_windows', [])], sort_keys=True)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        if len(_compiled) > 16:
+            _compiled.clear()
+        compiled = _compiled[key] = compile_schedule(
+            profile.get('schedule', {}), profile.get('blocked_windows', []))
+    return compiled
+
+
+def active_schedule(config):
+    return compile_profile(profile_store.load(config.get('active_profile', 'default')))
+
+
+def next_wakeup(config, now, timer_end=None):
+    """Earliest of the timer end and the next schedule boundary, or None."""
+    candidates = [t for t in (timer_end, active_schedule(config).next_boundary(now)) if t is not None]
+    return min(candidates) if candidates else None
@@ -0,0 +1,8 @@
+"""
+Self-hostable aggregation server for many Screen Guardian devices.
+
+    python -m server --port 8080 --data server_data
+    python -m server.loadgen --devices 1000 --url http://127.0.0.1:8080
+
+Not part of the app; buildozer.spec excludes this directory.
+"""
@@ -0,0 +1,22 @@
+import argparse
+import sys
+
+from .app import serve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen Guardian aggregation server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data", default="server_data", help="directory for device files")
+    args = parser.parse_args(argv)
+    server = serve(args.port, args.data, args.host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+HTTP front end for the aggregation server.
+
+    POST /sync       the app's sync.py protocol (its stats upload); session
+                     records are stored per child ("<group>/<profile>"),
+                     other records are acknowledged and dropped
+    GET  /children   per-child totals
+    GET  /top-hours  ?child=<name>&n=3, busiest hours of day
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sync import decode, encode
+
+from .rollup import Rollups
+from .storage import Storage
+
+
+class AggregationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, data_dir):
+        self.storage = Storage(data_dir)
+        self.rollups = Rollups.from_storage(self.storage)
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.started = time.time()
+        super().__init__(address, Handler)
+
+    def exchange(self, request):
+        """Store a sync batch's sessions; returns the sync reply acknowledging it."""
+        device = request["device"]
+        with self.lock:
+            stored = self.storage.ingest(device, request.get("group", ""), request.get("changes", ()))
+            for child, pieces in stored.items():
+                self.rollups.add(device, child, pieces)
+            self.uploads += 1
+            ack = self.storage.seqs.get(device, 0)
+        return {"ack": ack, "seq": request.get("since", 0), "changes": [], "more": False}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip('/') != '/sync':
+            self.send_json({"error": "not found"}, 404)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            reply = encode(self.server.exchange(decode(body)))
+        except Exception as e:
+            self.send_json({"error": str(e)}, 400)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        with self.server.lock:
+            if url.path == '/children':
+                payload = self.server.rollups.children()
+            elif url.path == '/top-hours':
+                child = query.get('child', [None])[0]
+                n = int(query.get('n', ['3'])[0])
+                payload = self.server.rollups.top_hours(child, n)
+            elif url.path == '/status':
+                payload = {"uploads": self.server.uploads, "devices": len(self.server.storage.devices),
+                           "uptime": round(time.time() - self.server.started, 1)}
+            else:
+                payload = None
+        if payload is None:
+            self.send_json({"error": "not found"}, 404)
+        else:
+            self.send_json(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8080, data_dir="server_data", host='127.0.0.1'):
+    server = AggregationServer((host, port), data_dir)
+    print(f"Aggregation server listening on http://{host}:{server.server_port} "
+          f"({len(server.storage.devices)} devices in {data_dir})")
+    return server
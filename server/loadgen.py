@@ -0,0 +1,93 @@
+"""
+Load generator: many simulated devices uploading at once.
+
+Every device opens its own connection with asyncio and POSTs a gzip
+sync.py batch of session records, all started together. Reports throughput and latency
+percentiles.
+
+    python -m server.loadgen --devices 1000 --sessions 50 --url http://127.0.0.1:8080
+    python -m server.loadgen --devices 1000 --spawn     # run against a temporary server
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+
+def make_batch(device, sessions, rng, end=None):
+    end = end or datetime.now().replace(second=0, microsecond=0)
+    device_id = f"device-{device:05d}"
+    profile = f"child-{device % 250:03d}"
+    batch = []
+    for seq in range(1, sessions + 1):
+        start = end - timedelta(days=rng.randrange(30), minutes=rng.randrange(24 * 60))
+        minutes = rng.randrange(5, 90)
+        batch.append({"seq": seq, "kind": "session", "key": f"{profile}/{start.isoformat()}",
+                      "value": {"profile": profile, "start": start.isoformat(),
+                                "end": (start + timedelta(minutes=minutes)).isoformat(),
+                                "minutes": minutes},
+                      "device": device_id})
+    return {"device": device_id, "group": "", "since": 0, "changes": batch, "limit": sessions}
+
+
+async def upload(host, port, body):
+    reader, writer = await asyncio.open_connection(host, port)
+    started = time.perf_counter()
+    writer.write((
+        f"POST /sync HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Encoding: gzip\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    ).encode('ascii') + body)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    await reader.read()
+    writer.close()
+    return int(status), time.perf_counter() - started
+
+
+async def run(url, devices, sessions, seed=0):
+    parsed = urlparse(url)
+    rng = random.Random(seed)
+    bodies = [gzip.compress(json.dumps(make_batch(d, sessions, rng)).encode('utf-8'))
+              for d in range(devices)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(upload(parsed.hostname, parsed.port, b) for b in bodies),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    latencies = sorted(r[1] for r in results if not isinstance(r, Exception) and r[0] == 200)
+    failed = devices - len(latencies)
+    print(f"{devices} devices x {sessions} sessions in {elapsed:.2f}s "
+          f"({devices / elapsed:,.0f} uploads/s, {devices * sessions / elapsed:,.0f} sessions/s), "
+          f"{failed} failed")
+    if latencies:
+        pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        print(f"latency p50 {pick(0.5):.0f} ms, p95 {pick(0.95):.0f} ms, p99 {pick(0.99):.0f} ms")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many devices uploading usage")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=50, help="sessions per upload")
+    parser.add_argument("--spawn", action="store_true", help="start a throwaway server first")
+    args = parser.parse_args(argv)
+
+    url = args.url
+    if args.spawn:
+        from .app import serve
+        server = serve(0, tempfile.mkdtemp(prefix="sg_server_"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+    failed = asyncio.run(run(url, args.devices, args.sessions))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
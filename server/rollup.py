@@ -0,0 +1,62 @@
+"""
+Precomputed aggregates, so queries never scan device files.
+
+Built once from storage at startup and then updated with the pieces of
+every ingested batch.
+"""
+from array import array
+from collections import defaultdict
+from datetime import date
+
+
+class Rollups:
+    def __init__(self):
+        self.totals = defaultdict(int)
+        self.hours = defaultdict(lambda: array('Q', [0]) * 24)
+        self.daily = defaultdict(lambda: defaultdict(int))
+        self.devices = defaultdict(set)
+
+    @classmethod
+    def from_storage(cls, storage):
+        rollups = cls()
+        for name, stream in storage.streams.items():
+            rollups._add_stream(storage.stream(name), stream["device"], stream["child"])
+        return rollups
+
+    def _add_stream(self, columns, device, child):
+        self.devices[child].add(device)
+        for hour, minutes in enumerate(columns.hours):
+            self.hours[child][hour] += minutes
+        for i, minutes in enumerate(columns.days):
+            if minutes:
+                self.daily[child][columns.origin + i] += minutes
+                self.totals[child] += minutes
+
+    def add(self, device, child, pieces):
+        self.devices[child].add(device)
+        hours, daily = self.hours[child], self.daily[child]
+        for ordinal, hour, minutes in pieces:
+            hours[hour] += minutes
+            daily[ordinal] += minutes
+            self.totals[child] += minutes
+
+    def children(self, today=None):
+        today = (today or date.today()).toordinal()
+        return [{
+            "child": child,
+            "devices": len(self.devices[child]),
+            "total_minutes": total,
+            "today": self.daily[child].get(today, 0),
+            "last_7_days": sum(self.daily[child].get(today - i, 0) for i in range(7)),
+        } for child, total in sorted(self.totals.items())]
+
+    def top_hours(self, child=None, n=3):
+        if child is not None:
+            hours = self.hours.get(child, array('Q', [0]) * 24)
+        else:
+            hours = array('Q', [0]) * 24
+            for child_hours in self.hours.values():
+                for hour, minutes in enumerate(child_hours):
+                    hours[hour] += minutes
+        ranked = sorted(range(24), key=lambda h: hours[h], reverse=True)[:n]
+        return [{"hour": h, "minutes": hours[h]} for h in ranked if hours[h]]
@@ -0,0 +1,211 @@
+"""
+Columnar usage files, one set per device and child.
+
+Each stream (a device's sessions for one child) has <stream>.days,
+minutes per calendar day as a uint32 vector starting at the header's
+origin day, and <stream>.hours, minutes per hour of day (24 uint32). New
+days are appended to the end of the file and earlier days are patched in
+place, so an upload touches only the bytes it changes.
+
+Uploads are sync.py batches, and a device's records carry increasing
+seq numbers, so devices.json keeps the last seq stored per device and a
+retried batch is skipped. A batch commits through <device>.journal: the
+new cell values and seq are written there first, then applied to the
+files, then the journal is removed. The journal holds absolute values,
+so replaying it after a crash at any point gives the same files.
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+from array import array
+from datetime import datetime, timedelta
+
+DAYS_HEADER = struct.Struct("<4sHxxi")
+DAYS_MAGIC = b"SGDV"
+HOURS_MAGIC = b"SGHV"
+VERSION = 1
+ITEM = array('I').itemsize
+DEVICE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+JOURNAL_SUFFIX = ".journal"
+
+
+def split_hours(start, minutes):
+    """Yield (day ordinal, hour, minutes) pieces of a session."""
+    remaining = minutes
+    while remaining > 0:
+        hour_end = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        piece = min(remaining, max(1, int((hour_end - start).total_seconds() // 60)))
+        yield start.toordinal(), start.hour, piece
+        start += timedelta(minutes=piece)
+        remaining -= piece
+
+
+def child_name(group, profile):
+    return f"{group}/{profile}" if group else str(profile)
+
+
+def stream_name(device, child):
+    return f"{device}.{hashlib.sha1(child.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _write_synced(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class DeviceColumns:
+    def __init__(self, data_dir, name):
+        self.days_path = os.path.join(data_dir, f"{name}.days")
+        self.hours_path = os.path.join(data_dir, f"{name}.hours")
+        self.origin = None
+        self.days = array('I')
+        self.hours = array('I', [0]) * 24
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.days_path):
+            with open(self.days_path, 'rb') as f:
+                magic, version, self.origin = DAYS_HEADER.unpack(f.read(DAYS_HEADER.size))
+                if magic != DAYS_MAGIC or version != VERSION:
+                    raise ValueError(f"{self.days_path} is not a day vector")
+                self.days.frombytes(f.read())
+        if os.path.exists(self.hours_path):
+            with open(self.hours_path, 'rb') as f:
+                if f.read(4) != HOURS_MAGIC:
+                    raise ValueError(f"{self.hours_path} is not an hour vector")
+                self.hours = array('I')
+                self.hours.frombytes(f.read())
+
+    def stage(self, pieces):
+        """Return the change that adds (ordinal, hour, minutes) pieces; nothing is modified."""
+        origin = min([p[0] for p in pieces] + ([self.origin] if self.origin is not None else []))
+        shift = 0 if self.origin is None else self.origin - origin
+        cells = {}
+        hours = array('I', self.hours)
+        for ordinal, hour, minutes in pieces:
+            i = ordinal - origin
+            if i not in cells:
+                j = i - shift
+                cells[i] = self.days[j] if 0 <= j < len(self.days) else 0
+            cells[i] += minutes
+            hours[hour] += minutes
+        return {"origin": origin, "cells": {str(i): v for i, v in sorted(cells.items())},
+                "hours": list(hours)}
+
+    def apply(self, change):
+        """Write a staged change to memory and disk; applying it twice is harmless."""
+        origin = change["origin"]
+        if self.origin is not None and origin < self.origin:
+            # Back-dated upload before the file's first day: shift and rewrite.
+            self.days = array('I', [0]) * (self.origin - origin) + self.days
+        rewrite = self.origin != origin or not os.path.exists(self.days_path)
+        self.origin = origin
+        old_len = len(self.days)
+        for i, minutes in change["cells"].items():
+            i = int(i)
+            if i >= len(self.days):
+                self.days.extend([0] * (i + 1 - len(self.days)))
+            self.days[i] = minutes
+        if rewrite:
+            _write_synced(self.days_path, DAYS_HEADER.pack(DAYS_MAGIC, VERSION, self.origin)
+                          + self.days.tobytes())
+        else:
+            with open(self.days_path, 'r+b') as f:
+                for i in change["cells"]:
+                    i = int(i)
+                    if i < old_len:
+                        f.seek(DAYS_HEADER.size + i * ITEM)
+                        f.write(self.days[i:i + 1].tobytes())
+                if len(self.days) > old_len:
+                    f.seek(DAYS_HEADER.size + old_len * ITEM)
+                    f.write(self.days[old_len:].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.hours = array('I', change["hours"])
+        _write_synced(self.hours_path, HOURS_MAGIC + self.hours.tobytes())
+
+
+class Storage:
+    """All streams under one data directory, plus the stream -> child index."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.index_path = os.path.join(data_dir, "devices.json")
+        self.streams = {}
+        self.seqs = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            self.streams, self.seqs = index["streams"], index["seqs"]
+        self.columns = {}
+        self.recover()
+
+    @property
+    def devices(self):
+        return {stream["device"] for stream in self.streams.values()}
+
+    def stream(self, name):
+        columns = self.columns.get(name)
+        if columns is None:
+            columns = self.columns[name] = DeviceColumns(self.data_dir, name)
+        return columns
+
+    def ingest(self, device, group, records):
+        """Store the session records of a sync.py batch.
+
+        Records at or below the device's stored seq were stored by an
+        earlier try of this batch and are skipped. Returns
+        {child: pieces of the new sessions}.
+        """
+        if not DEVICE_ID.match(device):
+            raise ValueError(f"Invalid device id: {device!r}")
+        last = self.seqs.get(device, 0)
+        sessions = {}
+        for record in records:
+            if record["seq"] <= last:
+                continue
+            last = max(last, record["seq"])
+            if record["kind"] != "session":
+                continue
+            value = record["value"]
+            pieces = split_hours(datetime.fromisoformat(value["start"]), int(round(value["minutes"])))
+            sessions.setdefault(child_name(group, value["profile"]), []).extend(pieces)
+        if last == self.seqs.get(device, 0):
+            return {}
+        journal = {"device": device, "seq": last, "streams": {}}
+        for child, pieces in sessions.items():
+            if pieces:
+                name = stream_name(device, child)
+                journal["streams"][name] = dict(self.stream(name).stage(pieces), child=child)
+        journal_path = os.path.join(self.data_dir, device + JOURNAL_SUFFIX)
+        _write_synced(journal_path, json.dumps(journal).encode('utf-8'))
+        self._finish(journal_path, journal)
+        return {child: pieces for child, pieces in sessions.items() if pieces}
+
+    def _finish(self, journal_path, journal):
+        """Apply a committed batch to the files and drop its journal."""
+        device = journal["device"]
+        for name, change in journal["streams"].items():
+            self.stream(name).apply(change)
+            self.streams[name] = {"device": device, "child": change["child"]}
+        self.seqs[device] = journal["seq"]
+        _write_synced(self.index_path, json.dumps({"streams": self.streams, "seqs": self.seqs}).encode('utf-8'))
+        os.remove(journal_path)
+
+    def recover(self):
+        """Finish batches whose journal was written before a crash."""
+        for entry in sorted(os.listdir(self.data_dir)):
+            if not entry.endswith(JOURNAL_SUFFIX):
+                continue
+            journal_path = os.path.join(self.data_dir, entry)
+            with open(journal_path, 'r') as f:
+                journal = json.load(f)
+            print(f"Finishing interrupted upload from {journal['device']}")
+            self._finish(journal_path, journal)
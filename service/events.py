@@ -0,0 +1,441 @@
+"""
+Event sources for the timer service.
+
+ServiceCore runs on one asyncio loop. Sources push events (dicts with a
+"type") through emit(), which calls the handler registered for that type
+and returns its result. Nothing here imports jnius, so every source can
+be run on a desktop Linux machine.
+
+  FileWatcher    "file" events when watched files in a directory change
+                 (inotify through ctypes, stat polling where unavailable)
+  CommandServer  "command" events from JSON lines on a Unix socket; the
+                 handler's return value is sent back as the reply.
+                 Clients that send {"command": "subscribe"} also get
+                 every publish()ed event; Subscriber is that client. A
+                 subscriber that falls MAX_SUBSCRIBER_BUFFER bytes
+                 behind is disconnected, so it cannot hold up the rest.
+  Deadlines      "deadline" events at wall-clock times
+  UsagePoller    "usage" events from a query function, polled only while
+                 enabled() is true
+
+Between events the loop is blocked in epoll, so an idle service uses no
+CPU. The only periodic wakeup is Deadlines re-arming every
+MAX_TIMER_SECONDS, because the monotonic clock asyncio uses stops while
+the device sleeps. Sources may be run again on a new loop after the
+service restarts it; deadlines still pending are re-armed there.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import traceback
+
+MAX_TIMER_SECONDS = 60
+DEBOUNCE_SECONDS = 0.05
+STAT_POLL_SECONDS = 0.25
+RECONNECT_SECONDS = 2
+MAX_SUBSCRIBER_BUFFER = 256 * 1024
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class ServiceCore:
+    def __init__(self):
+        self.sources = []
+        self.handlers = {}
+        self.loop = None
+        self.stopping = None
+
+    def add(self, source):
+        self.sources.append(source)
+        return source
+
+    def on(self, event_type, handler):
+        """handler(event) may be a plain function or a coroutine function."""
+        self.handlers[event_type] = handler
+
+    async def emit(self, event):
+        handler = self.handlers.get(event["type"])
+        if handler is None:
+            return None
+        try:
+            result = handler(event)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+        except Exception as e:
+            print(f"SERVICE ERROR handling {event['type']} event: {e}")
+            traceback.print_exc()
+            return {"error": str(e)}
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        tasks = [asyncio.ensure_future(source.run(self.emit)) for source in self.sources]
+        for task in tasks:
+            task.add_done_callback(self._source_done)
+        try:
+            await self.stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for source in self.sources:
+                source.close()
+
+    def _source_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"SERVICE ERROR: event source stopped: {task.exception()}")
+
+
+class Source:
+    async def run(self, emit):
+        await asyncio.Event().wait()
+
+    def close(self):
+        pass
+
+
+def _inotify():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return libc if hasattr(libc, "inotify_init1") else None
+    except Exception:
+        return None
+
+
+class FileWatcher(Source):
+    """Emits {"type": "file", "names": set} when any of names in directory is written.
+
+    Writers in this app replace files with os.replace, so the directory
+    is watched for renames into place as well as closed writes. Bursts
+    within DEBOUNCE_SECONDS become one event.
+    """
+
+    def __init__(self, directory, names, use_inotify=True):
+        self.directory = directory or "."
+        self.names = set(names)
+        self.use_inotify = use_inotify
+        self.fd = None
+        self.loop = None
+        self.changed = set()
+        self.flush_handle = None
+
+    async def run(self, emit):
+        loop = self.loop = asyncio.get_running_loop()
+        self.emit = emit
+        libc = _inotify() if self.use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(
+                    fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                self.fd = fd
+                loop.add_reader(fd, self._readable)
+                await asyncio.Event().wait()
+            if fd >= 0:
+                os.close(fd)
+                self.fd = None
+            print(f"SERVICE: inotify unavailable (errno {ctypes.get_errno()}), polling {self.directory}")
+        await self._poll()
+
+    def _readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if name in self.names:
+                self.changed.add(name)
+        if self.changed and self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(DEBOUNCE_SECONDS, self._flush)
+
+    def _flush(self):
+        self.flush_handle = None
+        names, self.changed = self.changed, set()
+        asyncio.ensure_future(self.emit({"type": "file", "names": names}))
+
+    def _stamp(self, name):
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    async def _poll(self):
+        stamps = {name: self._stamp(name) for name in self.names}
+        while True:
+            await asyncio.sleep(STAT_POLL_SECONDS)
+            changed = set()
+            for name in self.names:
+                stamp = self._stamp(name)
+                if stamp != stamps[name]:
+                    stamps[name] = stamp
+                    changed.add(name)
+            if changed:
+                await self.emit({"type": "file", "names": changed})
+
+    def close(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        if self.fd is not None:
+            try:
+                self.loop.remove_reader(self.fd)
+            except Exception:
+                pass
+            os.close(self.fd)
+            self.fd = None
+
+
+class CommandServer(Source):
+    """One JSON object per line in, one JSON reply per line out.
+
+    Emits {"type": "command", "command": obj}; a handler result of None
+    is sent as {"ok": true}. "subscribe" is answered here and keeps the
+    connection on the publish() list until the client goes away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.server = None
+        self.subscribers = set()
+
+    async def run(self, emit):
+        async def client(reader, writer):
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        command = json.loads(line)
+                    except ValueError:
+                        reply = {"error": "bad json"}
+                    else:
+                        if command.get("command") == "subscribe":
+                            self.subscribers.add(writer)
+                            reply = {"ok": True, "subscribers": len(self.subscribers)}
+                        else:
+                            reply = await emit({"type": "command", "command": command})
+                    writer.write(json.dumps({"ok": True} if reply is None else reply).encode("utf-8") + b"\n")
+                    await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.subscribers.discard(writer)
+                writer.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(client, self.path)
+        async with self.server:
+            await self.server.serve_forever()
+
+    def publish(self, event):
+        """Send event to every subscriber; returns how many it was written to.
+
+        Subscribers with more than MAX_SUBSCRIBER_BUFFER bytes still
+        unsent are dropped instead.
+        """
+        line = json.dumps(event).encode("utf-8") + b"\n"
+        sent = 0
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+                continue
+            if writer.transport.get_write_buffer_size() + len(line) > MAX_SUBSCRIBER_BUFFER:
+                print("SERVICE: Dropping a subscriber that stopped reading")
+                self.subscribers.discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(line)
+            sent += 1
+        return sent
+
+    def close(self):
+        for writer in self.subscribers:
+            writer.transport.abort()
+        self.subscribers.clear()
+        if self.server is not None:
+            self.server.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def send_command(path, command, timeout=2.0):
+    """Blocking client for CommandServer; returns the reply or None if the service is not there."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(json.dumps(command).encode("utf-8") + b"\n")
+            reply = b""
+            while not reply.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+        return json.loads(reply) if reply else None
+    except (OSError, ValueError):
+        return None
+
+
+class Subscriber:
+    """Background client that receives published events.
+
+    on_event(event) runs on the subscriber thread. It reconnects every
+    RECONNECT_SECONDS while the service is not there; connected says
+    whether events are currently being delivered.
+    """
+
+    def __init__(self, path, on_event):
+        self.path = path
+        self.on_event = on_event
+        self.connected = False
+        self.running = False
+        self.sock = None
+
+    def start(self):
+        if self.running or not hasattr(socket, "AF_UNIX"):
+            return
+        self.running = True
+        threading.Thread(target=self._run, name="service-events", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _run(self):
+        while self.running:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    self.sock = sock
+                    sock.connect(self.path)
+                    sock.sendall(b'{"command": "subscribe"}\n')
+                    stream = sock.makefile('rb')
+                    stream.readline()
+                    self.connected = True
+                    for line in stream:
+                        event = json.loads(line)
+                        if "type" in event:
+                            self.on_event(event)
+            except (OSError, ValueError):
+                pass
+            finally:
+                self.connected = False
+                self.sock = None
+            if self.running:
+                time.sleep(RECONNECT_SECONDS)
+
+
+class Deadlines(Source):
+    """Named wall-clock deadlines; set() replaces any earlier one of the same name.
+
+    Timers go on the loop running when they are armed. close() keeps the
+    pending times, and run() arms them again on the next loop.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.handles = {}
+        self.when = {}
+        self.emit = None
+
+    async def run(self, emit):
+        self.emit = emit
+        for name in list(self.when):
+            handle = self.handles.pop(name, None)
+            if handle is not None:
+                handle.cancel()
+            self._arm(name)
+        await asyncio.Event().wait()
+
+    def set(self, name, when):
+        self.cancel(name)
+        self.when[name] = when
+        self._arm(name)
+
+    def _arm(self, name):
+        loop = asyncio.get_running_loop()
+        delay = self.when[name] - self.clock()
+        if delay > MAX_TIMER_SECONDS:
+            self.handles[name] = loop.call_later(MAX_TIMER_SECONDS, self._arm, name)
+        else:
+            self.handles[name] = loop.call_later(max(0.0, delay), self._fire, name)
+
+    def _fire(self, name):
+        self.handles.pop(name, None)
+        when = self.when.pop(name, None)
+        asyncio.ensure_future(self.emit({"type": "deadline", "name": name, "when": when}))
+
+    def cancel(self, name):
+        handle = self.handles.pop(name, None)
+        if handle is not None:
+            handle.cancel()
+        self.when.pop(name, None)
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.cancel()
+        self.handles.clear()
+
+
+class UsagePoller(Source):
+    """Emits {"type": "usage", "events": [...]} from query(since, until).
+
+    Polls every interval seconds while enabled() is true and sleeps
+    until wake() otherwise.
+    """
+
+    def __init__(self, query, interval=30, enabled=lambda: True, clock=time.time):
+        self.query = query
+        self.interval = interval
+        self.enabled = enabled
+        self.clock = clock
+        self.wakeup = None
+        self.since = None
+
+    def wake(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def run(self, emit):
+        self.wakeup = asyncio.Event()
+        while True:
+            if not self.enabled():
+                self.since = None
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            now = self.clock()
+            if self.since is not None:
+                events = self.query(self.since, now)
+                if events:
+                    await emit({"type": "usage", "events": events})
+            self.since = now
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+                self.wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
@@ -3,37 +3,73 @@ Background service that monitors timer and shows overlay when time expires.
 This runs even when the main app is in background.
 """
 import os
-import json
+import sys
 import time
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extension_queue
+import profile_store
+import schedule_engine
+import usage_heatmap
+import usage_log
+import usage_store
+from config_store import ConfigStore, StaleConfig
+from events import ServiceCore, FileWatcher, CommandServer, Deadlines, UsagePoller
 
 CONFIG_FILE = "/data/data/org.parentalcontrol.youtubelimiter/files/app/parental_config.json"
 ALT_CONFIG_FILE = "parental_config.json"
 
+SOCKET_FILE = "timer_service.sock"
+
 overlay_shown = False
+overlay_view = None
+window_manager = None
+timer_active = False
+
+POLL_SECONDS = 5
+MAX_SLEEP_SECONDS = 60
+USAGE_POLL_SECONDS = 30
+ROLLUP_DELAY_MINUTES = 5
+EXPIRY_SAVE_ATTEMPTS = 3
+
+core = ServiceCore()
+deadlines = Deadlines()
+stores = {}
+
+def config_store(path):
+    if path not in stores:
+        stores[path] = ConfigStore(path)
+    return stores[path]
 
 def load_config():
     """Load configuration from file"""
     for path in [CONFIG_FILE, ALT_CONFIG_FILE]:
         try:
             if os.path.exists(path):
-                with open(path, 'r') as f:
-                    return json.load(f)
+                config = config_store(path).read()
+                for module in (profile_store, extension_queue, usage_store, usage_heatmap, usage_log):
+                    module.base_dir = os.path.dirname(path)
+                return config
         except:
             pass
     return None
 
 def save_config(config):
-    """Save configuration to file"""
+    """Save configuration to file, merged with changes the app made meanwhile.
+    Returns the config as saved, or None"""
     for path in [CONFIG_FILE, ALT_CONFIG_FILE]:
         try:
-            with open(path, 'w') as f:
-                json.dump(config, f)
-            print(f"SERVICE: Config saved to {path}")
-            return True
+            saved = config_store(path).save(config)
+            print(f"SERVICE: Config saved to {path} (version {saved['_version']})")
+            return saved
+        except StaleConfig as e:
+            print(f"SERVICE: Config not saved: {e}")
+            return None
         except Exception as e:
             print(f"SERVICE: Failed to save config to {path}: {e}")
-    return False
+    return None
 
 def check_overlay_permission():
     """Check if overlay permission is granted"""
@@ -80,9 +116,71 @@ def launch_blocking_activity():
         traceback.print_exc()
         return False
 
+def hide_overlay():
+    """Remove the overlay added by show_overlay, if any"""
+    global overlay_shown, overlay_view, window_manager
+    overlay_shown = False
+    if overlay_view is None:
+        return
+    try:
+        window_manager.removeView(overlay_view)
+        print("SERVICE: Overlay removed")
+    except Exception as e:
+        print(f"SERVICE: Error removing overlay: {e}")
+    overlay_view = None
+    window_manager = None
+
+
+def apply_extensions():
+    """Apply granted extension requests and lift the block"""
+    applied = extension_queue.apply_granted(load_config, save_config)
+    for request in applied:
+        delay = request['applied'] - (request['decided'] or request['requested'])
+        print(f"SERVICE: Extension {request['id']} (+{request['minutes']}m) applied {delay:.2f}s after grant")
+    if applied:
+        hide_overlay()
+    return bool(applied)
+
+
+def data_dir():
+    """Directory holding the config, queue and socket"""
+    if os.path.isdir(os.path.dirname(CONFIG_FILE)):
+        return os.path.dirname(CONFIG_FILE)
+    return os.path.dirname(os.path.abspath(ALT_CONFIG_FILE))
+
+
+def android_usage_events(since, until):
+    """Foreground/background app switches between two POSIX times"""
+    try:
+        from jnius import autoclass
+        
+        PythonService = autoclass('org.kivy.android.PythonService')
+        Context = autoclass('android.content.Context')
+        UsageEvents = autoclass('android.app.usage.UsageEvents')
+        
+        context = PythonService.mService.getApplicationContext()
+        manager = context.getSystemService(Context.USAGE_STATS_SERVICE)
+        found = manager.queryEvents(int(since * 1000), int(until * 1000))
+        event = UsageEvents.Event()
+        events = []
+        while found.hasNextEvent():
+            found.getNextEvent(event)
+            kind = event.getEventType()
+            if kind in (UsageEvents.Event.MOVE_TO_FOREGROUND, UsageEvents.Event.MOVE_TO_BACKGROUND):
+                events.append({
+                    'package': event.getPackageName(),
+                    'foreground': kind == UsageEvents.Event.MOVE_TO_FOREGROUND,
+                    'time': event.getTimeStamp() / 1000.0,
+                })
+        return events
+    except Exception as e:
+        print(f"SERVICE: Usage events unavailable: {e}")
+        return []
+
+
 def show_overlay():
     """Show the battery drained overlay over all apps"""
-    global overlay_shown
+    global overlay_shown, overlay_view, window_manager
     
     if not check_overlay_permission():
         print("SERVICE: Cannot show overlay - permission not granted!")
@@ -153,6 +251,8 @@ def show_overlay():
         try:
             wm.addView(layout, params)
             overlay_shown = True
+            overlay_view = layout
+            window_manager = wm
             print("SERVICE: OVERLAY SHOWN SUCCESSFULLY!")
             return True
         except Exception as e:
@@ -170,10 +270,181 @@ def show_overlay():
         return launch_blocking_activity()
 
 
-def main():
-    """Main service loop - checks timer and shows overlay when expired"""
-    global overlay_shown
+def seconds_until_wakeup(config, now):
+    """Sleep until the timer ends or the schedule changes state, whichever is first."""
+    if not config:
+        return POLL_SECONDS
+    timer_end = None
+    if config.get('is_timer_active') and config.get('timer_end_timestamp'):
+        timer_end = datetime.fromisoformat(config['timer_end_timestamp'])
+    wakeup = schedule_engine.next_wakeup(config, now, timer_end)
+    if wakeup is None:
+        return MAX_SLEEP_SECONDS
+    return min(MAX_SLEEP_SECONDS, max(1, (wakeup - now).total_seconds()))
+
+
+def check_timer(config):
+    """Show the block screen if the timer ran out or the schedule blocks now"""
+    global overlay_shown, timer_active
+    timer_active = bool(config and config.get('is_timer_active') and config.get('timer_end_timestamp'))
+    if not timer_active:
+        return
+    end_time = datetime.fromisoformat(config['timer_end_timestamp'])
+    now = datetime.now()
+    remaining = (end_time - now).total_seconds()
+    reason = 'timer'
+    if not schedule_engine.active_schedule(config).is_allowed(now):
+        print("SERVICE: Blocked by schedule")
+        remaining = 0
+        reason = 'schedule'
     
+    if remaining <= 0 and not overlay_shown:
+        print("=" * 50)
+        print("SERVICE: TIMER EXPIRED!")
+        print("=" * 50)
+        
+        success = show_overlay()
+        
+        if success:
+            overlay_shown = True
+            timer_active = False
+            saved = save_expiry(config, config['timer_end_timestamp'])
+            if saved is None:
+                # Nothing on disk says the timer ended: don't report it, try again next pass.
+                print("SERVICE: Could not save expiry, lifting block until the next check")
+                timer_active = True
+                hide_overlay()
+            elif saved.get('is_timer_active'):
+                # The parent restarted or extended the timer while this check ran.
+                print("SERVICE: Timer changed meanwhile, lifting block")
+                timer_active = True
+                hide_overlay()
+            else:
+                print("SERVICE: Block screen activated!")
+                publish_expiry(config, end_time, min(now, end_time) if reason == 'timer' else now, reason)
+        else:
+            print("SERVICE: Failed to show block screen!")
+    elif remaining > 0:
+        mins = int(remaining // 60)
+        secs = int(remaining % 60)
+        print(f"SERVICE: Timer active - {mins}m {secs}s remaining")
+
+
+def save_expiry(config, timer_end):
+    """Save config with the timer ended; returns the config on disk, or None.
+
+    A failed write is retried from a fresh read. If that shows the timer
+    already ended, or restarted with another end, it is returned as is.
+    """
+    for attempt in range(EXPIRY_SAVE_ATTEMPTS):
+        if attempt:
+            print("SERVICE: Expiry not saved, retrying with a fresh config")
+            config = load_config()
+            if not config:
+                return None
+            if not config.get('is_timer_active') or config.get('timer_end_timestamp') != timer_end:
+                return config
+        config['is_timer_active'] = False
+        config['timer_end_timestamp'] = None
+        saved = save_config(config)
+        if saved is not None:
+            return saved
+    return None
+
+
+def publish_expiry(config, end_time, ended, reason):
+    """Log the finished session and tell the app the timer ended"""
+    start = config.get('timer_start_timestamp')
+    start = datetime.fromisoformat(start) if start else end_time - timedelta(minutes=config.get('timer_minutes', 5))
+    profile_id = config.get('active_profile', 'default')
+    session_id = usage_log.timer_session_id(profile_id, start.isoformat())
+    log_usage(usage_log.session(profile_id, start, ended, session_id, reason))
+    sent = command_server.publish({
+        'type': 'expired',
+        'reason': reason,
+        'profile': profile_id,
+        'session': session_id,
+        'start': start.isoformat(),
+        'end': end_time.isoformat(),
+        'ended': ended.isoformat(),
+    })
+    print(f"SERVICE: Expiry sent to {sent} subscriber(s)")
+
+
+def log_usage(record):
+    """Append a usage record now and fold it, with any others, FOLD_SECONDS later"""
+    usage_log.append([record])
+    if 'usage-fold' not in deadlines.when:
+        deadlines.set('usage-fold', time.time() + usage_log.FOLD_SECONDS)
+
+
+def fold_usage():
+    """Fold the usage log; returns what changed per profile"""
+    deadlines.cancel('usage-fold')
+    folded = usage_log.fold()
+    if folded:
+        print(f"SERVICE: Folded usage for {', '.join(sorted(folded))}")
+        command_server.publish({'type': 'folded', 'folded': folded})
+    return folded
+
+
+def rollup_usage():
+    """Run the daily retention rollup and re-arm it for just after next midnight"""
+    rolled = usage_log.rollup()
+    if rolled:
+        print(f"SERVICE: Rolled up usage for {', '.join(sorted(rolled))}")
+        command_server.publish({'type': 'folded', 'folded': rolled})
+    midnight = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    deadlines.set('usage-rollup', (midnight + timedelta(minutes=ROLLUP_DELAY_MINUTES)).timestamp())
+
+
+def on_deadline(event):
+    if event['name'] == 'usage-fold':
+        fold_usage()
+    elif event['name'] == 'usage-rollup':
+        rollup_usage()
+    else:
+        refresh(event)
+
+
+def refresh(event=None):
+    """Re-read the config, apply extensions, check the timer and re-arm the wakeup"""
+    config = load_config()
+    if apply_extensions():
+        config = load_config()
+    check_timer(config)
+    deadlines.set('wakeup', time.time() + seconds_until_wakeup(config, datetime.now()))
+    if usage_log.pending_size() and 'usage-fold' not in deadlines.when:
+        # The app appended while no service was listening to fold it.
+        deadlines.set('usage-fold', time.time() + usage_log.FOLD_SECONDS)
+    usage_poller.wake()
+    return config
+
+
+def on_command(event):
+    command = event['command'].get('command')
+    if command == 'check':
+        refresh()
+    elif command == 'fold':
+        return {'folded': fold_usage()}
+    elif command != 'status':
+        return {'error': f"unknown command {command!r}"}
+    return {'overlay_shown': overlay_shown, 'timer_active': timer_active}
+
+
+def on_usage(event):
+    for usage in event['events']:
+        state = 'foreground' if usage['foreground'] else 'background'
+        print(f"SERVICE: {usage['package']} moved to {state}")
+
+
+command_server = CommandServer(os.path.join(data_dir(), SOCKET_FILE))
+usage_poller = UsagePoller(android_usage_events, USAGE_POLL_SECONDS, lambda: timer_active)
+
+
+def main():
+    """Run the service loop: every change to the config, the extension queue,
+    the socket or a deadline re-checks the timer"""
     print("=" * 50)
     print("SERVICE: Timer monitoring service started!")
     print("=" * 50)
@@ -185,47 +456,30 @@ def main():
         print("SERVICE WARNING: Overlay permission not granted!")
         print("SERVICE WARNING: Will use activity fallback when timer expires")
     
+    core.add(FileWatcher(data_dir(), {os.path.basename(CONFIG_FILE), extension_queue.QUEUE_FILE}))
+    core.add(command_server)
+    core.add(deadlines)
+    core.add(usage_poller)
+    core.on('file', refresh)
+    core.on('deadline', on_deadline)
+    core.on('command', on_command)
+    core.on('usage', on_usage)
+    
+    async def start():
+        loop = asyncio.get_running_loop()
+        loop.call_soon(refresh)
+        loop.call_soon(rollup_usage)
+        await core.run()
+    
     while True:
         try:
-            config = load_config()
-            
-            if config:
-                is_active = config.get('is_timer_active', False)
-                end_timestamp = config.get('timer_end_timestamp')
-                
-                if is_active and end_timestamp:
-                    end_time = datetime.fromisoformat(end_timestamp)
-                    now = datetime.now()
-                    remaining = (end_time - now).total_seconds()
-                    
-                    if remaining <= 0 and not overlay_shown:
-                        print("=" * 50)
-                        print("SERVICE: TIMER EXPIRED!")
-                        print("=" * 50)
-                        
-                        success = show_overlay()
-                        
-                        if success:
-                            overlay_shown = True
-                            config['is_timer_active'] = False
-                            config['timer_end_timestamp'] = None
-                            save_config(config)
-                            print("SERVICE: Block screen activated!")
-                        else:
-                            print("SERVICE: Failed to show block screen!")
-                            
-                    elif remaining > 0:
-                        mins = int(remaining // 60)
-                        secs = int(remaining % 60)
-                        print(f"SERVICE: Timer active - {mins}m {secs}s remaining")
-            
-            time.sleep(5)
-            
+            asyncio.run(start())
+            return
         except Exception as e:
-            print(f"SERVICE ERROR in main loop: {e}")
+            print(f"SERVICE ERROR in event loop: {e}")
             import traceback
             traceback.print_exc()
-            time.sleep(5)
+            time.sleep(POLL_SECONDS)
 
 
 if __name__ == '__main__':
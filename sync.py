@@ -0,0 +1,195 @@
+"""
+Parent/child device sync.
+
+Every local change is a record {"seq", "kind", "key", "value", "device"}
+in an outbox. seq is this device's own counter, so a sync only sends the
+records after the last seq the server acknowledged. Settings and profiles
+are upserts (a newer change to the same key replaces the queued one), while
+sessions and extension requests are appended. Batches of up to BATCH_SIZE
+records are POSTed as gzip-compressed JSON to <server>/sync. The reply
+acknowledges them and carries the other devices' records since the last
+server seq we applied.
+
+State lives in sync_state.json. The protocol is plain HTTP, so
+sync_server.py serves as a local stand-in:
+
+    python sync_server.py --port 8765
+
+A second client, stats, pushes only sessions over the same protocol to
+an optional aggregation server (python -m server), with its own state
+in stats_sync_state.json.
+"""
+import gzip
+import json
+import os
+import threading
+import urllib.request
+import uuid
+
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+STATE_FILE = "sync_state.json"
+STATS_STATE_FILE = "stats_sync_state.json"
+BATCH_SIZE = 500
+TIMEOUT = 15
+
+UPSERT_KINDS = ("config", "profile")
+APPEND_KINDS = ("session", "extension")
+
+# Settings a parent edits for the child; timer state stays on the device.
+SYNCED_CONFIG_KEYS = (
+    "break_reminder_enabled", "break_reminder_interval", "warning_before_end",
+    "extension_requests_enabled", "max_extension_minutes",
+    "custom_overlay_message", "selected_overlay", "sound_enabled",
+)
+
+
+def encode(payload):
+    return gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(body):
+    return json.loads(gzip.decompress(body).decode('utf-8'))
+
+
+def post_requests(url, payload):
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    response = requests.post(url, data=encode(payload), headers=headers, timeout=TIMEOUT)
+    response.raise_for_status()
+    # requests has already undone the reply's Content-Encoding.
+    return json.loads(response.content)
+
+
+def post_urllib(url, payload):
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    request = urllib.request.Request(url, data=encode(payload), headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return decode(response.read())
+
+
+def post(url, payload):
+    if REQUESTS_AVAILABLE:
+        return post_requests(url, payload)
+    return post_urllib(url, payload)
+
+
+class SyncClient:
+    def __init__(self, state_file=STATE_FILE):
+        self.state_file = state_file
+        self.lock = threading.RLock()
+        self.state = self.load()
+        self.running = False
+        self.enabled = False
+
+    def load(self):
+        state = {"device_id": uuid.uuid4().hex, "seq": 0, "acked": 0, "remote": 0,
+                 "outbox": [], "tracked": {}}
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as f:
+                    state.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading sync state: {e}")
+        return state
+
+    def save(self):
+        try:
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            print(f"Error saving sync state: {e}")
+
+    def track(self, kind, key, value):
+        """Queue a local change for the next sync (only while sync is set up)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.state["seq"] += 1
+            record = {"seq": self.state["seq"], "kind": kind, "key": key,
+                      "value": value, "device": self.state["device_id"]}
+            outbox = self.state["outbox"]
+            if kind in UPSERT_KINDS:
+                outbox[:] = [r for r in outbox if (r["kind"], r["key"]) != (kind, key)]
+            outbox.append(record)
+            self.save()
+
+    def track_config(self, config):
+        """Queue the synced settings that changed since they were last tracked."""
+        self.enabled = bool(config.get("sync_server"))
+        if not self.enabled:
+            return
+        with self.lock:
+            tracked = self.state["tracked"]
+            for key in SYNCED_CONFIG_KEYS:
+                if key in config and tracked.get(key) != config[key]:
+                    tracked[key] = config[key]
+                    self.track("config", key, config[key])
+
+    def pending(self):
+        with self.lock:
+            return len(self.state["outbox"])
+
+    def sync(self, server, group, apply):
+        """Push the outbox and pull remote records until both sides are caught up.
+
+        apply(record) is called for every remote record, in server order;
+        returns (records sent, records received).
+        """
+        url = server.rstrip('/') + '/sync'
+        sent = received = 0
+        while True:
+            with self.lock:
+                batch = self.state["outbox"][:BATCH_SIZE]
+                since = self.state["remote"]
+            reply = post(url, {"device": self.state["device_id"], "group": group,
+                               "since": since, "changes": batch, "limit": BATCH_SIZE})
+            for record in reply.get("changes", ()):
+                apply(record)
+                received += 1
+            with self.lock:
+                ack = reply.get("ack", 0)
+                self.state["acked"] = max(self.state["acked"], ack)
+                self.state["outbox"] = [r for r in self.state["outbox"] if r["seq"] > ack]
+                if reply.get("changes"):
+                    # Applied remote settings must not echo back as local changes.
+                    for record in reply["changes"]:
+                        if record["kind"] == "config":
+                            self.state["tracked"][record["key"]] = record["value"]
+                self.state["remote"] = reply.get("seq", since)
+                self.save()
+                sent += len(batch)
+                stalled = batch and ack < batch[-1]["seq"]
+                if not reply.get("more") and (not self.state["outbox"] or stalled):
+                    return sent, received
+
+    def sync_async(self, server, group, apply, callback=None):
+        """Run sync() on a worker thread; callback(sent, received, error) runs there too."""
+        if self.running:
+            return None
+        self.running = True
+
+        def run():
+            try:
+                sent, received = self.sync(server, group, apply)
+                if callback:
+                    callback(sent, received, None)
+            except Exception as e:
+                print(f"Error syncing: {e}")
+                if callback:
+                    callback(0, 0, e)
+            finally:
+                self.running = False
+
+        thread = threading.Thread(target=run, name="sync", daemon=True)
+        thread.start()
+        return thread
+
+
+client = SyncClient()
+stats = SyncClient(STATS_STATE_FILE)
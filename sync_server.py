@@ -0,0 +1,107 @@
+"""
+Local stand-in for the sync server, for offline testing on Linux.
+
+Keeps one ordered log of records per group (a family's devices share a
+group code). POST /sync stores the device's new records, skipping any seq
+already seen from that device, so retried batches are harmless. It
+answers with the highest seq stored for the device and the other
+devices' records after the client's last server seq.
+
+    python sync_server.py --port 8765 [--data sync_server_data.json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sync import decode, encode
+
+
+class SyncStore:
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.groups = {}
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.groups = json.load(f)
+
+    def group(self, name):
+        return self.groups.setdefault(name, {"log": [], "devices": {}})
+
+    def exchange(self, request):
+        device = request["device"]
+        limit = request.get("limit", 500)
+        with self.lock:
+            group = self.group(request.get("group", ""))
+            log = group["log"]
+            last = group["devices"].get(device, 0)
+            for record in request.get("changes", ()):
+                if record["seq"] > last:
+                    log.append(dict(record, server_seq=len(log) + 1))
+                    last = record["seq"]
+            group["devices"][device] = last
+            since = request.get("since", 0)
+            pending = [r for r in log[since:] if r["device"] != device]
+            changes = pending[:limit]
+            seq = changes[-1]["server_seq"] if len(pending) > limit else len(log)
+            if self.path:
+                self.save()
+        return {"ack": last, "seq": seq, "changes": changes, "more": len(pending) > limit}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.groups, f)
+        os.replace(tmp_path, self.path)
+
+
+def make_handler(store):
+    class SyncHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip('/') != '/sync':
+                self.send_error(404)
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                reply = encode(store.exchange(decode(body)))
+            except Exception as e:
+                self.send_error(400, str(e))
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SyncHandler
+
+
+def serve(port=8765, data=None, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), make_handler(SyncStore(data)))
+    print(f"Sync server listening on http://{host}:{server.server_port}")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Screen Guardian sync server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", help="JSON file to persist the logs in")
+    args = parser.parse_args(argv)
+    server = serve(args.port, args.data, args.host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
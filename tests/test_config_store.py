@@ -0,0 +1,106 @@
+import json
+import multiprocessing
+
+import pytest
+
+from config_store import KEEP_SNAPSHOTS, VERSION_KEY, ConfigStore, StaleConfig
+
+
+def _hammer(path, name, rounds, stale_every):
+    """Increment own counter, sometimes writing from a stale copy."""
+    store = ConfigStore(path)
+    config = store.read()
+    for i in range(rounds):
+        if i % stale_every:
+            config = store.read()
+        config = dict(config, **{name: config.get(name, 0) + 1, "last_writer": name})
+        config = store.save(config)
+    return store.conflicts
+
+
+def test_concurrent_writers_lose_no_updates(tmp_path):
+    path = str(tmp_path / "parental_config.json")
+    ConfigStore(path).save({"a": 0, "b": 0})
+    rounds = 300
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        pool.starmap(_hammer, [(path, "a", rounds, 3), (path, "b", rounds, 3)])
+    final = ConfigStore(path).read()
+    assert (final["a"], final["b"]) == (rounds, rounds)
+    assert final[VERSION_KEY] == 2 * rounds + 1
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / "parental_config.json")
+    ConfigStore(path).save({"is_timer_active": True, "timer_end_timestamp": "2026-01-01T10:00:00",
+                            "parent_pin": "old", "timer_minutes": 5})
+    return ConfigStore(path), ConfigStore(path)
+
+
+def test_long_stale_base_keeps_newer_changes(stores):
+    app, service = stores
+    config = app.read()
+    service.update(lambda c: dict(c, is_timer_active=False, timer_end_timestamp=None, parent_pin="new"))
+    for minutes in range(2 * KEEP_SNAPSHOTS):
+        # The app keeps saving the same long-lived dict from a slider,
+        # moving it to each saved version like Config.rebase does.
+        config["timer_minutes"] = minutes
+        config.update(app.save(config))
+    final = app.read()
+    assert final["timer_minutes"] == 2 * KEEP_SNAPSHOTS - 1
+    assert final["is_timer_active"] is False
+    assert final["timer_end_timestamp"] is None
+    assert final["parent_pin"] == "new"
+
+
+def test_stale_dict_past_the_snapshots_is_rejected(stores):
+    app, _ = stores
+    stale = app.read()
+    fresh = app.read()
+    fresh["parent_pin"] = "new"
+    for count in range(KEEP_SNAPSHOTS + 4):
+        fresh["counter"] = count
+        fresh = app.save(fresh)
+    stale["counter"] = 0
+    with pytest.raises(StaleConfig):
+        app.save(stale)
+    assert app.save_all([stale]) is None
+    final = app.read()
+    assert (final["parent_pin"], final["counter"]) == ("new", KEEP_SNAPSHOTS + 3)
+
+    # Keys nobody touched since the stale version still go through.
+    stale = {key: value for key, value in stale.items() if key not in ("parent_pin", "counter")}
+    stale["sound_enabled"] = False
+    saved = app.save(stale)
+    assert (saved["parent_pin"], saved["sound_enabled"]) == ("new", False)
+
+
+def test_stale_writer_can_change_its_own_key_again(stores):
+    app, service = stores
+    config = app.read()
+    config["timer_minutes"] = 10
+    app.save(config)
+    service.update(lambda c: dict(c, sound_enabled=False))
+    for _ in range(KEEP_SNAPSHOTS + 1):
+        service.update(lambda c: dict(c, tick=c.get("tick", 0) + 1))
+    config["timer_minutes"] = 20
+    final = app.save(config)
+    assert final["timer_minutes"] == 20
+    assert final["sound_enabled"] is False
+
+
+def test_legacy_document_without_base_is_rejected(tmp_path):
+    path = tmp_path / "parental_config.json"
+    path.write_text(json.dumps({VERSION_KEY: 7, "is_timer_active": False}))
+    store = ConfigStore(str(path))
+    with pytest.raises(StaleConfig):
+        store.save({VERSION_KEY: 3, "is_timer_active": True})
+    assert store.save_all([{VERSION_KEY: 3, "is_timer_active": True}]) is None
+    assert store.rejected == 1
+    assert json.loads(path.read_text())["is_timer_active"] is False
+
+    # Read once and writes merge again, and the history is recorded from then on.
+    config = store.read()
+    config["timer_minutes"] = 9
+    saved = store.save(config)
+    assert saved["_changed"]["timer_minutes"] == 8
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import extension_queue
+from config_store import ConfigStore
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def queue_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(extension_queue, "base_dir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConfigStore(str(tmp_path / "config.json"))
+    store.save({"is_timer_active": False})
+    return store
+
+
+def granted(minutes=15):
+    request = extension_queue.submit("kid", minutes, now=NOW - 60)
+    extension_queue.decide(request["id"], True, now=NOW - 30)
+    return request
+
+
+def timer_minutes(config):
+    end = datetime.fromisoformat(config["timer_end_timestamp"])
+    return (end - datetime.fromtimestamp(NOW)) / timedelta(minutes=1)
+
+
+def test_grant_is_applied_and_recorded_in_the_config(store):
+    request = granted()
+    applied = extension_queue.apply_granted(store.read, store.save, now=NOW)
+    assert [r["id"] for r in applied] == [request["id"]]
+    config = store.read()
+    assert config[extension_queue.APPLIED_KEY] == [request["id"]]
+    assert timer_minutes(config) == 15
+    assert extension_queue.get(request["id"])["state"] == "applied"
+
+
+def test_crash_before_marking_does_not_apply_twice(store, monkeypatch):
+    request = granted()
+    write = extension_queue._write
+
+    def crash(requests):
+        raise OSError("killed before the queue was written")
+
+    monkeypatch.setattr(extension_queue, "_write", crash)
+    with pytest.raises(OSError):
+        extension_queue.apply_granted(store.read, store.save, now=NOW)
+    monkeypatch.setattr(extension_queue, "_write", write)
+    assert extension_queue.get(request["id"])["state"] == "granted"
+
+    applied = extension_queue.apply_granted(store.read, store.save, now=NOW + 5)
+    assert [r["id"] for r in applied] == [request["id"]]
+    assert timer_minutes(store.read()) == 15
+    assert extension_queue.get(request["id"])["state"] == "applied"
+
+
+def test_failed_save_leaves_the_request_granted(store):
+    request = granted()
+    assert extension_queue.apply_granted(store.read, lambda config: None, now=NOW) == []
+    assert extension_queue.get(request["id"])["state"] == "granted"
+    assert not store.read()["is_timer_active"]
+
+    extension_queue.apply_granted(store.read, store.save, now=NOW)
+    assert extension_queue.get(request["id"])["state"] == "applied"
+    assert timer_minutes(store.read()) == 15
+
+
+def test_applied_ids_are_bounded(store):
+    for _ in range(extension_queue.KEEP_APPLIED_IDS + 5):
+        granted(1)
+        extension_queue.apply_granted(store.read, store.save, now=NOW)
+    assert len(store.read()[extension_queue.APPLIED_KEY]) == extension_queue.KEEP_APPLIED_IDS
+
+
+def test_stale_pending_requests_expire(store):
+    request = extension_queue.submit("kid", 10, now=NOW - extension_queue.MAX_PENDING_SECONDS - 1)
+    assert extension_queue.apply_granted(store.read, store.save, now=NOW) == []
+    assert extension_queue.get(request["id"])["state"] == "expired"
@@ -0,0 +1,103 @@
+import pytest
+
+from pin_lockout import BASE_LOCKOUT, CAPACITY, MAX_LOCKOUT, REFILL_SECONDS, PinLimiter
+
+
+class VirtualClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    limiter = PinLimiter(str(tmp_path / "pin_attempts.bin"), clock)
+    yield limiter
+    limiter.close()
+
+
+def burn(limiter, attempts):
+    return [limiter.attempt() for _ in range(attempts)]
+
+
+def test_burst_up_to_capacity_then_lockout(limiter):
+    assert burn(limiter, CAPACITY - 1) == [0] * (CAPACITY - 1)
+    assert limiter.wait_time() == 0
+    assert limiter.attempt() == BASE_LOCKOUT
+    assert limiter.wait_time() == BASE_LOCKOUT
+
+
+def test_lockouts_double_up_to_the_cap(limiter, clock):
+    burn(limiter, CAPACITY - 1)
+    lockouts = []
+    for _ in range(10):
+        lockouts.append(limiter.attempt())
+        clock.advance(limiter.wait_time())
+        assert limiter.wait_time() == 0
+    assert lockouts[:4] == [BASE_LOCKOUT * 2 ** i for i in range(4)]
+    assert max(lockouts) == lockouts[-1] == MAX_LOCKOUT
+
+
+def test_time_locked_out_earns_no_tokens(limiter, clock):
+    burn(limiter, CAPACITY)
+    clock.advance(BASE_LOCKOUT)
+    # Tokens only accrue from the end of the lockout, so this locks again.
+    assert limiter.attempt() == 2 * BASE_LOCKOUT
+
+
+def test_refill_restores_attempts_and_resets_backoff(limiter, clock):
+    burn(limiter, CAPACITY)
+    clock.advance(BASE_LOCKOUT + 2 * REFILL_SECONDS)
+    # Two tokens earned: one attempt free, the next one locks with the doubled time.
+    assert limiter.attempt() == 0
+    assert limiter.attempt() == 2 * BASE_LOCKOUT
+
+    clock.advance(2 * BASE_LOCKOUT + CAPACITY * REFILL_SECONDS)
+    assert burn(limiter, CAPACITY) == [0] * (CAPACITY - 1) + [BASE_LOCKOUT]
+
+
+def test_success_resets_the_bucket(limiter):
+    burn(limiter, CAPACITY - 1)
+    limiter.success()
+    assert burn(limiter, CAPACITY - 1) == [0] * (CAPACITY - 1)
+
+
+def test_state_is_shared_through_the_mapped_file(tmp_path, clock):
+    path = str(tmp_path / "pin_attempts.bin")
+    first, second = PinLimiter(path, clock), PinLimiter(path, clock)
+    try:
+        burn(first, CAPACITY - 1)
+        assert second.attempt() == BASE_LOCKOUT
+        assert first.wait_time() == BASE_LOCKOUT
+        clock.advance(10)
+        assert first.wait_time() == second.wait_time() == BASE_LOCKOUT - 10
+    finally:
+        first.close()
+        second.close()
+
+    reopened = PinLimiter(path, clock)
+    try:
+        assert reopened.wait_time() == BASE_LOCKOUT - 10
+    finally:
+        reopened.close()
+
+
+def test_corrupt_record_starts_fresh(tmp_path, clock):
+    path = tmp_path / "pin_attempts.bin"
+    path.write_bytes(b"\xff" * 32)
+    limiter = PinLimiter(str(path), clock)
+    try:
+        assert limiter.wait_time() == 0
+        assert burn(limiter, CAPACITY - 1) == [0] * (CAPACITY - 1)
+    finally:
+        limiter.close()
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("kivy")
+
+from kivy.clock import Clock  # noqa: E402
+
+from main import PopupManager  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def manager():
+    PopupManager.pool = []
+    PopupManager.queue.clear()
+    PopupManager.current = PopupManager.opening = None
+    PopupManager.init()
+    yield PopupManager
+    if PopupManager.current is not None:
+        PopupManager.current.dismiss(animation=False)
+
+
+def test_reopen_right_after_dismiss():
+    PopupManager.show('One', 'first')
+    first = PopupManager.current
+    first.dismiss()
+    assert first._is_open  # still fading out
+    PopupManager.show('Two', 'second')
+    second = PopupManager.current
+    assert second is not first
+    assert second._is_open and second.message.text == 'second'
+
+
+def test_queued_popup_opens_while_previous_fades_out():
+    PopupManager.show('One', 'first')
+    PopupManager.show('Two', 'second')
+    first = PopupManager.current
+    first.dismiss()
+    Clock.tick()
+    second = PopupManager.current
+    assert second is not first
+    assert second._is_open and second.message.text == 'second'
+    second.dismiss()
+    PopupManager.show('Three', 'third')
+    assert PopupManager.current._is_open
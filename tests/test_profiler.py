@@ -0,0 +1,45 @@
+import gc
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from kivy.clock import Clock  # noqa: E402
+
+from profiler import Profiler  # noqa: E402
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    profiler.start()
+    yield profiler
+    profiler.stop()
+
+
+class Owner:
+    def __init__(self):
+        self.calls = 0
+
+    def tick(self, dt):
+        self.calls += 1
+
+
+def test_triggers_survive_garbage_collection(profiler):
+    owner = Owner()
+    trigger = Clock.create_trigger(owner.tick)
+    gc.collect()
+    trigger()
+    Clock.tick()
+    assert owner.calls == 1
+    assert 'Owner.tick' in profiler.histograms
+
+
+def test_rescheduling_reuses_the_wrapper(profiler):
+    owner = Owner()
+    for _ in range(3):
+        Clock.schedule_once(owner.tick)
+    assert len(profiler._clock_wrappers) == 1
+    Clock.unschedule(owner.tick)
+    Clock.tick()
+    assert owner.calls == 0
@@ -0,0 +1,137 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import usage_log
+from quota import QuotaLedger
+from schedule_engine import compile_schedule
+
+
+class FakeClock:
+    def __init__(self, when):
+        self.now = when.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs).total_seconds()
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def ledger_from_sessions(clock, sessions):
+    """A ledger whose history is the given (start, end) sessions, split per day like a fold."""
+    def load_used(profile_id, day):
+        seconds = sum(part for start, end in sessions
+                      for d, _, part in usage_log.split_days(start.timestamp(), end.timestamp()) if d == day)
+        return int(seconds // 60)
+    return QuotaLedger(load_used, clock)
+
+
+def test_session_crossing_midnight_is_split_at_rollover(new_york):
+    clock = FakeClock(datetime(2026, 6, 10, 23, 40))
+    sessions = [(datetime(2026, 6, 10, 23, 40), datetime(2026, 6, 11, 0, 25))]
+    ledger = ledger_from_sessions(clock, sessions)
+    assert ledger.seconds_until_rollover() == 20 * 60
+    assert ledger.used_minutes("kid") == 20
+
+    clock.advance(minutes=20)
+    assert ledger.seconds_until_rollover() == 0
+    ledger.rollover()
+    assert ledger.day == date(2026, 6, 11)
+    assert ledger.used_minutes("kid") == 25
+    assert ledger.remaining("kid", 60) == 35
+    assert ledger.seconds_until_rollover() == 24 * 3600
+
+
+@pytest.mark.parametrize("day, hours", [
+    (date(2026, 3, 8), 23),   # spring forward
+    (date(2026, 11, 1), 25),  # fall back
+])
+def test_rollover_on_dst_days(new_york, day, hours):
+    clock = FakeClock(datetime.combine(day, datetime.min.time()))
+    ledger = QuotaLedger(lambda profile_id, d: 0, clock)
+    ledger.add("kid", 30)
+    assert ledger.seconds_until_rollover() == hours * 3600
+
+    clock.advance(hours=hours - 1)
+    assert ledger.now().hour == 23
+    assert ledger.used_minutes("kid") == 30
+    assert ledger.seconds_until_rollover() == 3600
+
+    clock.advance(hours=1)
+    assert ledger.seconds_until_rollover() == 0
+    ledger.rollover()
+    assert ledger.day == day + timedelta(days=1)
+    assert ledger.used_minutes("kid") == 0
+    assert ledger.seconds_until_rollover() == 24 * 3600
+
+
+SCHOOL_NIGHT = compile_schedule({"Wednesday": 90}, [{"days": ["Wednesday"], "start": "21:00", "end": "07:00"}])
+
+
+def test_blocked_window_crosses_midnight():
+    wednesday = datetime(2026, 6, 10, 20, 30)
+    assert SCHOOL_NIGHT.is_allowed(wednesday)
+    assert SCHOOL_NIGHT.allowed_minutes(wednesday, used=0) == 30
+    assert SCHOOL_NIGHT.allowed_minutes(wednesday, used=80) == 10
+    assert SCHOOL_NIGHT.next_boundary(wednesday) == datetime(2026, 6, 10, 21, 0)
+
+    for when in (datetime(2026, 6, 10, 23, 59), datetime(2026, 6, 11, 0, 0), datetime(2026, 6, 11, 6, 59)):
+        assert not SCHOOL_NIGHT.is_allowed(when)
+        assert SCHOOL_NIGHT.allowed_minutes(when) == 0
+        assert SCHOOL_NIGHT.next_boundary(when) == datetime(2026, 6, 11, 7, 0)
+    assert SCHOOL_NIGHT.is_allowed(datetime(2026, 6, 11, 7, 0))
+    # Thursday has no quota of its own.
+    assert SCHOOL_NIGHT.quota(datetime(2026, 6, 11, 7, 0)) is None
+
+
+def test_sunday_window_continues_into_monday():
+    schedule = compile_schedule({}, [{"days": ["Sunday"], "start": "22:00", "end": "06:00"}])
+    sunday = datetime(2026, 6, 14, 23, 0)
+    assert not schedule.is_allowed(sunday)
+    assert not schedule.is_allowed(datetime(2026, 6, 15, 5, 59))
+    assert schedule.next_boundary(sunday) == datetime(2026, 6, 15, 6, 0)
+
+
+@pytest.mark.parametrize("night, real_hours", [
+    (date(2026, 3, 7), 8),    # the clocks skip 02:00-03:00
+    (date(2026, 10, 31), 10),  # the clocks repeat 01:00-02:00
+])
+def test_blocked_window_over_dst_change_ends_at_wall_clock_time(new_york, night, real_hours):
+    schedule = compile_schedule({}, [{"days": ["Saturday"], "start": "22:00", "end": "07:00"}])
+    clock = FakeClock(datetime.combine(night, datetime.min.time()) + timedelta(hours=22))
+    now = datetime.fromtimestamp(clock())
+    assert not schedule.is_allowed(now)
+    morning = datetime.combine(night + timedelta(days=1), datetime.min.time()) + timedelta(hours=7)
+    assert schedule.next_boundary(now) == morning
+
+    clock.advance(hours=real_hours, minutes=-1)
+    assert not schedule.is_allowed(datetime.fromtimestamp(clock()))
+    clock.advance(minutes=1)
+    assert datetime.fromtimestamp(clock()) == morning
+    assert schedule.is_allowed(morning)
+
+
+def test_allowed_minutes_are_whole_minutes():
+    clock = FakeClock(datetime(2026, 6, 10, 12, 0))
+    ledger = QuotaLedger(lambda profile_id, day: 12.3, clock)
+    profile = {"daily_limit": 60, "schedule": {"Wednesday": 90}}
+    assert ledger.remaining("kid", 60) == 47
+    allowed = ledger.allowed_minutes("kid", profile)
+    assert allowed == 47 and isinstance(allowed, int)
+
+    ledger.add("kid", 47.3)  # 59.6 used: 0.4 min left is nothing to start a timer with
+    assert ledger.remaining("kid", 60) == 0
+    assert ledger.allowed_minutes("kid", profile) == 0
+    assert ledger.allowed_minutes("kid", {"schedule": {"Wednesday": 60}}) == 0
+    assert ledger.allowed_minutes("kid", {}) is None
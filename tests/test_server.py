@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+import sync
+from server import storage as storage_module
+from server.app import AggregationServer
+from server.rollup import Rollups
+from server.storage import Storage
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = AggregationServer(("127.0.0.1", 0), str(tmp_path / "data"))
+    yield server
+    server.server_close()
+
+
+def batch(device, *records, group="family"):
+    return {"device": device, "group": group, "since": 0, "changes": list(records), "limit": 500}
+
+
+def session(seq, profile, start, minutes, kind="session"):
+    return {"seq": seq, "kind": kind, "key": f"{profile}/{start}", "device": "tablet",
+            "value": {"profile": profile, "start": start, "minutes": minutes}}
+
+
+def rebuilt(server):
+    return Rollups.from_storage(Storage(server.storage.data_dir))
+
+
+def test_retried_batch_is_counted_once(server):
+    upload = batch("tablet", session(1, "ann", "2025-01-01T10:30:00", 45), session(2, "ann", "2025-01-02T08:00:00", 20))
+    assert server.exchange(upload)["ack"] == 2
+    assert server.exchange(upload)["ack"] == 2
+    assert server.rollups.totals["family/ann"] == 65
+    assert rebuilt(server).totals["family/ann"] == 65
+
+
+def test_other_records_are_acknowledged_but_not_stored(server):
+    reply = server.exchange(batch("tablet", {"seq": 1, "kind": "config", "key": "sound_enabled",
+                                             "value": False, "device": "tablet"}))
+    assert reply == {"ack": 1, "seq": 0, "changes": [], "more": False}
+    assert not server.rollups.totals
+
+
+def test_device_with_two_profiles_matches_a_full_rebuild(server):
+    server.exchange(batch("tablet", session(1, "ann", "2025-01-01T10:00:00", 30)))
+    server.exchange(batch("phone", session(1, "ann", "2025-01-01T18:00:00", 10)))
+    server.exchange(batch("tablet", session(2, "ben", "2025-01-02T10:00:00", 20),
+                          session(3, "ann", "2024-12-30T09:00:00", 5)))
+
+    fresh = rebuilt(server)
+    assert dict(server.rollups.totals) == dict(fresh.totals) == {"family/ann": 45, "family/ben": 20}
+    assert server.rollups.devices["family/ann"] == {"tablet", "phone"}
+    assert list(server.rollups.hours["family/ann"]) == list(fresh.hours["family/ann"])
+    assert dict(server.rollups.daily["family/ann"]) == dict(fresh.daily["family/ann"])
+    assert server.rollups.children() == fresh.children()
+
+
+def test_crash_after_the_journal_replays_the_batch_once(server, monkeypatch):
+    server.exchange(batch("tablet", session(1, "ann", "2025-01-02T10:00:00", 30)))
+
+    def crash(self, change):
+        raise OSError("power lost")
+    monkeypatch.setattr(storage_module.DeviceColumns, "apply", crash)
+    with pytest.raises(OSError):
+        server.exchange(batch("tablet", session(2, "ann", "2025-01-01T10:00:00", 15)))
+    monkeypatch.undo()
+    assert os.path.exists(os.path.join(server.storage.data_dir, "tablet.journal"))
+
+    restarted = Storage(server.storage.data_dir)
+    assert not os.path.exists(os.path.join(server.storage.data_dir, "tablet.journal"))
+    assert restarted.seqs["tablet"] == 2
+    assert restarted.ingest("tablet", "family", [session(2, "ann", "2025-01-01T10:00:00", 15)]) == {}
+    assert Rollups.from_storage(restarted).totals["family/ann"] == 45
+
+
+def test_sync_client_uploads_to_the_server(server, tmp_path):
+    import threading
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = sync.SyncClient(str(tmp_path / "stats_sync_state.json"))
+        client.enabled = True
+        client.track('session', 'ann/2025-01-01T10:00:00', {
+            'profile': 'ann', 'start': '2025-01-01T10:00:00', 'end': '2025-01-01T10:30:00', 'minutes': 30.0})
+        assert client.sync(f"http://127.0.0.1:{server.server_port}", "family", lambda record: None) == (1, 0)
+        assert client.pending() == 0
+        assert server.rollups.totals["family/ann"] == 30
+        with open(tmp_path / "stats_sync_state.json") as f:
+            assert json.load(f)["acked"] == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+from service import events
+from service.events import CommandServer, Deadlines, ServiceCore
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+async def until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def subscribe(path):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(b'{"command": "subscribe"}\n')
+    await writer.drain()
+    assert json.loads(await reader.readline())["ok"]
+    return reader, writer
+
+
+@pytest.fixture
+def server(tmp_path):
+    return CommandServer(str(tmp_path / "service.sock"))
+
+
+def run_with(server, scenario):
+    async def main():
+        core = ServiceCore()
+        core.add(server)
+        runner = asyncio.ensure_future(core.run())
+        await until(lambda: server.server is not None)
+        try:
+            await scenario()
+        finally:
+            core.stop()
+            await runner
+    asyncio.run(main())
+
+
+def test_events_reach_every_subscriber(server):
+    async def scenario():
+        (r1, w1), (r2, w2) = await subscribe(server.path), await subscribe(server.path)
+        assert server.publish({"type": "folded", "n": 1}) == 2
+        assert json.loads(await r1.readline()) == {"type": "folded", "n": 1}
+        assert json.loads(await r2.readline()) == {"type": "folded", "n": 1}
+        w1.close()
+        w2.close()
+    run_with(server, scenario)
+
+
+def test_disconnected_subscriber_is_removed(server):
+    async def scenario():
+        _, gone = await subscribe(server.path)
+        reader, writer = await subscribe(server.path)
+        gone.close()
+        await until(lambda: len(server.subscribers) == 1)
+        assert server.publish({"type": "expired"}) == 1
+        assert json.loads(await reader.readline()) == {"type": "expired"}
+        writer.close()
+    run_with(server, scenario)
+
+
+def test_slow_subscriber_is_dropped_without_stalling_others(server, monkeypatch):
+    monkeypatch.setattr(events, "MAX_SUBSCRIBER_BUFFER", 64 * 1024)
+    payload = "x" * 4096
+
+    async def scenario():
+        _, stalled = await subscribe(server.path)  # never reads
+        reader, writer = await subscribe(server.path)
+        received = 0
+        for _ in range(400):
+            server.publish({"type": "usage", "payload": payload})
+            json.loads(await reader.readline())
+            received += 1
+            await asyncio.sleep(0)
+        assert received == 400
+        assert len(server.subscribers) == 1
+        stalled.close()
+        writer.close()
+    run_with(server, scenario)
+
+
+def test_deadline_fires_at_wall_clock_time(monkeypatch):
+    monkeypatch.setattr(events, "MAX_TIMER_SECONDS", 0.05)
+    clock = FakeClock()
+    deadlines = Deadlines(clock)
+    fired = []
+
+    async def emit(event):
+        fired.append(event)
+
+    async def main():
+        runner = asyncio.ensure_future(deadlines.run(emit))
+        await asyncio.sleep(0)
+        deadlines.set("wakeup", clock.now + 3600)
+        await asyncio.sleep(0.2)
+        assert fired == []  # re-armed every MAX_TIMER_SECONDS meanwhile
+        clock.now += 3600  # the device slept through it
+        await until(lambda: fired)
+        assert fired == [{"type": "deadline", "name": "wakeup", "when": 1_000_000.0 + 3600}]
+        assert "wakeup" not in deadlines.when
+        runner.cancel()
+    asyncio.run(main())
+
+
+def test_pending_deadlines_are_rearmed_on_a_new_loop():
+    clock = FakeClock()
+    deadlines = Deadlines(clock)
+    fired = []
+
+    async def emit(event):
+        fired.append(event["name"])
+
+    async def first():
+        runner = asyncio.ensure_future(deadlines.run(emit))
+        await asyncio.sleep(0)
+        deadlines.set("usage-fold", clock.now + 0.05)
+        runner.cancel()
+        deadlines.close()
+
+    async def second():
+        runner = asyncio.ensure_future(deadlines.run(emit))
+        await until(lambda: fired)
+        deadlines.set("later", clock.now + 0.01)
+        await until(lambda: len(fired) == 2)
+        runner.cancel()
+
+    asyncio.run(first())
+    assert fired == [] and "usage-fold" in deadlines.when
+    asyncio.run(second())
+    assert fired == ["usage-fold", "later"]
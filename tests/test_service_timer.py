@@ -0,0 +1,69 @@
+import importlib.util
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "service")
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.syspath_prepend(SERVICE_DIR)
+    spec = importlib.util.spec_from_file_location("timer_service", os.path.join(SERVICE_DIR, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.published = []
+    module.overlay = []
+    monkeypatch.setattr(module, "show_overlay", lambda: module.overlay.append("show") or True)
+    monkeypatch.setattr(module, "hide_overlay", lambda: module.overlay.append("hide"))
+    monkeypatch.setattr(module, "publish_expiry", lambda *args: module.published.append(args))
+    monkeypatch.setattr(module.schedule_engine, "active_schedule",
+                        lambda config: module.schedule_engine.compile_schedule({}, []))
+    yield module
+    sys.modules.pop("timer_service", None)
+
+
+def expired_config():
+    end = (datetime.now() - timedelta(minutes=1)).isoformat()
+    return {"is_timer_active": True, "timer_end_timestamp": end, "timer_minutes": 5}
+
+
+def test_expiry_is_published_once_saved(service, monkeypatch):
+    saved = []
+    monkeypatch.setattr(service, "save_config", lambda config: saved.append(dict(config)) or config)
+    service.check_timer(expired_config())
+    assert saved[-1]["is_timer_active"] is False
+    assert len(service.published) == 1
+    assert service.overlay == ["show"]
+
+
+def test_failed_save_is_retried_from_a_fresh_read(service, monkeypatch):
+    config = expired_config()
+    results = iter([None, {"is_timer_active": False}])
+    monkeypatch.setattr(service, "save_config", lambda c: next(results))
+    monkeypatch.setattr(service, "load_config", lambda: dict(config))
+    service.check_timer(dict(config))
+    assert len(service.published) == 1
+    assert service.overlay == ["show"]
+
+
+def test_expiry_that_never_saves_is_not_published(service, monkeypatch):
+    config = expired_config()
+    monkeypatch.setattr(service, "save_config", lambda c: None)
+    monkeypatch.setattr(service, "load_config", lambda: dict(config))
+    service.check_timer(dict(config))
+    assert service.published == []
+    assert service.overlay == ["show", "hide"]
+    assert service.timer_active
+
+
+def test_timer_restarted_meanwhile_lifts_the_block(service, monkeypatch):
+    config = expired_config()
+    restarted = dict(config, timer_end_timestamp=(datetime.now() + timedelta(minutes=30)).isoformat())
+    monkeypatch.setattr(service, "save_config", lambda c: None)
+    monkeypatch.setattr(service, "load_config", lambda: dict(restarted))
+    service.check_timer(dict(config))
+    assert service.published == []
+    assert service.overlay == ["show", "hide"]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+import sync
+import sync_server
+
+
+@pytest.fixture
+def server_url():
+    server = sync_server.serve(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+TRANSPORTS = [
+    pytest.param(sync.post_urllib, id="urllib"),
+    pytest.param(sync.post_requests, id="requests",
+                 marks=pytest.mark.skipif(not sync.REQUESTS_AVAILABLE, reason="requests not installed")),
+]
+
+
+def client(tmp_path, name):
+    device = sync.SyncClient(str(tmp_path / f"{name}.json"))
+    device.enabled = True
+    return device
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_round_trip(tmp_path, server_url, transport, monkeypatch):
+    monkeypatch.setattr(sync, "post", transport)
+    child, parent = client(tmp_path, "child"), client(tmp_path, "parent")
+    for i in range(3):
+        child.track("session", f"kid/{i}", {"minutes": i})
+    parent.track("config", "sound_enabled", False)
+
+    assert child.sync(server_url, "family", lambda record: None) == (3, 0)
+    received = []
+    assert parent.sync(server_url, "family", received.append) == (1, 3)
+    assert [record["key"] for record in received] == ["kid/0", "kid/1", "kid/2"]
+    assert child.pending() == parent.pending() == 0
+
+    pulled = []
+    child.sync(server_url, "family", pulled.append)
+    assert [(r["key"], r["value"]) for r in pulled] == [("sound_enabled", False)]
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_retried_batch_is_stored_once(tmp_path, server_url, transport, monkeypatch):
+    monkeypatch.setattr(sync, "post", transport)
+    child = client(tmp_path, "child")
+    child.track("session", "kid/0", {"minutes": 5})
+    batch = list(child.state["outbox"])
+    request = {"device": child.state["device_id"], "group": "family", "since": 0,
+               "changes": batch, "limit": sync.BATCH_SIZE}
+    assert transport(server_url + "/sync", request)["ack"] == 1
+    assert transport(server_url + "/sync", request)["ack"] == 1
+
+    received = []
+    client(tmp_path, "parent").sync(server_url, "family", received.append)
+    assert len(received) == 1
@@ -0,0 +1,41 @@
+import gc
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from kivy.uix.label import Label  # noqa: E402
+
+from main import COLORS_DARK, COLORS_LIGHT, Theme  # noqa: E402
+
+
+@pytest.fixture
+def theme():
+    theme = Theme()
+    theme.use(COLORS_DARK, dark=True)
+    return theme
+
+
+def test_roles_follow_the_theme_even_when_colors_coincide(theme):
+    # Dark text_primary and light surface are both white.
+    text = theme.tint(Label(), 'text_primary')
+    card = theme.tint(Label(), 'surface')
+    theme.use(COLORS_LIGHT, dark=False)
+    assert tuple(text.color) == COLORS_LIGHT['text_primary']
+    assert tuple(card.color) == COLORS_LIGHT['surface']
+    theme.use(COLORS_DARK, dark=True)
+    assert tuple(text.color) == COLORS_DARK['text_primary']
+    assert tuple(card.color) == COLORS_DARK['surface']
+
+
+def test_retinting_moves_a_widget_to_another_role(theme):
+    status = theme.tint(Label(), 'text_secondary')
+    theme.tint(status, 'success')
+    theme.use(COLORS_LIGHT, dark=False)
+    assert tuple(status.color) == COLORS_LIGHT['success']
+
+
+def test_tinted_widgets_are_not_kept_alive(theme):
+    theme.tint(Label(), 'text_primary')
+    gc.collect()
+    assert len(theme.tinted) == 0
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+import usage_analytics
+from usage_analytics import HISTORY_DAYS, MIN_DAILY_HISTORY, MIN_WEEKDAY_HISTORY, analyze
+
+END = date(2025, 3, 2)  # a Sunday, so the window starts on a Monday
+
+
+def test_new_profile_gets_no_suggestions():
+    rec = analyze({'kid': [0] * HISTORY_DAYS}, END)['kid']
+    assert rec['daily_limit'] is None
+    assert all(v is None for v in rec['weekday'].values())
+    assert rec['history'] == 0
+
+
+def test_weekday_needs_enough_days_with_usage():
+    series = [0] * HISTORY_DAYS
+    for i in range(0, HISTORY_DAYS, 7):  # every Monday
+        series[i] = 60
+    series[1] = series[8] = 90  # two Tuesdays only
+    rec = analyze({'kid': series}, END)['kid']
+    assert rec['weekday'][0] is not None
+    assert rec['weekday'][1] is None
+    assert all(rec['weekday'][wd] is None for wd in range(2, 7))
+    assert rec['history'] < MIN_DAILY_HISTORY and rec['daily_limit'] is None
+
+
+def test_zero_days_do_not_drag_limits_down():
+    series = [0] * HISTORY_DAYS
+    for i in range(0, HISTORY_DAYS, 7):
+        series[i] = 60
+    sparse = analyze({'kid': series}, END)['kid']
+    full = analyze({'kid': [60] * HISTORY_DAYS}, END)['kid']
+    assert sparse['weekday'][0] == full['weekday'][0] > usage_analytics.MIN_LIMIT
+
+
+def test_full_history_suggests_everything():
+    rec = analyze({'kid': [60 + (i % 7) * 10 for i in range(HISTORY_DAYS)]}, END)['kid']
+    assert rec['history'] == HISTORY_DAYS >= MIN_DAILY_HISTORY
+    assert rec['daily_limit'] is not None
+    assert all(rec['weekday'][wd] is not None for wd in range(7))
+    assert rec['weekday'][6] > rec['weekday'][0]
+
+
+def test_pure_python_matches_numpy(monkeypatch):
+    pytest.importorskip("numpy")
+    series = {'a': [(i * 37) % 90 if i % 3 else 0 for i in range(HISTORY_DAYS)],
+              'b': [0] * (HISTORY_DAYS - MIN_WEEKDAY_HISTORY) + [45] * MIN_WEEKDAY_HISTORY}
+    expected = analyze(series, END)
+    monkeypatch.setattr(usage_analytics, 'NUMPY_AVAILABLE', False)
+    assert analyze(series, END) == expected
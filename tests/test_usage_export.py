@@ -0,0 +1,63 @@
+import csv
+import json
+import random
+
+import pytest
+
+import usage_export
+from usage_export import StatsFile, export, rows_for
+
+
+def random_stats(seed):
+    rng = random.Random(seed)
+    sessions = list(usage_export.synthetic_sessions(rng.randrange(0, 60), seed))
+    daily = {}
+    for session in sessions:
+        daily[session["date"]] = daily.get(session["date"], 0) + session["duration"]
+    stats = {"daily": daily, "sessions": sessions, "folded_ids": ["a", "b"],
+             "weekly": {"2019-W50": 321, "2019-W51": 12.5}, "last_rollup": "2020-01-02",
+             "daily_seconds": {}, "nested": {"list": [1, [2, {"x": None}]], "flag": True}}
+    keys = list(stats)
+    rng.shuffle(keys)
+    return {key: stats[key] for key in keys}
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("kind", usage_export.KINDS)
+def test_streamed_rows_match_loaded_rows(tmp_path, monkeypatch, seed, kind):
+    monkeypatch.setattr(usage_export, "CHUNK_SIZE", 7)
+    stats = random_stats(seed)
+    path = tmp_path / "usage_stats_kid.json"
+    path.write_text(json.dumps(stats, indent=seed % 3 or None))
+    for date_from, date_to in [(None, None), ("2020-01-03", "2020-01-05")]:
+        loaded = list(rows_for(kind, stats, date_from, date_to, "kid")[0])
+        streamed = list(rows_for(kind, StatsFile(str(path)), date_from, date_to, "kid")[0])
+        assert streamed == loaded
+
+
+def test_weekly_combines_rolled_up_weeks_and_days(tmp_path):
+    stats = {"weekly": {"2026-W01": 300}, "daily": {"2026-01-04": 20, "2026-01-05": 30, "2026-01-06": 15}}
+    path = tmp_path / "out.csv"
+    assert export("weekly", "csv", str(path), stats, profile="kid") == 2
+    with open(path) as f:
+        assert list(csv.DictReader(f)) == [
+            {"week": "2026-W01", "minutes": "320", "profile": "kid"},
+            {"week": "2026-W02", "minutes": "45", "profile": "kid"},
+        ]
+
+
+def test_missing_stats_file_exports_nothing(tmp_path):
+    out = tmp_path / "out.ndjson"
+    assert export("sessions", "ndjson", str(out), StatsFile(str(tmp_path / "none.json"))) == 0
+    assert out.read_text() == ""
+
+
+def test_unknown_kind_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export("monthly", "csv", str(tmp_path / "out.csv"), {})
+
+
+def test_export_memory_does_not_grow_with_history(tmp_path):
+    small = usage_export.benchmark(2000, directory=str(tmp_path))
+    large = usage_export.benchmark(20000, directory=str(tmp_path))
+    assert large < small * 1.5
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from usage_heatmap import SLOTS_PER_DAY, HeatmapStore
+
+
+def slot(moment):
+    return HeatmapStore.slot_index(moment)
+
+
+def test_session_crossing_an_hour_is_split_at_the_slot_boundary():
+    store = HeatmapStore('kid')
+    store.add_session(datetime(2025, 3, 3, 9, 50), 20 * 60)  # a Monday
+    assert store.slots[slot(datetime(2025, 3, 3, 9, 45))] == 10 * 60
+    assert store.slots[slot(datetime(2025, 3, 3, 10, 0))] == 10 * 60
+    assert sum(store.slots) == 20 * 60
+
+
+def test_session_crossing_midnight_moves_to_the_next_weekday():
+    store = HeatmapStore('kid')
+    store.add_session(datetime(2025, 3, 9, 23, 50), 20 * 60)  # Sunday into Monday
+    assert store.slots[6 * SLOTS_PER_DAY + SLOTS_PER_DAY - 1] == 10 * 60
+    assert store.slots[0] == 10 * 60
+    assert sum(store.slots) == 20 * 60
+
+
+def test_start_with_seconds_gives_short_slices_their_own_seconds():
+    store = HeatmapStore('kid')
+    store.add_session(datetime(2025, 3, 3, 10, 14, 30), 60)
+    assert store.slots[slot(datetime(2025, 3, 3, 10, 0))] == 30
+    assert store.slots[slot(datetime(2025, 3, 3, 10, 15))] == 30
+
+
+def test_fractional_slices_add_up_to_the_session():
+    store = HeatmapStore('kid')
+    store.add_session(datetime(2025, 3, 3, 10, 14, 59, 500000), 1)
+    assert sum(store.slots) == 1
+    store = HeatmapStore('kid')
+    store.add_session(datetime(2025, 3, 3, 10, 14, 59, 400000), 1.2)
+    assert sum(store.slots) == 1
@@ -0,0 +1,133 @@
+import time
+from datetime import date, datetime
+
+import pytest
+
+import usage_heatmap
+import usage_log
+import usage_query
+import usage_store
+from usage_heatmap import HeatmapStore
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    for module in (usage_log, usage_store, usage_heatmap):
+        monkeypatch.setattr(module, "base_dir", str(tmp_path))
+    HeatmapStore._cache.clear()
+    yield tmp_path
+    HeatmapStore._cache.clear()
+
+
+START = datetime(2026, 3, 2, 23, 50)
+END = datetime(2026, 3, 3, 0, 10, 30)
+TODAY = date(2026, 3, 3)
+
+
+def totals(profile_id="kid"):
+    stats = usage_store.load(profile_id)
+    heatmap = HeatmapStore.load(profile_id)
+    return stats["daily"], stats.get("daily_seconds", {}), sum(heatmap.slots)
+
+
+def test_fold_splits_at_midnight_and_skips_duplicates():
+    record = usage_log.session("kid", START, END, "timer:kid:1")
+    usage_log.append([record, dict(record)])
+    assert usage_log.fold(TODAY)["kid"]["seconds"] == 1230.0
+    usage_log.append([record])
+    assert usage_log.fold(TODAY) == {}
+    assert totals() == ({"2026-03-02": 10, "2026-03-03": 10}, {"2026-03-03": 30.0}, 1230)
+    assert usage_log.pending_size() == 0
+
+
+class Crash(Exception):
+    pass
+
+
+def test_crash_before_journal_redoes_the_fold(monkeypatch):
+    usage_log.append([usage_log.session("kid", START, END, "a")])
+    write = usage_log._write_synced
+
+    def crash_on_journal(path, data):
+        if path.endswith(usage_log.JOURNAL_FILE):
+            raise Crash()
+        write(path, data)
+    monkeypatch.setattr(usage_log, "_write_synced", crash_on_journal)
+    with pytest.raises(Crash):
+        usage_log.fold(TODAY)
+    assert usage_store.load("kid")["daily"] == {}
+
+    monkeypatch.setattr(usage_log, "_write_synced", write)
+    usage_log.fold(TODAY)
+    assert totals() == ({"2026-03-02": 10, "2026-03-03": 10}, {"2026-03-03": 30.0}, 1230)
+
+
+def test_crash_after_journal_is_finished_once(monkeypatch):
+    usage_log.append([usage_log.session("kid", START, END, "a")])
+    finish = usage_log._finish
+
+    def crash_midway(targets):
+        # Only the first file made it into place.
+        usage_log.os.replace(targets[0] + usage_log.STAGED_SUFFIX, targets[0])
+        raise Crash()
+    monkeypatch.setattr(usage_log, "_finish", crash_midway)
+    with pytest.raises(Crash):
+        usage_log.fold(TODAY)
+    assert sum(HeatmapStore.load("kid").slots) == 0
+
+    monkeypatch.setattr(usage_log, "_finish", finish)
+    usage_log.append([usage_log.session("kid", END, datetime(2026, 3, 3, 0, 11, 0), "b")])
+    assert usage_log.fold(TODAY)["kid"]["seconds"] == 30.0
+    assert totals() == ({"2026-03-02": 10, "2026-03-03": 11}, {}, 1260)
+
+
+def test_fold_changes_keep_a_cached_index_current():
+    usage_log.append([usage_log.session("kid", START, END, "a")])
+    usage_log.fold(TODAY)
+    index = usage_query.index_for("kid", lambda: usage_store.load("kid"))
+    try:
+        usage_log.append([usage_log.session("kid", END, datetime(2026, 3, 3, 0, 20, 30), "b")])
+        changes = usage_log.fold(TODAY)["kid"]
+        assert changes["days"] == {"2026-03-03": 10}
+        usage_query.apply_fold("kid", changes)
+        # The same fold arriving again, by reply and by event, is skipped.
+        usage_query.apply_fold("kid", changes)
+        assert usage_query.index_for("kid", dict).series(date(2026, 3, 2), TODAY) == [10, 20]
+        assert index.seq == changes["seq"]
+    finally:
+        usage_query.invalidate()
+
+
+def test_rollup_runs_once_a_day_without_new_usage():
+    usage_log.append([usage_log.session("kid", datetime(2024, 1, 3, 10), datetime(2024, 1, 3, 11), "old")])
+    usage_log.fold(date(2024, 1, 3))
+    rolled = usage_log.rollup(TODAY)
+    assert rolled["kid"]["days"] is None
+    stats = usage_store.load("kid")
+    assert stats["daily"] == {} and stats["weekly"] == {"2024-W01": 60}
+    assert usage_log.rollup(TODAY) == {}
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize("start, end, minutes", [
+    # 01:00 EST to 04:00 EDT on the spring-forward day is two real hours.
+    (datetime(2026, 3, 8, 1, 0), datetime(2026, 3, 8, 4, 0), 120),
+    # 00:30 to 02:30 on the fall-back day repeats 01:00-02:00: three real hours.
+    (datetime(2026, 11, 1, 0, 30), datetime(2026, 11, 1, 2, 30), 180),
+    # Across the short night: 23:00 Saturday to 04:00 Sunday.
+    (datetime(2026, 3, 7, 23, 0), datetime(2026, 3, 8, 4, 0), 240),
+])
+def test_split_days_counts_real_time_over_dst(new_york, start, end, minutes):
+    parts = list(usage_log.split_days(start.timestamp(), end.timestamp()))
+    assert sum(seconds for _, _, seconds in parts) / 60 == minutes
+    assert parts[-1][0] == end.date()
+    if start.date() != end.date():
+        assert [(day, seconds / 60) for day, _, seconds in parts][0] == (start.date(), 60)
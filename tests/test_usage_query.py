@@ -0,0 +1,69 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from usage_query import DayIndex
+
+FIRST = date(2025, 1, 1)
+
+
+def brute_sum(values, start, end):
+    return sum(m for d, m in values.items() if start <= d <= end)
+
+
+def brute_max(values, start, end):
+    days = [(m, d) for d, m in values.items() if start <= d <= end]
+    return max(m for m, _ in days) if days else 0
+
+
+def check(index, values, rng, queries=20):
+    for _ in range(queries):
+        start = FIRST + timedelta(days=rng.randrange(-5, 80))
+        end = start + timedelta(days=rng.randrange(0, 60))
+        assert index.range_sum(start, end) == brute_sum(values, start, end)
+        day, minutes = index.max_day(start, end)
+        assert minutes == brute_max(values, start, end)
+        if day is not None:
+            assert start <= day <= end and index.series(day, day) == [minutes]
+        assert index.series(start, end) == [
+            values.get(start + timedelta(days=i), 0) for i in range((end - start).days + 1)
+        ]
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_inserts_match_brute_force(seed):
+    rng = random.Random(seed)
+    index, values = DayIndex(), {}
+    day = FIRST + timedelta(days=rng.randrange(30))
+    for _ in range(rng.randrange(1, 120)):
+        # Mostly today or a new latest day, sometimes back-dated.
+        step = rng.choice([0, 0, 1, 1, 2, -rng.randrange(1, 40)])
+        when = day + timedelta(days=step)
+        if step > 0:
+            day = when
+        minutes = rng.randrange(0, 90)
+        index.add(when, minutes)
+        values[when] = values.get(when, 0) + minutes
+        if rng.random() < 0.2:
+            check(index, values, rng, queries=3)
+    check(index, values, rng)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_from_daily_matches_incremental(seed):
+    rng = random.Random(seed)
+    values = {FIRST + timedelta(days=rng.randrange(70)): rng.randrange(1, 200) for _ in range(40)}
+    built = DayIndex.from_daily({d.isoformat(): m for d, m in values.items()})
+    grown = DayIndex()
+    for d in sorted(values):
+        grown.add(d, values[d])
+    check(built, values, random.Random(seed))
+    check(grown, values, random.Random(seed))
+
+
+def test_empty_index():
+    index = DayIndex()
+    assert index.range_sum(FIRST, FIRST) == 0
+    assert index.max_day(FIRST, FIRST) == (None, 0)
+    assert index.series(FIRST, FIRST + timedelta(days=2)) == [0, 0, 0]
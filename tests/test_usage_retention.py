@@ -0,0 +1,29 @@
+from datetime import date
+
+from usage_retention import RetentionPolicy, week_key
+
+TODAY = date(2025, 6, 15)
+
+
+def test_rollup_handles_back_dated_entries():
+    stats = {
+        "sessions": [
+            {"date": "2025-06-10", "duration": 60},
+            {"date": "2025-04-01", "duration": 60},  # synced late
+            {"date": "2025-06-14", "duration": 60},
+        ],
+        "daily": {"2025-06-01": 30, "2023-01-02": 20, "2025-06-02": 10, "2024-01-03": 5},
+    }
+    expired, folded = RetentionPolicy(session_days=30, daily_months=13).rollup(stats, TODAY)
+    assert expired == 1
+    assert [s["date"] for s in stats["sessions"]] == ["2025-06-10", "2025-06-14"]
+    assert folded == 2
+    assert stats["daily"] == {"2025-06-01": 30, "2025-06-02": 10}
+    assert stats["weekly"] == {week_key(date(2023, 1, 2)): 20, week_key(date(2024, 1, 3)): 5}
+    assert stats["last_rollup"] == TODAY.isoformat()
+
+
+def test_rollup_adds_to_existing_week():
+    stats = {"daily": {"2023-01-03": 7}, "weekly": {week_key(date(2023, 1, 2)): 20}}
+    RetentionPolicy().rollup(stats, TODAY)
+    assert stats["weekly"] == {week_key(date(2023, 1, 2)): 27}
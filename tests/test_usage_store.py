@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+import usage_store
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage_store, "base_dir", str(tmp_path / "data"))
+    (tmp_path / "data").mkdir()
+    # Run from elsewhere: the migration must not depend on the cwd.
+    (tmp_path / "cwd").mkdir()
+    monkeypatch.chdir(tmp_path / "cwd")
+    return tmp_path / "data"
+
+
+def test_migrate_legacy_uses_base_dir(data_dir):
+    (data_dir / usage_store.LEGACY_STATS_FILE).write_text(json.dumps({"daily": {"2025-01-01": 30}, "sessions": []}))
+    usage_store.migrate_legacy("kid")
+    assert not (data_dir / usage_store.LEGACY_STATS_FILE).exists()
+    assert usage_store.load("kid")["daily"] == {"2025-01-01": 30}
+
+
+def test_migrate_legacy_keeps_an_existing_partition(data_dir):
+    (data_dir / usage_store.LEGACY_STATS_FILE).write_text(json.dumps({"daily": {"2025-01-01": 30}, "sessions": []}))
+    usage_store.save({"daily": {"2025-02-01": 5}, "sessions": []}, "kid")
+    usage_store.migrate_legacy("kid")
+    assert (data_dir / usage_store.LEGACY_STATS_FILE).exists()
+    assert usage_store.load("kid")["daily"] == {"2025-02-01": 5}
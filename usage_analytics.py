@@ -0,0 +1,216 @@
+"""
+Usage analytics and daily-limit recommendations.
+
+Works on day series (minutes per day, oldest first) for one or many
+profiles at once. The statistics are computed row-wise over a profiles x
+days matrix with NumPy when it is installed and with plain arrays
+otherwise; both paths give the same numbers. analyze_async() runs the
+whole batch on a worker thread so months of data for several children
+never stall the UI.
+
+Limits are suggested from days with usage only; a day at zero is as
+likely a day the device wasn't used as a day of restraint. A weekday
+needs MIN_WEEKDAY_HISTORY such days and the daily limit
+MIN_DAILY_HISTORY before anything is suggested, so a new profile gets no
+suggestions rather than MIN_LIMIT everywhere.
+"""
+import threading
+from array import array
+from datetime import timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+HISTORY_DAYS = 56
+TYPICAL_PERCENTILE = 60
+MIN_LIMIT = 15
+MAX_LIMIT = 240
+MIN_WEEKDAY_HISTORY = 3
+MIN_DAILY_HISTORY = 14
+
+
+def _percentile(sorted_values, p):
+    """Linear interpolation between closest ranks (NumPy's default method)."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def percentile_rows(rows, p, columns=None, active_only=False):
+    """p-th percentile of each row, optionally restricted to some columns.
+
+    With active_only, zero days are left out (0.0 for a row with none left).
+    """
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray(rows, dtype=float)
+        if columns is not None:
+            matrix = matrix[:, columns]
+        if matrix.shape[1] == 0:
+            return [0.0] * matrix.shape[0]
+        if not active_only:
+            return np.percentile(matrix, p, axis=1).tolist()
+        result = []
+        for row in matrix:
+            active = row[row > 0]
+            result.append(float(np.percentile(active, p)) if active.size else 0.0)
+        return result
+    result = []
+    for row in rows:
+        values = [row[c] for c in columns] if columns is not None else list(row)
+        if active_only:
+            values = [v for v in values if v > 0]
+        result.append(_percentile(sorted(values), p))
+    return result
+
+
+def active_count_rows(rows, columns=None):
+    """Number of days with usage in each row."""
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray(rows, dtype=float)
+        if columns is not None:
+            matrix = matrix[:, columns]
+        return (matrix > 0).sum(axis=1).tolist()
+    return [sum(1 for c in (columns if columns is not None else range(len(row))) if row[c] > 0)
+            for row in rows]
+
+
+def mean_rows(rows, columns=None):
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray(rows, dtype=float)
+        if columns is not None:
+            matrix = matrix[:, columns]
+        if matrix.shape[1] == 0:
+            return [0.0] * matrix.shape[0]
+        return matrix.mean(axis=1).tolist()
+    result = []
+    for row in rows:
+        values = [row[c] for c in columns] if columns is not None else row
+        result.append(sum(values) / len(values) if values else 0.0)
+    return result
+
+
+def slope_rows(rows):
+    """Least-squares trend of each row, in minutes per day per day."""
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray(rows, dtype=float)
+        n = matrix.shape[1]
+        if n < 2:
+            return [0.0] * matrix.shape[0]
+        x = np.arange(n, dtype=float) - (n - 1) / 2.0
+        return (matrix @ x / (x @ x)).tolist()
+    result = []
+    for row in rows:
+        n = len(row)
+        if n < 2:
+            result.append(0.0)
+            continue
+        mid = (n - 1) / 2.0
+        denom = sum((i - mid) ** 2 for i in range(n))
+        result.append(sum((i - mid) * v for i, v in enumerate(row)) / denom)
+    return result
+
+
+def moving_average_rows(rows, window):
+    """Trailing moving average of each row (full windows only)."""
+    if NUMPY_AVAILABLE:
+        matrix = np.asarray(rows, dtype=float)
+        if matrix.shape[1] < window:
+            return [[] for _ in range(matrix.shape[0])]
+        csum = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+        return ((csum[:, window:] - csum[:, :-window]) / window).tolist()
+    result = []
+    for row in rows:
+        csum = array('d', [0.0])
+        for v in row:
+            csum.append(csum[-1] + v)
+        result.append([(csum[i + window] - csum[i]) / window for i in range(len(row) - window + 1)])
+    return result
+
+
+def _round_limit(minutes):
+    return int(min(MAX_LIMIT, max(MIN_LIMIT, 5 * round(minutes / 5.0))))
+
+
+def analyze(series, end_date, extensions=None):
+    """Recommend limits for several profiles in one batch.
+
+    series maps profile id -> minutes per day for the HISTORY_DAYS days
+    ending at end_date (oldest first); extensions maps profile id ->
+    extension requests in that window. Returns profile id -> dict with
+    'daily_limit', 'weekday' (DAYS_OF_WEEK index -> minutes), 'trend'
+    (minutes per day, per week), 'weekday_avg', 'weekend_avg',
+    'moving_average' (last 7-day mean) and 'history' (days with usage).
+    'daily_limit' and each 'weekday' entry are None when there is too
+    little history to suggest them.
+    """
+    extensions = extensions or {}
+    profile_ids = list(series)
+    if not profile_ids:
+        return {}
+    days = len(series[profile_ids[0]])
+    rows = [list(series[pid]) for pid in profile_ids]
+    start = end_date - timedelta(days=days - 1)
+    weekday_of = [(start + timedelta(days=i)).weekday() for i in range(days)]
+    columns = {wd: [i for i in range(days) if weekday_of[i] == wd] for wd in range(7)}
+    school_days = [i for i in range(days) if weekday_of[i] < 5]
+    weekend_days = [i for i in range(days) if weekday_of[i] >= 5]
+
+    typical = {wd: percentile_rows(rows, TYPICAL_PERCENTILE, cols, active_only=True)
+               for wd, cols in columns.items()}
+    history = {wd: active_count_rows(rows, cols) for wd, cols in columns.items()}
+    overall = percentile_rows(rows, TYPICAL_PERCENTILE, active_only=True)
+    active = active_count_rows(rows)
+    slopes = slope_rows(rows)
+    weekday_avg = mean_rows(rows, school_days)
+    weekend_avg = mean_rows(rows, weekend_days)
+    moving = moving_average_rows(rows, 7)
+
+    results = {}
+    for r, pid in enumerate(profile_ids):
+        pressure = extensions.get(pid, 0) / (active[r] or 1)
+        # Frequent extension requests mean the current limits are too tight;
+        # a rising trend means usage is creeping up, so don't chase it.
+        factor = 1.0 + (0.1 if pressure > 0.5 else 0.05 if pressure > 0.25 else 0.0)
+        if slopes[r] > 0:
+            factor -= min(0.15, slopes[r] * 7 / max(overall[r], 1))
+        results[pid] = {
+            'daily_limit': _round_limit(overall[r] * factor) if active[r] >= MIN_DAILY_HISTORY else None,
+            'weekday': {
+                wd: _round_limit(typical[wd][r] * factor) if history[wd][r] >= MIN_WEEKDAY_HISTORY else None
+                for wd in range(7)
+            },
+            'trend': round(slopes[r] * 7, 1),
+            'weekday_avg': round(weekday_avg[r], 1),
+            'weekend_avg': round(weekend_avg[r], 1),
+            'moving_average': round(moving[r][-1], 1) if moving[r] else 0.0,
+            'history': int(active[r]),
+        }
+    return results
+
+
+def analyze_async(load_profile, profile_ids, end_date, callback):
+    """Load and analyze profiles on a worker thread.
+
+    load_profile(pid) -> (day series, extension count). callback receives
+    the analyze() result on the worker thread; UI code must marshal it
+    back to the main thread itself.
+    """
+    def run():
+        try:
+            series, extensions = {}, {}
+            for pid in profile_ids:
+                series[pid], extensions[pid] = load_profile(pid)
+            callback(analyze(series, end_date, extensions))
+        except Exception as e:
+            print(f"Error analyzing usage: {e}")
+
+    thread = threading.Thread(target=run, name="usage-analytics", daemon=True)
+    thread.start()
+    return thread
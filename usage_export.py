@@ -0,0 +1,331 @@
+"""
+Streaming export of usage history to CSV or NDJSON.
+
+The stats file is read incrementally: sessions are parsed one at a time
+as the file is scanned, and written as they are parsed, so memory use
+does not depend on how many sessions are exported. Daily and weekly
+totals are sorted before writing; those hold at most one entry per day
+and week, bounded by retention. Weekly rows combine the weeks retention
+already rolled up with the daily totals not yet rolled up. Usable from
+the app (Stats tab export buttons) and headless on Linux:
+
+    python usage_export.py --kind sessions --format csv -o sessions.csv
+    python usage_export.py --kind weekly --format ndjson --from 2024-01-01 --profile default
+    python usage_export.py --benchmark 1000000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import usage_store
+from usage_retention import week_key
+
+SESSION_FIELDS = ["date", "time", "duration", "profile"]
+DAILY_FIELDS = ["date", "minutes", "profile"]
+WEEKLY_FIELDS = ["week", "minutes", "profile"]
+KINDS = ("sessions", "daily", "weekly")
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+class _JSONStream:
+    """Pull parser over a text file: containers are walked, scalars and
+    innermost values are decoded with json, one at a time."""
+
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of stats file")
+
+    def take(self, expected=None):
+        char = self.peek()
+        if expected is not None and char not in expected:
+            raise ValueError(f"expected {expected!r} in stats file, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value (read whole, so keep it small)."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and self.buffer[self.pos] not in '{["':
+                # A number may continue in the next chunk.
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """Walk the container at the cursor, yielding each key (None in arrays).
+
+        The caller consumes the member's value before asking for the next.
+        """
+        closer = '}' if self.take('{[') == '{' else ']'
+        if self.peek() == closer:
+            self.take()
+            return
+        while True:
+            key = None
+            if closer == '}':
+                key = self.value()
+                self.take(':')
+            yield key
+            if self.take(',' + closer) == closer:
+                return
+
+    def skip(self):
+        if self.peek() in '{[':
+            for _ in self.members():
+                self.skip()
+        else:
+            self.value()
+
+
+def iter_stats(path, section):
+    """Yield (key, value) for each entry of stats[section] in the file at path.
+
+    Keys are None for list sections. Missing files and sections yield nothing.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        stream = _JSONStream(f)
+        for name in stream.members():
+            if name != section:
+                stream.skip()
+                continue
+            if stream.peek() not in '{[':
+                stream.skip()
+                continue
+            for key in stream.members():
+                yield key, stream.value()
+
+
+class StatsFile:
+    """Stands in for a loaded stats dict, reading sections from disk on demand."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def sessions(self):
+        return (session for _, session in iter_stats(self.path, "sessions"))
+
+    def section(self, name):
+        return iter_stats(self.path, name)
+
+
+def _sections(stats, name):
+    if isinstance(stats, StatsFile):
+        return stats.section(name)
+    return iter(stats.get(name, {}).items())
+
+
+def _in_range(day, date_from, date_to):
+    return (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+
+
+def iter_sessions(stats, date_from=None, date_to=None, profile=None):
+    """Yield session rows; dates are 'YYYY-MM-DD' strings compared lexically."""
+    sessions = stats.sessions() if isinstance(stats, StatsFile) else stats.get("sessions", ())
+    for session in sessions:
+        session_profile = session.get("profile", "default")
+        if profile is not None and session_profile != profile:
+            continue
+        if not _in_range(session.get("date", ""), date_from, date_to):
+            continue
+        yield {
+            "date": session.get("date"),
+            "time": session.get("time"),
+            "duration": session.get("duration", 0),
+            "profile": session_profile,
+        }
+
+
+def iter_daily(stats, date_from=None, date_to=None, profile=None):
+    profile_name = profile or "default"
+    days = sorted((day, minutes) for day, minutes in _sections(stats, "daily")
+                  if _in_range(day, date_from, date_to))
+    for day, minutes in days:
+        yield {"date": day, "minutes": minutes, "profile": profile_name}
+
+
+def iter_weekly(stats, date_from=None, date_to=None, profile=None):
+    """ISO-week totals: rolled-up weeks plus the daily totals grouped by week.
+
+    A week is in range when its key falls between the weeks of date_from
+    and date_to.
+    """
+    profile_name = profile or "default"
+    week_from = date_from and week_key(date.fromisoformat(date_from))
+    week_to = date_to and week_key(date.fromisoformat(date_to))
+    weeks = {}
+    for week, minutes in _sections(stats, "weekly"):
+        weeks[week] = weeks.get(week, 0) + minutes
+    for day, minutes in _sections(stats, "daily"):
+        if _in_range(day, date_from, date_to):
+            week = week_key(date.fromisoformat(day))
+            weeks[week] = weeks.get(week, 0) + minutes
+    for week in sorted(weeks):
+        if _in_range(week, week_from, week_to):
+            yield {"week": week, "minutes": weeks[week], "profile": profile_name}
+
+
+def write_rows(rows, fileobj, fmt, fields):
+    """Write rows to an open text file; returns the row count."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(fileobj, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == "ndjson":
+        for row in rows:
+            fileobj.write(json.dumps(row, separators=(',', ':')))
+            fileobj.write("\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return count
+
+
+def rows_for(kind, stats, date_from=None, date_to=None, profile=None):
+    """(rows, fields) for one of KINDS."""
+    if kind == "sessions":
+        return iter_sessions(stats, date_from, date_to, profile), SESSION_FIELDS
+    if kind == "daily":
+        return iter_daily(stats, date_from, date_to, profile), DAILY_FIELDS
+    if kind == "weekly":
+        return iter_weekly(stats, date_from, date_to, profile), WEEKLY_FIELDS
+    raise ValueError(f"Unknown export kind: {kind}")
+
+
+def export(kind, fmt, path, stats=None, date_from=None, date_to=None, profile=None):
+    """Export rows of one of KINDS to path; returns the row count.
+
+    stats is a dict or a StatsFile; by default the profile's stats file
+    is streamed from disk.
+    """
+    if stats is None:
+        stats = StatsFile(usage_store.path(profile or usage_store.active_profile))
+    rows, fields = rows_for(kind, stats, date_from, date_to, profile)
+    with open(path, 'w', newline='') as f:
+        return write_rows(rows, f, fmt, fields)
+
+
+def synthetic_sessions(count, seed=0):
+    """Deterministic fake sessions, generated lazily."""
+    rng = random.Random(seed)
+    day = date(2020, 1, 1)
+    profiles = ["default", "profile_1", "profile_2"]
+    for i in range(count):
+        if i % 8 == 0:
+            day += timedelta(days=1)
+        yield {
+            "date": day.isoformat(),
+            "time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+            "duration": rng.randrange(1, 120),
+            "profile": profiles[i % len(profiles)],
+        }
+
+
+def write_synthetic_stats(path, count, seed=0):
+    """Write a stats file with count sessions without holding them in memory."""
+    daily = {}
+    with open(path, 'w') as f:
+        f.write('{"sessions": [')
+        for i, session in enumerate(synthetic_sessions(count, seed)):
+            if i:
+                f.write(',')
+            f.write(json.dumps(session))
+            daily[session["date"]] = daily.get(session["date"], 0) + session["duration"]
+        f.write('], "daily": ')
+        f.write(json.dumps(daily))
+        f.write(', "weekly": {}}')
+
+
+def benchmark(count, fmt="csv", path=os.devnull, directory=None):
+    """Time export() of sessions streamed from a generated stats file."""
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix="export_bench_")
+    stats_path = os.path.join(directory, f"usage_stats_bench_{count}.json")
+    write_synthetic_stats(stats_path, count)
+    size = os.path.getsize(stats_path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = export("sessions", fmt, path, StatsFile(stats_path))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(stats_path)
+    print(f"{fmt}: {rows} sessions from a {size / 2 ** 20:.1f} MiB stats file in {elapsed:.2f}s "
+          f"({rows / elapsed:,.0f} rows/s), peak traced memory {peak / 1024:.1f} KiB")
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Screen Guardian usage history")
+    parser.add_argument("--kind", choices=KINDS, default="sessions")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+    parser.add_argument("--profile", help="only export this profile id")
+    parser.add_argument("--stats", help="stats file to read (default: the profile's partition)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="export N sessions from a generated stats file and report time and peak memory")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        for n in (args.benchmark // 10, args.benchmark):
+            benchmark(n, args.format)
+        return 0
+
+    stats = StatsFile(args.stats or usage_store.path(args.profile or "default"))
+    if args.output:
+        count = export(args.kind, args.format, args.output, stats,
+                       args.date_from, args.date_to, args.profile)
+    else:
+        rows, fields = rows_for(args.kind, stats, args.date_from, args.date_to, args.profile)
+        count = write_rows(rows, sys.stdout, args.format, fields)
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
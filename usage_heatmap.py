@@ -0,0 +1,120 @@
+"""
+Weekday x time-of-day usage accumulator.
+
+Each profile gets a 7 x 96 grid of 15-minute slots (Monday first) holding
+seconds of screen time, kept in a flat array and persisted as a small
+binary file. Sessions are split across slot boundaries when recorded, so
+reads are a single index lookup.
+"""
+import os
+import struct
+import sys
+from array import array
+from datetime import timedelta
+
+HEATMAP_FILE = "usage_heatmap_{profile}.bin"
+MAGIC = b"SGHM"
+VERSION = 1
+DAYS = 7
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+_HEADER = struct.Struct("<4sHH")
+
+base_dir = ""
+
+
+class HeatmapStore:
+    _cache = {}
+
+    def __init__(self, profile_id, slots=None):
+        self.profile_id = profile_id
+        self.slots = slots if slots is not None else array('I', [0]) * (DAYS * SLOTS_PER_DAY)
+
+    @classmethod
+    def path(cls, profile_id):
+        return os.path.join(base_dir, HEATMAP_FILE.format(profile=profile_id))
+
+    @classmethod
+    def for_profile(cls, profile_id):
+        """Return the cached store for a profile, loading it on first use."""
+        store = cls._cache.get(profile_id)
+        if store is None:
+            store = cls._cache[profile_id] = cls.load(profile_id)
+        return store
+
+    @classmethod
+    def load(cls, profile_id):
+        path = cls.path(profile_id)
+        try:
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                magic, version, slots_per_day = _HEADER.unpack_from(data)
+                if magic == MAGIC and version == VERSION and slots_per_day == SLOTS_PER_DAY:
+                    slots = array('I')
+                    slots.frombytes(data[_HEADER.size:_HEADER.size + DAYS * SLOTS_PER_DAY * slots.itemsize])
+                    if sys.byteorder != 'little':
+                        slots.byteswap()
+                    if len(slots) == DAYS * SLOTS_PER_DAY:
+                        return cls(profile_id, slots)
+                print(f"Ignoring incompatible heatmap file {path}")
+        except Exception as e:
+            print(f"Error loading heatmap: {e}")
+        return cls(profile_id)
+
+    def to_bytes(self):
+        slots = self.slots
+        if sys.byteorder != 'little':
+            slots = array('I', slots)
+            slots.byteswap()
+        return _HEADER.pack(MAGIC, VERSION, SLOTS_PER_DAY) + slots.tobytes()
+
+    def save(self):
+        try:
+            tmp_path = self.path(self.profile_id) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self.to_bytes())
+            os.replace(tmp_path, self.path(self.profile_id))
+        except Exception as e:
+            print(f"Error saving heatmap: {e}")
+
+    @staticmethod
+    def slot_index(moment):
+        return moment.weekday() * SLOTS_PER_DAY + (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+    def add_session(self, start, seconds):
+        """Spread ``seconds`` of usage starting at ``start`` over the slots it covers."""
+        end = start + timedelta(seconds=seconds)
+        moment = start
+        counted = 0
+        while moment < end:
+            slot_start = moment.replace(
+                minute=moment.minute - moment.minute % SLOT_MINUTES, second=0, microsecond=0
+            )
+            boundary = min(end, slot_start + timedelta(minutes=SLOT_MINUTES))
+            # Round the running total, not each slice, so slices add up to the session.
+            elapsed = int(round((boundary - start).total_seconds()))
+            self.slots[self.slot_index(moment)] += elapsed - counted
+            counted = elapsed
+            moment = boundary
+
+    def get(self, weekday, slot):
+        return self.slots[weekday * SLOTS_PER_DAY + slot]
+
+    def grid(self, columns=24):
+        """Seconds per (weekday, column), folding the 15-minute slots into ``columns`` per day."""
+        per_column = SLOTS_PER_DAY // columns
+        slots = self.slots
+        return [
+            [sum(slots[base + c * per_column:base + (c + 1) * per_column]) for c in range(columns)]
+            for base in range(0, DAYS * SLOTS_PER_DAY, SLOTS_PER_DAY)
+        ]
+
+
+def record_session(profile_id, start, seconds):
+    store = HeatmapStore.for_profile(profile_id)
+    store.add_session(start, seconds)
+    store.save()
+    return store
+
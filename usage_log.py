@@ -0,0 +1,341 @@
+"""
+Append-only usage log, folded into the per-profile statistics.
+
+Finished sessions (and extension requests) are appended to
+usage_log.jsonl as JSON lines, with start and end as POSIX seconds, so a
+session is counted to the second rather than rounded to minutes. The log
+takes appends from any process under an flock, and every record is
+fsynced before append() returns. fold() is the only writer of
+usage_stats_<profile>.json and the heatmaps. The service runs it shortly
+after its own appends and on request; the app runs it only when no
+service is listening. Folding:
+
+  - splits sessions at local midnight and adds them to "daily" with the
+    leftover seconds kept in "daily_seconds";
+  - skips ids it has folded before (a session may be logged by both the
+    service and the app, or survive a crash before the log was cleared);
+  - runs the retention rollup once a day;
+  - empties the log.
+
+A fold is one commit: every changed stats and heatmap file is written
+beside its target and fsynced, then the journal naming them is written,
+then they are renamed into place and the log emptied. A crash before the
+journal leaves the old files and the log, so the fold is simply redone;
+a crash after it is finished by recover() on the next fold, and the
+records still in the log are skipped by id.
+
+    python usage_log.py --fold    fold the log in the current directory
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+import usage_retention
+import usage_store
+from usage_heatmap import HeatmapStore
+
+LOG_FILE = "usage_log.jsonl"
+LOCK_FILE = "usage_log.lock"
+JOURNAL_FILE = "usage_fold.journal"
+STAGED_SUFFIX = ".fold"
+FOLD_SECONDS = 5
+KEEP_FOLDED_IDS = 500
+
+base_dir = ""
+
+
+def path():
+    return os.path.join(base_dir, LOG_FILE)
+
+
+@contextmanager
+def _locked():
+    with open(os.path.join(base_dir, LOCK_FILE), 'a') as lock_file:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def session(profile_id, start, end, session_id=None, source="timer"):
+    """A session record; start and end are datetimes or POSIX seconds.
+
+    Records of the same timer should share session_id so that only the
+    first one logged is counted.
+    """
+    start = start.timestamp() if isinstance(start, datetime) else start
+    end = end.timestamp() if isinstance(end, datetime) else end
+    return {
+        "kind": "session",
+        "id": session_id or f"{profile_id}@{start:.3f}",
+        "profile": profile_id,
+        "start": start,
+        "end": max(start, end),
+        "source": source,
+    }
+
+
+def timer_session_id(profile_id, started):
+    """Id shared by every record of one timer run; started is its ISO start time."""
+    return f"timer:{profile_id}:{started}"
+
+
+def extension(profile_id, when=None):
+    when = when or time.time()
+    return {"kind": "extension", "id": f"{profile_id}+{when:.6f}", "profile": profile_id, "time": when}
+
+
+def append(records):
+    """Append records and fsync; one write for the whole batch."""
+    if not records:
+        return
+    data = "".join(json.dumps(record) + "\n" for record in records)
+    with _locked():
+        with open(path(), 'a') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def pending_size():
+    try:
+        return os.path.getsize(path())
+    except OSError:
+        return 0
+
+
+def _read():
+    records = []
+    try:
+        with open(path(), 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-append.
+                    print(f"Skipping unreadable usage log line: {line[:60]!r}")
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def split_days(start, end):
+    """(day, segment start, seconds) for each local day the span touches.
+
+    Seconds are measured on POSIX time, so a span across a DST change
+    counts the time that really passed.
+    """
+    while start < end:
+        moment = datetime.fromtimestamp(start)
+        midnight = datetime.combine(moment.date() + timedelta(days=1), datetime.min.time())
+        boundary = min(end, midnight.timestamp())
+        yield moment.date(), moment, boundary - start
+        start = boundary
+
+
+def add_seconds(stats, day, seconds):
+    """Add seconds to a day's minutes, carrying the remainder to the next fold."""
+    key = day.isoformat()
+    daily = stats.setdefault("daily", {})
+    leftover = stats.setdefault("daily_seconds", {})
+    total = daily.get(key, 0) * 60 + leftover.get(key, 0) + seconds
+    daily[key] = int(total // 60)
+    leftover[key] = round(total - daily[key] * 60, 3)
+    if not leftover[key]:
+        del leftover[key]
+
+
+def apply(stats, record):
+    """Fold one record into a profile's stats; returns seconds added."""
+    if record["kind"] == "extension":
+        day = datetime.fromtimestamp(record["time"]).strftime("%Y-%m-%d")
+        extensions = stats.setdefault("extensions", {})
+        extensions[day] = extensions.get(day, 0) + 1
+        return 0
+    seconds = record["end"] - record["start"]
+    for day, _, part in split_days(record["start"], record["end"]):
+        add_seconds(stats, day, part)
+    start = datetime.fromtimestamp(record["start"])
+    stats.setdefault("sessions", []).append({
+        "date": start.strftime("%Y-%m-%d"),
+        "time": start.strftime("%H:%M"),
+        "duration": int(round(seconds / 60)),
+        "seconds": int(round(seconds)),
+        "profile": record["profile"],
+    })
+    return seconds
+
+
+def _write_synced(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _sync_dir():
+    try:
+        fd = os.open(base_dir or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _finish(targets):
+    """Move the staged files of a committed fold into place."""
+    for target in targets:
+        if os.path.exists(target + STAGED_SUFFIX):
+            os.replace(target + STAGED_SUFFIX, target)
+    _sync_dir()
+    os.remove(os.path.join(base_dir, JOURNAL_FILE))
+
+
+def recover():
+    """Finish a fold whose journal was written; call with the log locked.
+
+    The log is left alone: its folded records are skipped by id.
+    """
+    journal = os.path.join(base_dir, JOURNAL_FILE)
+    try:
+        with open(journal, 'r') as f:
+            targets = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # Torn journal: the fold never committed, so it is redone.
+        os.remove(journal)
+        return False
+    print(f"Finishing interrupted usage fold ({len(targets)} files)")
+    _finish(targets)
+    return True
+
+
+def _changes(seconds, before, stats):
+    """What a fold did to one profile, for the callers' cached views.
+
+    days maps each changed day to the minutes added, or is None when a
+    rollup reshaped "daily" and caches have to be rebuilt; seq is the
+    profile's fold count, so each change is applied once.
+    """
+    if before is None:
+        days = None
+    else:
+        daily = stats.get("daily", {})
+        days = {day: minutes - before.get(day, 0) for day, minutes in daily.items()
+                if minutes != before.get(day, 0)}
+    return {"seconds": seconds, "days": days, "seq": stats["fold_seq"]}
+
+
+def _rollup_if_due(stats, today):
+    if not usage_retention.DEFAULT_POLICY.due(stats, today):
+        return False
+    usage_retention.DEFAULT_POLICY.rollup(stats, today)
+    leftover = stats.get("daily_seconds", {})
+    for key in [k for k in leftover if k not in stats["daily"]]:
+        del leftover[key]
+    return True
+
+
+def fold(today=None):
+    """Fold the log into the stats; returns {profile: _changes()}."""
+    today = today or date.today()
+    added = {}
+    with _locked():
+        recover()
+        records = _read()
+        if not records:
+            return added
+        by_profile = {}
+        for record in records:
+            by_profile.setdefault(record["profile"], []).append(record)
+        staged = {}
+        with usage_store.lock:
+            for profile_id, profile_records in by_profile.items():
+                stats = usage_store.load(profile_id)
+                before = dict(stats.get("daily", {}))
+                seconds = 0
+                folded = stats.setdefault("folded_ids", [])
+                seen = set(folded)
+                new = []
+                for record in profile_records:
+                    if record["id"] in seen:
+                        continue
+                    seconds += apply(stats, record)
+                    folded.append(record["id"])
+                    seen.add(record["id"])
+                    new.append(record)
+                if not new:
+                    continue
+                # Ids of this fold must survive until the log is emptied.
+                del folded[:-max(KEEP_FOLDED_IDS, len(new))]
+                if _rollup_if_due(stats, today):
+                    before = None
+                stats["fold_seq"] = stats.get("fold_seq", 0) + 1
+                added[profile_id] = _changes(seconds, before, stats)
+                staged[usage_store.path(profile_id)] = json.dumps(stats).encode('utf-8')
+                heatmap = HeatmapStore.load(profile_id)
+                for record in new:
+                    if record["kind"] == "session":
+                        for _, segment_start, part in split_days(record["start"], record["end"]):
+                            heatmap.add_session(segment_start, part)
+                staged[HeatmapStore.path(profile_id)] = heatmap.to_bytes()
+            for target, data in staged.items():
+                _write_synced(target + STAGED_SUFFIX, data)
+            # The commit point: once the journal is on disk the fold is done.
+            _write_synced(os.path.join(base_dir, JOURNAL_FILE), json.dumps(list(staged)).encode('utf-8'))
+            _sync_dir()
+            _finish(list(staged))
+            with open(path(), 'w'):
+                pass
+        for profile_id in by_profile:
+            HeatmapStore._cache.pop(profile_id, None)
+    return added
+
+
+def rollup(today=None):
+    """Run the retention rollup for every profile due today.
+
+    Folds run it too, but only when there is usage to fold; this is for
+    the service to call once a day. Returns {profile: _changes()}.
+    """
+    today = today or date.today()
+    prefix, suffix = usage_store.STATS_FILE.split("{profile}")
+    rolled = {}
+    with _locked():
+        with usage_store.lock:
+            for name in sorted(os.listdir(base_dir or '.')):
+                if not (name.startswith(prefix) and name.endswith(suffix)):
+                    continue
+                profile_id = name[len(prefix):len(name) - len(suffix)]
+                stats = usage_store.load(profile_id)
+                if not _rollup_if_due(stats, today):
+                    continue
+                stats["fold_seq"] = stats.get("fold_seq", 0) + 1
+                usage_store.save(stats, profile_id)
+                rolled[profile_id] = _changes(0, None, stats)
+    return rolled
+
+
+if __name__ == '__main__':
+    if "--fold" in sys.argv[1:]:
+        for profile_id, changes in fold().items():
+            print(f"{profile_id}: +{changes['seconds'] / 60:.1f} min")
+    else:
+        print(__doc__)
@@ -0,0 +1,186 @@
+"""
+Range queries over daily usage.
+
+DayIndex stores minutes per day in an array indexed by day number
+(date.toordinal() - origin) together with a prefix-sum array and a
+sparse table of range maxima. Sums, averages and max-day lookups over
+any date range are O(1); recording minutes for the latest day, which is
+what applying a fold of the usage log does, is O(log n).
+"""
+from array import array
+from datetime import date, datetime
+
+
+def _to_date(day):
+    if isinstance(day, str):
+        return datetime.strptime(day, "%Y-%m-%d").date()
+    if isinstance(day, datetime):
+        return day.date()
+    return day
+
+
+class DayIndex:
+    def __init__(self):
+        self.seq = 0
+        self.origin = None
+        self.values = array('q')
+        self.prefix = array('q', [0])
+        self.sparse = []
+
+    @classmethod
+    def from_daily(cls, daily):
+        """Build from a {'YYYY-MM-DD': minutes} mapping."""
+        index = cls()
+        if daily:
+            days = {_to_date(d).toordinal(): m for d, m in daily.items()}
+            index.origin = min(days)
+            index.values = array('q', (days.get(o, 0) for o in range(index.origin, max(days) + 1)))
+            index._rebuild()
+        return index
+
+    def __len__(self):
+        return len(self.values)
+
+    def _better(self, i, j):
+        return i if self.values[i] >= self.values[j] else j
+
+    def _rebuild(self):
+        n = len(self.values)
+        self.prefix = array('q', [0]) * (n + 1)
+        running = 0
+        for i, v in enumerate(self.values):
+            running += v
+            self.prefix[i + 1] = running
+        self.sparse = [array('l', range(n))]
+        k = 1
+        while (1 << k) <= n:
+            prev = self.sparse[k - 1]
+            half = 1 << (k - 1)
+            self.sparse.append(array('l', (
+                self._better(prev[i], prev[i + half]) for i in range(n - (1 << k) + 1)
+            )))
+            k += 1
+
+    def _refresh_tail(self):
+        """Recompute the sparse entries that cover the last day (one per level)."""
+        n = len(self.values)
+        for k in range(1, n.bit_length()):
+            i = n - (1 << k)
+            if i < 0:
+                break
+            level = self.sparse[k - 1]
+            entry = self._better(level[i], level[i + (1 << (k - 1))])
+            if k == len(self.sparse):
+                self.sparse.append(array('l', [entry]))
+            elif i == len(self.sparse[k]):
+                self.sparse[k].append(entry)
+            else:
+                self.sparse[k][i] = entry
+
+    def _append(self, minutes):
+        self.values.append(minutes)
+        self.prefix.append(self.prefix[-1] + minutes)
+        if not self.sparse:
+            self.sparse.append(array('l'))
+        self.sparse[0].append(len(self.values) - 1)
+        self._refresh_tail()
+
+    def add(self, day, minutes):
+        ordinal = _to_date(day).toordinal()
+        if self.origin is None:
+            self.origin = ordinal
+        if ordinal < self.origin:
+            self.values = array('q', [0]) * (self.origin - ordinal) + self.values
+            self.origin = ordinal
+            self._rebuild()
+        while ordinal - self.origin >= len(self.values):
+            self._append(0)
+        i = ordinal - self.origin
+        self.values[i] += minutes
+        if i == len(self.values) - 1:
+            self.prefix[-1] += minutes
+            self._refresh_tail()
+        else:
+            # Back-dated entry (clock change, imports); rare, so rebuild.
+            self._rebuild()
+
+    def _clip(self, start, end):
+        if self.origin is None:
+            return None
+        i = max(_to_date(start).toordinal() - self.origin, 0)
+        j = min(_to_date(end).toordinal() - self.origin, len(self.values) - 1)
+        return (i, j) if i <= j else None
+
+    def range_sum(self, start, end):
+        """Total minutes from start to end, both inclusive."""
+        span = self._clip(start, end)
+        return self.prefix[span[1] + 1] - self.prefix[span[0]] if span else 0
+
+    def average(self, start, end):
+        """Mean minutes per calendar day in the range (days without data count as 0)."""
+        days = _to_date(end).toordinal() - _to_date(start).toordinal() + 1
+        return self.range_sum(start, end) / days if days > 0 else 0
+
+    def max_day(self, start, end):
+        """(date, minutes) of the busiest day in the range, or (None, 0)."""
+        span = self._clip(start, end)
+        if not span:
+            return None, 0
+        i, j = span
+        k = (j - i + 1).bit_length() - 1
+        best = self._better(self.sparse[k][i], self.sparse[k][j - (1 << k) + 1])
+        return date.fromordinal(self.origin + best), self.values[best]
+
+    def series(self, start, end):
+        """Minutes for each day from start to end inclusive."""
+        first, last = _to_date(start).toordinal(), _to_date(end).toordinal()
+        if self.origin is None:
+            return [0] * max(0, last - first + 1)
+        return [
+            self.values[o - self.origin] if 0 <= o - self.origin < len(self.values) else 0
+            for o in range(first, last + 1)
+        ]
+
+
+_indexes = {}
+
+
+def index_for(profile_id, load_stats):
+    """Cached DayIndex for a profile, built from load_stats() on first use."""
+    index = _indexes.get(profile_id)
+    if index is None:
+        stats = load_stats()
+        index = _indexes[profile_id] = DayIndex.from_daily(stats.get('daily', {}))
+        index.seq = stats.get('fold_seq', 0)
+    return index
+
+
+def record(profile_id, day, minutes):
+    """Apply a recording to the cached index, if it has been built."""
+    index = _indexes.get(profile_id)
+    if index is not None:
+        index.add(day, minutes)
+
+
+def apply_fold(profile_id, changes):
+    """Apply one usage_log fold result to the cached index.
+
+    A fold the index already contains is skipped; after a missed fold or a
+    rollup the index is dropped and rebuilt on next use.
+    """
+    index = _indexes.get(profile_id)
+    if index is None or changes['seq'] <= index.seq:
+        return
+    if changes['days'] is None or changes['seq'] != index.seq + 1:
+        invalidate(profile_id)
+        return
+    for day, minutes in changes['days'].items():
+        record(profile_id, day, minutes)
+    index.seq = changes['seq']
+
+
+def invalidate(profile_id=None):
+    if profile_id is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(profile_id, None)
@@ -0,0 +1,55 @@
+"""
+Tiered retention for usage statistics.
+
+Raw sessions are kept for ``session_days``, daily totals for
+``daily_months``, and anything older is folded into ISO-week totals that
+are kept forever. Every entry is checked on each run: synced sessions
+and midnight splits can be inserted back-dated, so neither the session
+list nor the daily keys can be assumed to be in date order. A run
+happens at most once per day per profile, from usage_log: when the
+usage log is folded and from the timer service's daily rollup deadline.
+"""
+from datetime import date, datetime, timedelta
+
+
+def months_before(day, months):
+    month_index = day.year * 12 + (day.month - 1) - months
+    return date(month_index // 12, month_index % 12 + 1, min(day.day, 28))
+
+
+def week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class RetentionPolicy:
+    def __init__(self, session_days=30, daily_months=13):
+        self.session_days = session_days
+        self.daily_months = daily_months
+
+    def due(self, stats, today):
+        return stats.get("last_rollup") != today.isoformat()
+
+    def rollup(self, stats, today=None):
+        """Expire old entries in place; returns (sessions dropped, days folded)."""
+        today = today or date.today()
+        session_cutoff = (today - timedelta(days=self.session_days)).isoformat()
+        daily_cutoff = months_before(today, self.daily_months).isoformat()
+
+        sessions = stats.setdefault("sessions", [])
+        kept = [s for s in sessions if s.get("date", "") >= session_cutoff]
+        expired = len(sessions) - len(kept)
+        sessions[:] = kept
+
+        daily = stats.setdefault("daily", {})
+        weekly = stats.setdefault("weekly", {})
+        folded = [day for day in daily if day < daily_cutoff]
+        for day in folded:
+            key = week_key(datetime.strptime(day, "%Y-%m-%d").date())
+            weekly[key] = weekly.get(key, 0) + daily.pop(day)
+
+        stats["last_rollup"] = today.isoformat()
+        return expired, len(folded)
+
+
+DEFAULT_POLICY = RetentionPolicy()
@@ -0,0 +1,66 @@
+"""
+Per-profile usage statistics storage.
+
+Every profile has its own stats document (usage_stats_<profile>.json with
+"daily", "sessions" and, after rollups, "weekly"), so recording or
+reading one child's usage never parses another child's history. The
+active partition is a module-level pointer; switching profiles is just
+activate(), nothing is loaded until the stats are actually read. Usage
+is added by usage_log.fold(), the only writer of these files.
+"""
+import json
+import os
+import threading
+
+STATS_FILE = "usage_stats_{profile}.json"
+LEGACY_STATS_FILE = "usage_stats.json"
+
+lock = threading.RLock()
+active_profile = "default"
+base_dir = ""
+
+
+def empty_stats():
+    return {"daily": {}, "sessions": []}
+
+
+def path(profile_id):
+    return os.path.join(base_dir, STATS_FILE.format(profile=profile_id))
+
+
+def activate(profile_id):
+    global active_profile
+    active_profile = profile_id
+
+
+def migrate_legacy(profile_id):
+    """Hand the old single usage_stats.json to profile_id if it has no partition yet."""
+    legacy_path = os.path.join(base_dir, LEGACY_STATS_FILE)
+    try:
+        if os.path.exists(legacy_path) and not os.path.exists(path(profile_id)):
+            os.replace(legacy_path, path(profile_id))
+            print(f"Moved {legacy_path} to {path(profile_id)}")
+    except Exception as e:
+        print(f"Error migrating stats: {e}")
+
+
+def load(profile_id=None):
+    stats_path = path(profile_id or active_profile)
+    try:
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading stats: {e}")
+    return empty_stats()
+
+
+def save(stats, profile_id=None):
+    stats_path = path(profile_id or active_profile)
+    try:
+        tmp_path = stats_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, stats_path)
+    except Exception as e:
+        print(f"Error saving stats: {e}")